@@ -0,0 +1,220 @@
+#! /usr/bin/env python
+"""Benchmark the instruction decoders, encoders and parsers of each
+architecture on the regression vectors of test/arch/*/arch.py, and on random
+streams. Encoding and parsing are timed with their caches disabled, then
+with warm caches. Results are written to a JSON file, and can be compared to a
+previously saved one"""
+from argparse import ArgumentParser
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sys
+import time
+import types
+import zlib
+
+from miasm2.core.bin_stream import bin_stream, bin_stream_str
+
+TESTS = os.path.join(os.path.dirname(__file__), "..", "..", "test", "arch")
+# Architecture -> (module, mnemonic class, attrib, tests file, vectors list,
+#                  offset of the instruction text in the vector description)
+ARCHS = {
+    "x86_16": ("x86", "mn_x86", 16, "x86", "reg_tests", 12),
+    "x86_32": ("x86", "mn_x86", 32, "x86", "reg_tests", 12),
+    "x86_64": ("x86", "mn_x86", 64, "x86", "reg_tests", 12),
+    "arml": ("arm", "mn_arm", "l", "arm", "reg_tests_arm", 12),
+    "armtl": ("arm", "mn_armt", "l", "arm", "reg_tests_armt", 12),
+    "aarch64l": ("aarch64", "mn_aarch64", "l", "aarch64",
+                 "reg_tests_aarch64", 12),
+    "mips32b": ("mips32", "mn_mips32", "b", "mips32", "reg_tests_mips32", 12),
+    "msp430": ("msp430", "mn_msp430", None, "msp430", "reg_tests_msp", 8),
+    "sh4": ("sh4", "mn_sh4", None, "sh4", "reg_tests_sh4", 12),
+}
+METRICS = [("decode", "instructions/s"),
+           ("decode_random", "attempts/s"),
+           ("encode", "instructions/s"),
+           ("encode_cached", "instructions/s"),
+           ("parse", "instructions/s"),
+           ("parse_cached", "instructions/s"),
+           ("memory", "bytes/instruction"),
+           ]
+
+# ([mode, ]"description", "hex encoding") entries of a vectors list
+vector_re = re.compile(r'\((?:m(16|32|64),\s*)?(["\'])(.*?)\2,\s*'
+                       r'(["\'])([0-9a-fA-F ]+)\4\)')
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("-a", "--architecture", action="append",
+                    choices=sorted(ARCHS),
+                    help="Architecture to benchmark (default: all)")
+parser.add_argument("-n", "--rounds", type=int, default=3,
+                    help="Number of passes over the vectors")
+parser.add_argument("-r", "--random", type=int, default=2000,
+                    help="Number of random streams to decode")
+parser.add_argument("-s", "--seed", type=int, default=0,
+                    help="Random generator seed")
+parser.add_argument("-o", "--output", help="JSON file to write results to")
+parser.add_argument("-b", "--baseline",
+                    help="JSON file of previous results to compare to")
+args = parser.parse_args()
+
+
+def get_mnemo(arch):
+    """Return the mnemonic class and the attrib of @arch"""
+    module, name, attrib = ARCHS[arch][:3]
+    module = __import__("miasm2.arch.%s.arch" % module, fromlist=[name])
+    return getattr(module, name), attrib
+
+
+def get_vectors(arch):
+    """Return the list of (text, binary) regression vectors of @arch"""
+    _, _, attrib, tests, name, text_offset = ARCHS[arch]
+    source = open(os.path.join(TESTS, tests, "arch.py")).read()
+    source = source[source.index("%s = [" % name):]
+    source = source[:source.index("\n]")]
+    vectors = []
+    for mode, _, text, _, data in vector_re.findall(source):
+        if mode and int(mode) != attrib:
+            continue
+        vectors.append((text[text_offset:],
+                        data.replace(" ", "").decode("hex")))
+    return vectors
+
+
+def get_deep_size(objs):
+    """Return the memory used by the objects reachable from @objs, ignoring
+    modules, classes, functions and binary streams. Objects shared between
+    @objs are counted once"""
+    seen = set()
+    todo = list(objs)
+    size = 0
+    ignored = (type, types.ClassType, types.ModuleType, types.FunctionType,
+               bin_stream)
+    while todo:
+        obj = todo.pop()
+        if id(obj) in seen or isinstance(obj, ignored):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        todo += gc.get_referents(obj)
+    return size
+
+
+def rate(count, func):
+    """Return the number of @func calls per second, @func being called
+    @count times"""
+    start = time.time()
+    func()
+    return count / max(time.time() - start, 1e-9)
+
+
+def reset_caches(mnemo, asm_cache_size, parse_cache_size):
+    """Empty the encoding and parsing caches of @mnemo, and set their sizes to
+    @asm_cache_size and @parse_cache_size (0 to disable them)"""
+    for name in ["_asm_cache", "_parse_cache"]:
+        if name in mnemo.__dict__:
+            delattr(mnemo, name)
+    mnemo.asm_cache_size = asm_cache_size
+    mnemo.parse_cache_size = parse_cache_size
+
+
+def bench_arch(arch):
+    """Return the {metric: value} results of @arch"""
+    mnemo, attrib = get_mnemo(arch)
+    cache_sizes = mnemo.asm_cache_size, mnemo.parse_cache_size
+    # Each architecture has its own generator, so that its random streams do
+    # not depend on the other benchmarked architectures
+    rand = random.Random(args.seed ^ zlib.crc32(arch))
+    vectors = get_vectors(arch)
+    streams = [bin_stream_str(data) for _, data in vectors]
+    texts = [text for text, _ in vectors]
+    results = {}
+
+    def decode():
+        for _ in xrange(args.rounds):
+            for stream in streams:
+                mnemo.dis(stream, attrib)
+    results["decode"] = rate(args.rounds * len(streams), decode)
+
+    random_streams = [bin_stream_str("".join(chr(rand.randint(0, 255))
+                                             for _ in xrange(16)))
+                      for _ in xrange(args.random)]
+
+    def decode_random():
+        for stream in random_streams:
+            try:
+                mnemo.dis(stream, attrib)
+            except Exception:
+                # Invalid encodings may raise various errors
+                pass
+    results["decode_random"] = rate(len(random_streams), decode_random)
+
+    def parse():
+        for _ in xrange(args.rounds):
+            for text in texts:
+                mnemo.fromstring(text, attrib)
+
+    instrs = [mnemo.fromstring(text, attrib) for text in texts]
+
+    def encode():
+        for _ in xrange(args.rounds):
+            for instr in instrs:
+                mnemo.asm(instr)
+
+    # Cold caches: every round computes its results
+    reset_caches(mnemo, 0, 0)
+    results["parse"] = rate(args.rounds * len(texts), parse)
+    results["encode"] = rate(args.rounds * len(instrs), encode)
+
+    # Warm caches: a first untimed round fills them
+    reset_caches(mnemo, *cache_sizes)
+    for text in texts:
+        mnemo.fromstring(text, attrib)
+    for instr in instrs:
+        mnemo.asm(instr)
+    results["parse_cached"] = rate(args.rounds * len(texts), parse)
+    results["encode_cached"] = rate(args.rounds * len(instrs), encode)
+
+    decoded = [mnemo.dis(stream, attrib) for stream in streams]
+    results["memory"] = get_deep_size(decoded) / float(len(decoded))
+    results["vectors"] = len(vectors)
+    return results
+
+
+# Invalid random encodings and unencodable variants are logged by the
+# architectures
+logging.disable(logging.CRITICAL)
+
+results = {}
+print "Units: %s" % ", ".join("%s in %s" % metric for metric in METRICS)
+for arch in args.architecture or sorted(ARCHS):
+    results[arch] = bench_arch(arch)
+    print "%-9s %s" % (arch, ", ".join("%s: %.0f" % (metric,
+                                                     results[arch][metric])
+                                       for metric, _ in METRICS))
+
+if args.output:
+    with open(args.output, "w") as fdesc:
+        json.dump({"python": platform.python_version(),
+                   "rounds": args.rounds,
+                   "seed": args.seed,
+                   "results": results}, fdesc, indent=2, sort_keys=True)
+
+if args.baseline:
+    baseline = json.load(open(args.baseline))["results"]
+    print
+    print "Comparison to %s (current / baseline):" % args.baseline
+    for arch in sorted(results):
+        if arch not in baseline:
+            continue
+        ratios = []
+        for metric, _ in METRICS:
+            if not baseline[arch].get(metric):
+                continue
+            ratios.append("%s x%.2f" % (metric, results[arch][metric] /
+                                        baseline[arch][metric]))
+        print "%-9s %s" % (arch, ", ".join(ratios))
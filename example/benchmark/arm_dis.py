@@ -0,0 +1,56 @@
+#! /usr/bin/env python
+"""Benchmark the linear disassembly of an ARM / Thumb / AArch64 firmware,
+generated from the regression vectors of test/arch/arm/arch.py and
+test/arch/aarch64/arch.py (or read from a raw file)"""
+from argparse import ArgumentParser
+import os
+import re
+import time
+
+from miasm2.analysis.machine import Machine
+from miasm2.core.bin_stream import bin_stream_str
+
+TESTS = os.path.join(os.path.dirname(__file__), "..", "..", "test", "arch")
+# Machine -> (tests file, vectors list name)
+VECTORS = {"arml": ("arm", "reg_tests_arm"),
+           "armtl": ("arm", "reg_tests_armt"),
+           "aarch64l": ("aarch64", "reg_tests_aarch64"),
+           }
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("architecture", choices=sorted(VECTORS),
+                    help="Architecture")
+parser.add_argument("-f", "--firmware", help="Raw firmware file")
+parser.add_argument("-n", "--rounds", type=int, default=20,
+                    help="Number of copies of the vectors in the generated "
+                    "firmware")
+args = parser.parse_args()
+
+
+def gen_firmware(machine_name, rounds):
+    """Return the concatenation of the (little endian) regression vectors of
+    @machine_name, @rounds times"""
+    arch, name = VECTORS[machine_name]
+    source = open(os.path.join(TESTS, arch, "arch.py")).read()
+    source = source[source.index("%s = [" % name):]
+    source = source[:source.index("\n]")]
+    vectors = re.findall(r'\("[^"]*",\s*"([0-9a-fA-F]+)"\)', source)
+    return "".join(vector.decode("hex") for vector in vectors) * rounds
+
+
+if args.firmware:
+    data = open(args.firmware, "rb").read()
+else:
+    data = gen_firmware(args.architecture, args.rounds)
+
+machine = Machine(args.architecture)
+mdis = machine.dis_engine(bin_stream_str(data))
+
+start = time.time()
+decoded = sum(1 for _ in mdis.dis_linear(0, resync=2))
+stop = time.time()
+
+print "Size:     %d bytes" % len(data)
+print "Decoded:  %d instructions" % decoded
+print "Decoding: %.3fs (%.0f instructions/s)" % (stop - start,
+                                                  decoded / (stop - start))
@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+"""Benchmark the parsing of a large generated x86_32 assembly listing, made
+of registers, immediates and memory references operands"""
+from argparse import ArgumentParser
+import random
+import time
+
+from miasm2.arch.x86.arch import mn_x86
+from miasm2.core import parse_asm
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--lines", type=int, default=5000,
+                    help="Number of generated instructions")
+parser.add_argument("-s", "--seed", type=int, default=0,
+                    help="Random generator seed")
+parser.add_argument("--no-cache", action="store_true",
+                    help="Disable the operand parsing cache")
+args = parser.parse_args()
+
+REGS = ["EAX", "EBX", "ECX", "EDX", "ESI", "EDI", "EBP"]
+MNEMOS = ["MOV", "ADD", "SUB", "XOR", "AND", "OR", "CMP", "TEST"]
+
+
+def gen_operand(rand):
+    """Return a random register / immediate / memory reference operand"""
+    kind = rand.randint(0, 5)
+    if kind < 3:
+        return rand.choice(REGS)
+    if kind == 3:
+        return "0x%X" % rand.randint(0, 0x100)
+    if kind == 4:
+        return "DWORD PTR [%s]" % rand.choice(REGS)
+    return "DWORD PTR [%s+0x%X]" % (rand.choice(REGS), 4 * rand.randint(0, 8))
+
+
+def gen_source(lines_nb, rand):
+    """Generate an x86_32 listing of @lines_nb instructions"""
+    out = ["main:"]
+    for i in xrange(lines_nb):
+        if i % 16 == 0:
+            out.append("lbl_%d:" % i)
+        kind = rand.randint(0, 9)
+        if kind == 0:
+            out.append("    PUSH   %s" % rand.choice(REGS))
+        elif kind == 1:
+            out.append("    JNZ    lbl_%d" % (16 * rand.randint(0, i / 16)))
+        else:
+            dst = gen_operand(rand)
+            src = gen_operand(rand)
+            if dst.startswith("0x"):
+                dst = rand.choice(REGS)
+            if "[" in dst:
+                # Avoid memory to memory / ambiguous immediate size
+                src = rand.choice(REGS)
+            mnemo = rand.choice(MNEMOS)
+            if mnemo == "TEST" and "[" in src:
+                # Only TEST mem, reg is available
+                dst, src = src, dst
+            out.append("    %-6s %s, %s" % (mnemo, dst, src))
+    out.append("    RET")
+    return "\n".join(out)
+
+
+if args.no_cache:
+    mn_x86.parse_cache_size = 0
+
+source = gen_source(args.lines, random.Random(args.seed))
+
+start = time.time()
+blocs, symbol_pool = parse_asm.parse_txt(mn_x86, 32, source)
+parsed = time.time()
+
+lines_nb = sum(len(bloc.lines) for bloc in blocs[0])
+print "Blocks:  %d" % len(blocs[0])
+print "Lines:   %d" % lines_nb
+print "Parsing: %.3fs (%.0f lines/s)" % (parsed - start,
+                                         lines_nb / (parsed - start))
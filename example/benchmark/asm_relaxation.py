@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+"""Benchmark the assembly of a large generated x86_32 shellcode, with
+branches of every distance to stress asm_resolve_final's relaxation"""
+from argparse import ArgumentParser
+import random
+import time
+
+from miasm2.arch.x86.arch import mn_x86
+from miasm2.core import parse_asm, asmbloc
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("-n", "--chunks", type=int, default=1500,
+                    help="Number of generated code chunks (about two blocks "
+                    "each)")
+parser.add_argument("-s", "--seed", type=int, default=0,
+                    help="Random generator seed")
+parser.add_argument("-o", "--output", help="Output file")
+args = parser.parse_args()
+
+
+def gen_source(chunks_nb, rand):
+    """Generate an x86_32 shellcode source of @chunks_nb code chunks"""
+    out = ["main:",
+           "    PUSH   EBP",
+           "    MOV    EBP, ESP"]
+    for i in xrange(chunks_nb):
+        # Mostly near destinations, sometimes far ones
+        if rand.random() < 0.8:
+            dst = min(chunks_nb - 1, max(0, i + rand.randint(-8, 8)))
+        else:
+            dst = rand.randint(0, chunks_nb - 1)
+        out += ["lbl_%d:" % i,
+                "    MOV    EAX, %d" % i,
+                "    CMP    EAX, %d" % rand.randint(0, chunks_nb),
+                "    JZ     lbl_%d" % dst,
+                "    ADD    EBX, ECX"]
+        kind = rand.randint(0, 3)
+        if kind == 0:
+            out.append("    JMP    lbl_%d" % rand.randint(0, chunks_nb - 1))
+        elif kind == 1:
+            out.append("    CALL   lbl_%d" % rand.randint(0, chunks_nb - 1))
+        elif kind == 2:
+            out.append("    MOV    ECX, DWORD PTR [data_%d]" %
+                       rand.randint(0, chunks_nb / 16))
+    out += ["    POP    EBP",
+            "    RET"]
+    for i in xrange(chunks_nb / 16 + 1):
+        out += ["data_%d:" % i,
+                '.string "data %d"' % i]
+    return "\n".join(out)
+
+
+source = gen_source(args.chunks, random.Random(args.seed))
+
+start = time.time()
+blocs, symbol_pool = parse_asm.parse_txt(mn_x86, 32, source)
+symbol_pool.set_offset(symbol_pool.getby_name("main"), 0)
+parsed = time.time()
+patches = asmbloc.asm_resolve_final(mn_x86, blocs[0], symbol_pool)
+assembled = time.time()
+
+lines_nb = sum(len(bloc.lines) for bloc in blocs[0])
+size = max(offset + len(data) for offset, data in patches.iteritems())
+print "Blocks:     %d" % len(blocs[0])
+print "Lines:      %d" % lines_nb
+print "Size:       %d bytes" % size
+print "Parsing:    %.3fs" % (parsed - start)
+print "Assembling: %.3fs (%.0f lines/s)" % (assembled - parsed,
+                                            lines_nb / (assembled - parsed))
+
+if args.output:
+    data = ["\x00"] * size
+    for offset, raw in patches.iteritems():
+        data[offset:offset + len(raw)] = list(raw)
+    open(args.output, "wb").write("".join(data))
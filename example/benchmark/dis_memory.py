@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+"""Benchmark the memory usage of a whole binary disassembly: disassemble a
+binary (PE, ELF, or raw with -m) from its entry point, following calls, and
+report its peak RSS"""
+from argparse import ArgumentParser
+import resource
+import time
+
+from miasm2.analysis.binary import Container
+from miasm2.analysis.machine import Machine
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("filename", help="File to disassemble")
+parser.add_argument("address", nargs="*",
+                    help="Starting addresses (default: entry point)")
+parser.add_argument("-m", "--architecture",
+                    help="Architecture: " + ",".join(Machine.available_machine()))
+args = parser.parse_args()
+
+
+def get_rss():
+    """Return the peak resident set size of the process, in KB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+with open(args.filename) as fdesc:
+    cont = Container.from_stream(fdesc)
+machine = Machine(args.architecture if args.architecture else cont.arch)
+mdis = machine.dis_engine(cont.bin_stream)
+mdis.follow_call = True
+if args.address:
+    addrs = [int(addr, 0) for addr in args.address]
+else:
+    addrs = [cont.entry_point]
+
+rss_start = get_rss()
+start = time.time()
+blocs = []
+for addr in addrs:
+    blocs = mdis.dis_multibloc(addr, blocs)
+stop = time.time()
+rss_stop = get_rss()
+
+lines_nb = sum(len(bloc.lines) for bloc in blocs)
+print "Blocks:       %d" % len(blocs)
+print "Instructions: %d" % lines_nb
+print "Disassembly:  %.3fs" % (stop - start)
+print "Peak RSS:     %d KB (%d KB before disassembly)" % (rss_stop, rss_start)
+if lines_nb:
+    print "Per instruction: %.0f bytes" % ((rss_stop - rss_start) * 1024. /
+                                           lines_nb)
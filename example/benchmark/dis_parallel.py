@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+"""Benchmark dis_multibloc_parallel against a serial disassembly of the same
+entry points, on a synthetic x86 binary of independent functions"""
+from argparse import ArgumentParser
+import multiprocessing
+import time
+
+from miasm2.arch.x86.disasm import dis_x86_32
+from miasm2.core.bin_stream import bin_stream_str
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("-f", "--functions", type=int, default=400,
+                    help="Number of functions")
+parser.add_argument("-l", "--length", type=int, default=100,
+                    help="Number of instructions per function")
+parser.add_argument("-p", "--processes", type=int,
+                    default=multiprocessing.cpu_count(),
+                    help="Number of worker processes")
+parser.add_argument("-c", "--chunksize", type=int, default=16,
+                    help="Number of entry points per worker job")
+args = parser.parse_args()
+
+# ADD EAX, EBX; ...; RET
+function = "\x01\xd8" * args.length + "\xc3"
+data = function * args.functions
+offsets = range(0, len(data), len(function))
+
+mdis = dis_x86_32(bin_stream_str(data))
+start = time.time()
+blocs = []
+for offset in offsets:
+    blocs = mdis.dis_multibloc(offset, blocs)
+serial = time.time() - start
+
+# Time spent merging the workers results in the current process
+merge_blocs = dis_x86_32._merge_blocs
+merge_time = [0.]
+def timed_merge_blocs(self, *margs):
+    start = time.time()
+    out = merge_blocs(self, *margs)
+    merge_time[0] += time.time() - start
+    return out
+dis_x86_32._merge_blocs = timed_merge_blocs
+
+mdis = dis_x86_32(bin_stream_str(data))
+start = time.time()
+mdis.dis_multibloc_parallel(offsets, processes=args.processes,
+                            chunksize=args.chunksize)
+parallel = time.time() - start
+
+print "Instructions: %d" % sum(len(bloc.lines) for bloc in blocs)
+print "Serial:       %.3fs" % serial
+print "Parallel:     %.3fs (%d processes, x%.2f)" % (parallel, args.processes,
+                                                      serial / parallel)
+print "Merge:        %.3fs" % merge_time[0]
@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+"""Benchmark the IR lifting of a whole binary disassembly: disassemble a
+binary (PE, ELF, or raw with -m) from its entry point, following calls, lift
+its blocks with and without the lifting cache, and in parallel, and report
+the lifting throughput and the cache hit rate"""
+from argparse import ArgumentParser
+import multiprocessing
+import time
+
+from miasm2.analysis.binary import Container
+from miasm2.analysis.machine import Machine
+from miasm2.core.asmbloc import asm_symbol_pool
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("filename", help="File to disassemble")
+parser.add_argument("address", nargs="*",
+                    help="Starting addresses (default: entry point)")
+parser.add_argument("-m", "--architecture",
+                    help="Architecture: " + ",".join(Machine.available_machine()))
+parser.add_argument("-s", "--cache-size", type=int, default=10000,
+                    help="Lifting cache size")
+parser.add_argument("-p", "--processes", type=int,
+                    default=multiprocessing.cpu_count(),
+                    help="Number of processes of the parallel lifting")
+parser.add_argument("-c", "--chunksize", type=int, default=16,
+                    help="Number of blocks per parallel lifting job")
+args = parser.parse_args()
+
+
+with open(args.filename) as fdesc:
+    cont = Container.from_stream(fdesc)
+machine = Machine(args.architecture if args.architecture else cont.arch)
+mdis = machine.dis_engine(cont.bin_stream)
+mdis.follow_call = True
+if args.address:
+    addrs = [int(addr, 0) for addr in args.address]
+else:
+    addrs = [cont.entry_point]
+
+blocs = []
+for addr in addrs:
+    blocs = mdis.dis_multibloc(addr, blocs)
+lines_nb = sum(len(bloc.lines) for bloc in blocs)
+print "Blocks:       %d" % len(blocs)
+print "Instructions: %d" % lines_nb
+
+for cache_size in [0, args.cache_size]:
+    ir_arch = machine.ira(asm_symbol_pool())
+    ir_arch.lift_cache_size = cache_size
+    start = time.time()
+    for bloc in blocs:
+        ir_arch.add_bloc(bloc)
+    duration = max(time.time() - start, 1e-9)
+    print
+    print "Lifting cache size: %d" % cache_size
+    print "  Lifting:    %.3fs (%.0f instructions/s)" % (duration,
+                                                        lines_nb / duration)
+    lifted = ir_arch.lift_cache_hits + ir_arch.lift_cache_misses
+    if lifted:
+        print "  Hit rate:   %.1f%% (%d hits, %d misses)" % (
+            100. * ir_arch.lift_cache_hits / lifted, ir_arch.lift_cache_hits,
+            ir_arch.lift_cache_misses)
+
+ir_arch = machine.ira(asm_symbol_pool())
+ir_arch.lift_cache_size = args.cache_size
+start = time.time()
+ir_arch.add_blocs(blocs, processes=args.processes, chunksize=args.chunksize)
+duration = max(time.time() - start, 1e-9)
+print
+print "Parallel lifting (%d processes, cache size %d)" % (args.processes,
+                                                          args.cache_size)
+print "  Lifting:    %.3fs (%.0f instructions/s)" % (duration,
+                                                    lines_nb / duration)
@@ -0,0 +1,35 @@
+#! /usr/bin/env python
+"""Benchmark the x86 decoding of the regression vectors of
+test/arch/x86/arch.py"""
+from argparse import ArgumentParser
+import os
+import re
+import time
+
+from miasm2.arch.x86.arch import mn_x86
+from miasm2.core.bin_stream import bin_stream_str
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument("-t", "--tests",
+                    default=os.path.join(os.path.dirname(__file__), "..", "..",
+                                         "test", "arch", "x86", "arch.py"),
+                    help="x86 regression tests file")
+parser.add_argument("-n", "--rounds", type=int, default=5,
+                    help="Number of decodings of each vector")
+args = parser.parse_args()
+
+# (mode, "instruction", "hex encoding") entries of reg_tests
+vector_re = re.compile(r'\(m(16|32|64),\s*"[^"]*",\s*"([0-9a-fA-F]+)"\)')
+vectors = [(int(mode), bin_stream_str(data.decode("hex")))
+           for mode, data in vector_re.findall(open(args.tests).read())]
+
+start = time.time()
+for _ in xrange(args.rounds):
+    for mode, bs in vectors:
+        mn_x86.dis(bs, mode)
+stop = time.time()
+
+decoded = len(vectors) * args.rounds
+print "Vectors:  %d" % len(vectors)
+print "Decoding: %.3fs (%.0f instructions/s)" % (stop - start,
+                                                  decoded / (stop - start))
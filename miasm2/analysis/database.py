@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""On-disk analysis database, used to avoid disassembling / lifting again a
+binary which has already been analysed.
+
+Usage:
+    db = AnalysisDatabase("analysis.db", data, "x86_32")
+    mdis = dis_x86_32(bin_stream_str(data), db=db)
+    blocs = mdis.dis_multibloc(entry_point) # Only decode unknown addresses
+    ir_arch = ir_a_x86_32(mdis.symbol_pool)
+    ir_arch.db = db
+    for bloc in blocs:
+        ir_arch.add_bloc(bloc)              # Only lift unknown blocks
+    db.close()
+"""
+
+import hashlib
+import logging
+import sqlite3
+from cStringIO import StringIO
+import cPickle as pickle
+
+from miasm2.core.asmbloc import asm_bloc, asm_label, asm_constraint
+
+log = logging.getLogger("database")
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter("%(levelname)-5s: %(message)s"))
+log.addHandler(console_handler)
+log.setLevel(logging.WARNING)
+
+
+class AnalysisDatabase(object):
+    """SQLite store of the results of an analysis, keyed by the binary content
+    hash and the architecture name.
+
+    Stored:
+     - labels of asm_symbol_pool (name, offset)
+     - asm_bloc boundaries, with their instructions
+     - asm_constraint edges between blocks
+     - (optional) IR blocks lifted from each asm_bloc
+     - (optional) function summaries, by function offset and IR hash
+
+    Labels are stored by name and offset; they are linked back to the
+    symbol_pool of the caller on load, so that the objects returned can be
+    mixed with freshly disassembled ones.
+
+    Blocks are stored as disassembled: the engine settings altering their
+    content (follow_call, dontdis_retcall, callbacks, ...) are expected to
+    be the same from one run to another. The disassembly callbacks
+    (dis_bloc_callback) are not run again on the loaded blocks: their
+    modifications are already stored, but their other side effects are
+    lost.
+
+    Stored objects are pickled: the database records the format 'version'
+    of the objects it contains, and is emptied on open if it differs.
+
+    Modifications are not committed until commit() (or close()) is called.
+    """
+
+    # Format of the stored objects, to increment when the layout of the
+    # pickled classes changes
+    version = 1
+
+    tables = ["labels", "blocs", "constraints", "irblocs", "summaries"]
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS meta (
+               key TEXT PRIMARY KEY, value TEXT)""",
+        """CREATE TABLE IF NOT EXISTS labels (
+               binary TEXT, name TEXT, offset INTEGER,
+               PRIMARY KEY (binary, name))""",
+        """CREATE TABLE IF NOT EXISTS blocs (
+               binary TEXT, offset INTEGER, end INTEGER, label TEXT,
+               alignment INTEGER, lines BLOB,
+               PRIMARY KEY (binary, offset))""",
+        """CREATE TABLE IF NOT EXISTS constraints (
+               binary TEXT, src INTEGER, label TEXT, offset INTEGER,
+               c_t TEXT)""",
+        """CREATE INDEX IF NOT EXISTS constraints_src
+               ON constraints (binary, src)""",
+        """CREATE TABLE IF NOT EXISTS irblocs (
+               binary TEXT, ir TEXT, offset INTEGER, end INTEGER,
+               irblocs BLOB,
+               PRIMARY KEY (binary, ir, offset, end))""",
+        """CREATE TABLE IF NOT EXISTS summaries (
+               binary TEXT, ir TEXT, offset INTEGER, hash TEXT,
+               summary BLOB,
+               PRIMARY KEY (binary, ir, offset, hash))""",
+    ]
+
+    def __init__(self, filename, data, arch_name):
+        """Open (or create) the database @filename, for the binary content
+        @data disassembled with architecture @arch_name
+        @filename: path of the SQLite file (or ":memory:")
+        @data: str, binary content
+        @arch_name: str, architecture name (as in Machine)
+        """
+        self.filename = filename
+        self.binary = "%s:%s" % (hashlib.sha256(data).hexdigest(), arch_name)
+        self.conn = sqlite3.connect(filename)
+        self.conn.text_factory = str
+        for request in self.schema:
+            self.conn.execute(request)
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key='version'").fetchone()
+        if row is None or row[0] != str(self.version):
+            self.reset()
+
+    def reset(self):
+        """Remove all the stored objects, of every binary"""
+        for table in self.tables:
+            self.conn.execute("DROP TABLE IF EXISTS %s" % table)
+        for request in self.schema:
+            self.conn.execute(request)
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                          (str(self.version),))
+        self.conn.commit()
+
+    # Serialization
+
+    @staticmethod
+    def _dumps(obj):
+        """Pickle @obj; asm_label instances are stored by (name, offset)"""
+        def persistent_id(item):
+            if isinstance(item, asm_label):
+                return (item.name, item.offset)
+            return None
+        out = StringIO()
+        pickler = pickle.Pickler(out, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = persistent_id
+        pickler.dump(obj)
+        return sqlite3.Binary(out.getvalue())
+
+    def _loads(self, blob, symbol_pool):
+        """Unpickle @blob, linking labels back to @symbol_pool"""
+        generated = {}
+
+        def persistent_load(pid):
+            name, offset = pid
+            return self._get_label(name, offset, symbol_pool, generated)
+        unpickler = pickle.Unpickler(StringIO(str(blob)))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+    @staticmethod
+    def _get_label(name, offset, symbol_pool, generated=None):
+        """Return the label of @symbol_pool matching the stored label
+        (@name, @offset)
+        Pinned labels are retrieved by offset, or created with their original
+        name if it is available (else with the default name of their
+        offset, and a warning). Unpinned labels are local to a stored object
+        (ie. labels generated during the IR lifting): a new label is generated
+        for each of them, memorized by name in @generated.
+        """
+        if offset is None:
+            if generated is None:
+                generated = {}
+            if name not in generated:
+                generated[name] = symbol_pool.gen_label()
+            return generated[name]
+        label = symbol_pool.getby_offset(offset)
+        if label is not None:
+            return label
+        if symbol_pool.getby_name(name) is not None:
+            log.warning("label %s at 0x%x: name already used, default "
+                        "name used", name, offset)
+            return symbol_pool.getby_offset_create(offset)
+        return symbol_pool.add_label(name, offset)
+
+    # Labels
+
+    def add_symbols(self, symbol_pool):
+        """Store the pinned labels of @symbol_pool"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO labels VALUES (?, ?, ?)",
+            ((self.binary, label.name, label.offset)
+             for label in symbol_pool.items
+             if isinstance(label.offset, (int, long))))
+
+    def load_symbols(self, symbol_pool):
+        """Add the stored labels to @symbol_pool
+        Return the list of the corresponding labels"""
+        cursor = self.conn.execute(
+            "SELECT name, offset FROM labels WHERE binary=? ORDER BY offset",
+            (self.binary,))
+        return [self._get_label(name, offset, symbol_pool)
+                for name, offset in cursor]
+
+    # Blocks
+
+    def add_bloc(self, bloc):
+        """Store the asm_bloc @bloc (and its label), replacing the previously
+        stored bloc starting at the same offset"""
+        offset = bloc.label.offset
+        if not isinstance(offset, (int, long)):
+            raise ValueError("bloc %s is not pinned" % bloc.label)
+        if bloc.lines:
+            end = bloc.lines[-1].offset + bloc.lines[-1].l
+        else:
+            end = offset
+        self.conn.execute(
+            "INSERT OR REPLACE INTO blocs VALUES (?, ?, ?, ?, ?, ?)",
+            (self.binary, offset, end, bloc.label.name, bloc.alignment,
+             self._dumps(bloc.lines)))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO labels VALUES (?, ?, ?)",
+            (self.binary, bloc.label.name, offset))
+        self.conn.execute(
+            "DELETE FROM constraints WHERE binary=? AND src=?",
+            (self.binary, offset))
+        self.conn.executemany(
+            "INSERT INTO constraints VALUES (?, ?, ?, ?, ?)",
+            ((self.binary, offset, cst.label.name, cst.label.offset, cst.c_t)
+             for cst in bloc.bto if isinstance(cst.label, asm_label)))
+
+    def add_blocs(self, blocs):
+        """Store each asm_bloc of @blocs"""
+        for bloc in blocs:
+            self.add_bloc(bloc)
+
+    def get_bloc(self, offset, symbol_pool):
+        """Return the asm_bloc stored at @offset, using labels from
+        @symbol_pool, or None if it is unknown
+        The disassembly callbacks are not run on the returned bloc"""
+        row = self.conn.execute(
+            "SELECT label, alignment, lines FROM blocs "
+            "WHERE binary=? AND offset=?", (self.binary, offset)).fetchone()
+        if row is None:
+            return None
+        name, alignment, lines = row
+        bloc = asm_bloc(self._get_label(name, offset, symbol_pool), alignment)
+        bloc.lines = self._loads(lines, symbol_pool)
+        cursor = self.conn.execute(
+            "SELECT label, offset, c_t FROM constraints "
+            "WHERE binary=? AND src=?", (self.binary, offset))
+        for name, dst, c_t in cursor:
+            label = self._get_label(name, dst, symbol_pool)
+            bloc.addto(asm_constraint(label, c_t))
+        return bloc
+
+    def get_bloc_offsets(self):
+        """Return the sorted list of (start, stop) of the stored blocks"""
+        cursor = self.conn.execute(
+            "SELECT offset, end FROM blocs WHERE binary=? ORDER BY offset",
+            (self.binary,))
+        return cursor.fetchall()
+
+    # IR
+
+    @staticmethod
+    def _ir_name(ir_arch, gen_pc_updt):
+        """Identifier of the lifter @ir_arch"""
+        name = "%s.%s" % (ir_arch.__class__.__module__,
+                          ir_arch.__class__.__name__)
+        if gen_pc_updt is not False:
+            name += ":pc_updt"
+        return name
+
+    @staticmethod
+    def _bloc_bounds(bloc):
+        """Return the (first, last) offset of the lines of @bloc"""
+        if not bloc.lines:
+            return None, None
+        return bloc.lines[0].offset, bloc.lines[-1].offset
+
+    @staticmethod
+    def _get_generated_irblocs(ir_arch, irblocs):
+        """Return the IR blocks registered by @ir_arch in addition to
+        @irblocs, ie. the ones reached from @irblocs through unpinned labels
+        (for instance, the call effects added by the IR analysis)"""
+        done = set(irb.label for irb in irblocs)
+        todo = list(irblocs)
+        extra = []
+        while todo:
+            irb = todo.pop()
+            if irb.dst is None:
+                continue
+            for expr in irb.dst.get_r(cst_read=True):
+                if not ir_arch.ExprIsLabel(expr):
+                    continue
+                label = expr.name
+                if label.offset is not None or label in done:
+                    continue
+                done.add(label)
+                if label in ir_arch.blocs:
+                    extra.append(ir_arch.blocs[label])
+                    todo.append(ir_arch.blocs[label])
+        return extra
+
+    def add_irblocs(self, ir_arch, bloc, irblocs, gen_pc_updt=False):
+        """Store @irblocs, the IR blocks lifted by @ir_arch from the asm_bloc
+        @bloc, and the additional blocks generated during the lifting
+        @gen_pc_updt: add_bloc argument used to lift @bloc"""
+        offset, end = self._bloc_bounds(bloc)
+        if offset is None:
+            return
+        extra = self._get_generated_irblocs(ir_arch, irblocs)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO irblocs VALUES (?, ?, ?, ?, ?)",
+            (self.binary, self._ir_name(ir_arch, gen_pc_updt), offset, end,
+             self._dumps((irblocs, extra))))
+
+    def get_irblocs(self, ir_arch, bloc, gen_pc_updt=False):
+        """Return the IR blocks lifted by @ir_arch from @bloc, using labels
+        from ir_arch's symbol_pool, or None if they are unknown
+        The IR blocks and the additional generated ones are returned as a
+        tuple (irblocs, extra)
+        @gen_pc_updt: add_bloc argument used to lift @bloc"""
+        offset, end = self._bloc_bounds(bloc)
+        if offset is None:
+            return None
+        row = self.conn.execute(
+            "SELECT irblocs FROM irblocs "
+            "WHERE binary=? AND ir=? AND offset=? AND end=?",
+            (self.binary, self._ir_name(ir_arch, gen_pc_updt), offset,
+             end)).fetchone()
+        if row is None:
+            return None
+        return self._loads(row[0], ir_arch.symbol_pool)
+
+    # Function summaries
+
+    def add_summary(self, ir_arch, summary):
+        """Store the FunctionSummary @summary computed by @ir_arch"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+            (self.binary, self._ir_name(ir_arch, False), summary.entry,
+             summary.ir_hash, self._dumps(summary)))
+
+    def get_summary(self, ir_arch, offset, ir_hash):
+        """Return the FunctionSummary of the function at @offset whose IR
+        hash is @ir_hash, computed by @ir_arch, or None if it is unknown"""
+        row = self.conn.execute(
+            "SELECT summary FROM summaries "
+            "WHERE binary=? AND ir=? AND offset=? AND hash=?",
+            (self.binary, self._ir_name(ir_arch, False), offset,
+             ir_hash)).fetchone()
+        if row is None:
+            return None
+        return self._loads(row[0], ir_arch.symbol_pool)
+
+    # Transactions
+
+    def commit(self):
+        """Commit the modifications to the database file"""
+        self.conn.commit()
+
+    def close(self):
+        """Commit and close the database"""
+        self.conn.commit()
+        self.conn.close()
@@ -15,6 +15,7 @@ from miasm2.expression.simplifications import expr_simp
 from miasm2.ir.symbexec import symbexec
 from miasm2.ir.ir import irbloc
 from miasm2.ir.translators import Translator
+from miasm2.analysis.summary import apply_call_summary
 
 
 class DependencyNode(object):
@@ -464,16 +465,20 @@ class DependencyResult(object):
 
     """Container and methods for DependencyGraph results"""
 
-    def __init__(self, ira, final_depdict, input_depnodes):
+    def __init__(self, ira, final_depdict, input_depnodes,
+                 use_summaries=False):
         """Instance a DependencyResult
         @ira: IRAnalysis instance
         @final_depdict: DependencyDict instance
         @input_depnodes: set of DependencyNode instance
+        @use_summaries: (optional) emulate function calls with the summary of
+        the callee, if any
         """
         # Store arguments
         self._ira = ira
         self._depdict = final_depdict
         self._input_depnodes = input_depnodes
+        self._use_summaries = use_summaries
 
         # Init lazy elements
         self._graph = None
@@ -562,7 +567,8 @@ class DependencyResult(object):
 
         # Eval the block
         temp_label = asm_label("Temp")
-        symb_exec = symbexec(self._ira, ctx_init)
+        symb_exec = symbexec(self._ira, ctx_init,
+                             use_summaries=self._use_summaries)
         symb_exec.emulbloc(irbloc(temp_label, affects), step=step)
 
         # Return only inputs values (others could be wrongs)
@@ -575,8 +581,8 @@ class DependencyResultImplicit(DependencyResult):
     """Stand for a result of a DependencyGraph with implicit option
 
     Provide path constraints using the z3 solver"""
-    __slots__ = ["_ira", "_depdict", "_input_depnodes", "_graph",
-                 "_has_loop", "_solver"]
+    __slots__ = ["_ira", "_depdict", "_input_depnodes", "_use_summaries",
+                 "_graph", "_has_loop", "_solver"]
 
     # Z3 Solver instance
     _solver = None
@@ -588,7 +594,8 @@ class DependencyResultImplicit(DependencyResult):
             ctx_init.update(ctx)
         depnodes = self.relevant_nodes
         solver = z3.Solver()
-        symb_exec = symbexec(self._ira, ctx_init)
+        symb_exec = symbexec(self._ira, ctx_init,
+                             use_summaries=self._use_summaries)
         temp_label = asm_label("Temp")
         history = self.relevant_labels[::-1]
         history_size = len(history)
@@ -684,12 +691,14 @@ class DependencyGraph(object):
     """
 
     def __init__(self, ira, implicit=False, apply_simp=True, follow_mem=True,
-                 follow_call=True):
+                 follow_call=True, use_summaries=False):
         """Create a DependencyGraph linked to @ira
         The IRA graph must have been computed
 
         @ira: IRAnalysis instance
         @implicit: (optional) Imply implicit dependencies
+        @use_summaries: (optional) Replace function calls by the summary of
+        the callee, if any (see miasm2.analysis.summary.get_summary)
 
         Following arguments define filters used to generate dependencies
         @apply_simp: (optional) Apply expr_simp
@@ -699,6 +708,9 @@ class DependencyGraph(object):
         # Init
         self._ira = ira
         self._implicit = implicit
+        self._use_summaries = use_summaries
+        # (label, line number) -> (line, line with summary, read, written)
+        self._summary_lines = {}
         self._step_counter = itertools.count()
         self._current_step = next(self._step_counter)
 
@@ -812,10 +824,43 @@ class DependencyGraph(object):
         "Return the irs associated to @label"
         return self._ira.blocs[label].irs
 
+    def _get_summary_line(self, label, line_nb):
+        """Return the line @line_nb of the irbloc @label with its function
+        call replaced by the callee summary, and its (read, written)
+        elements, or None if there is no summary"""
+        line = tuple(self._get_irs(label)[line_nb])
+        cached = self._summary_lines.get((label, line_nb))
+        if cached is None or cached[0] != line:
+            exprs = apply_call_summary(self._ira, line)
+            if exprs is None:
+                cached = (line, None)
+            else:
+                read, written = set(), set()
+                for expr in exprs:
+                    read.update(expr.get_r(mem_read=True))
+                    written.update(expr.get_w())
+                cached = (line, (exprs, read, written))
+            self._summary_lines[(label, line_nb)] = cached
+        return cached[1]
+
+    def _get_line_rw(self, label, line_nb):
+        """Return the (read, written) elements of the line @line_nb of the
+        irbloc @label"""
+        if self._use_summaries:
+            summary_line = self._get_summary_line(label, line_nb)
+            if summary_line is not None:
+                return summary_line[1:]
+        return self._ira.blocs[label].get_line_rw(line_nb)
+
     def _get_affblock(self, depnode):
         """Return the list of ExprAff associtiated to @depnode.
         LINE_NB must be > 0"""
-        return self._get_irs(depnode.label)[depnode.line_nb - 1]
+        line_nb = depnode.line_nb - 1
+        if self._use_summaries:
+            summary_line = self._get_summary_line(depnode.label, line_nb)
+            if summary_line is not None:
+                return summary_line[0]
+        return self._get_irs(depnode.label)[line_nb]
 
     def _direct_depnode_dependencies(self, depnode):
         """Compute and return the dependencies involved by @depnode,
@@ -836,11 +881,13 @@ class DependencyGraph(object):
             read = set()
             modifier = False
 
-            for affect in self._get_affblock(depnode):
-                if affect.dst == depnode.element:
-                    elements = self._follow_apply_cb(affect.src)
-                    read.update(elements)
-                    modifier = True
+            _, written = self._get_line_rw(depnode.label, depnode.line_nb - 1)
+            if depnode.element in written:
+                for affect in self._get_affblock(depnode):
+                    if affect.dst == depnode.element:
+                        elements = self._follow_apply_cb(affect.src)
+                        read.update(elements)
+                        modifier = True
 
             # If it's not a modifier affblock, reinject current element
             if not modifier:
@@ -1005,7 +1052,8 @@ class DependencyGraph(object):
                 unified.append(final_depdict)
 
                 # Return solutions as DiGraph
-                yield cls_res(self._ira, final_depdict, input_depnodes)
+                yield cls_res(self._ira, final_depdict, input_depnodes,
+                              self._use_summaries)
 
     def get_from_depnodes(self, depnodes, heads):
         """Alias for the get() method. Use the attributes of @depnodes as
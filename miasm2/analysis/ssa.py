@@ -0,0 +1,207 @@
+"""Static Single Assignment form of IR blocks, with def-use chains.
+
+Usage:
+    ira.gen_graph()
+    ssa = SSA(ira, head_label)
+    for ssa_var, definition in ssa.defs.iteritems():
+        print ssa_var, definition, ssa.uses[ssa_var]
+"""
+
+import miasm2.expression.expression as m2_expr
+from miasm2.core.asmbloc import expr_is_label
+from miasm2.ir.ir import irbloc
+
+
+# Operator of phi functions: ExprOp(PHI_OP, *one argument per predecessor)
+PHI_OP = "Phi"
+
+
+class SSA(object):
+    """SSA form of the irblocs of an ira reachable from a head.
+
+    Phi functions are inserted at the dominance frontiers of the variables
+    definitions, where the variables are live (see ira.compute_liveness).
+    The written ExprId (registers, IRDst, temporaries) are renamed in
+    '<name>.<version>'; version 0 stands for the value entering the head.
+
+    Attributes:
+     - blocs: label -> irbloc in SSA form. Its first line holds the phi
+       functions, if any (see 'phi_preds')
+     - phi_preds: label -> predecessors labels, in the order of its phi
+       functions arguments
+     - ssa_to_var: SSA variable -> original variable
+     - defs: SSA variable -> (label, line number, ExprAff) defining it, None
+       for version 0
+     - uses: SSA variable -> set of (label, line number, ExprAff) reading it
+
+    Line numbers are the ones of the irblocs in SSA form.
+    """
+
+    def __init__(self, ir_arch, head):
+        """Compute the SSA form of the irblocs of @ir_arch reachable from the
+        label @head
+        PRE: gen_graph()"""
+        self.ir_arch = ir_arch
+        self.graph = ir_arch.g
+        self.head = head
+        self.blocs = {}
+        self.phi_preds = {}
+        self.ssa_to_var = {}
+        self.defs = {}
+        self.uses = {}
+        # variable -> number of versions
+        self._versions = {}
+
+        nodes = set([head])
+        nodes.update(self.graph.reachable_sons(head))
+        self._nodes = set(node for node in nodes if node in ir_arch.blocs)
+        phis = self._place_phis()
+        self._rename(phis)
+        self._gen_def_use()
+
+    def _new_version(self, var):
+        """Return a new SSA variable for @var"""
+        version = self._versions.get(var, 0)
+        self._versions[var] = version + 1
+        ssa_var = m2_expr.ExprId("%s.%d" % (var.name, version), var.size)
+        self.ssa_to_var[ssa_var] = var
+        return ssa_var
+
+    def _place_phis(self):
+        """Return the label -> variables needing a phi function"""
+        defsites = {}
+        for label in self._nodes:
+            for exprs in self.ir_arch.blocs[label].irs:
+                for expr in exprs:
+                    dst = expr.dst
+                    if isinstance(dst, m2_expr.ExprId) and \
+                            not expr_is_label(dst):
+                        defsites.setdefault(dst, set()).add(label)
+
+        frontier = self.graph.compute_dominance_frontier(self.head)
+        liveness = self.ir_arch.compute_liveness()
+        phis = {}
+        for var, sites in defsites.iteritems():
+            todo = list(sites)
+            done = set()
+            while todo:
+                label = todo.pop()
+                for join in frontier.get(label, []):
+                    if join in done or join not in self._nodes:
+                        continue
+                    done.add(join)
+                    # Pruned SSA: no phi for dead variables
+                    if var in liveness.regs and \
+                            not liveness.before[join] & liveness.regs.bit(var):
+                        continue
+                    phis.setdefault(join, []).append(var)
+                    if join not in sites:
+                        todo.append(join)
+        return phis
+
+    def _rename(self, phis):
+        """Rename the variables along the dominator tree, inserting the phi
+        functions of @phis"""
+        # Variables values entering the head
+        current = {}
+        for label in self._nodes:
+            for exprs in self.ir_arch.blocs[label].irs:
+                for expr in exprs:
+                    if isinstance(expr.dst, m2_expr.ExprId) and \
+                            expr.dst not in current and \
+                            not expr_is_label(expr.dst):
+                        current[expr.dst] = self._new_version(expr.dst)
+
+        children = {}
+        for node, idom in self.graph.compute_immediate_dominators(
+                self.head).iteritems():
+            children.setdefault(idom, []).append(node)
+
+        # label -> {variable: list of SSA variable per predecessor}
+        phi_args = {}
+        phi_dsts = {}
+        for label, variables in phis.iteritems():
+            self.phi_preds[label] = self.graph.predecessors(label)
+            phi_args[label] = dict((var, [current[var]] *
+                                    len(self.phi_preds[label]))
+                                   for var in variables)
+
+        # Depth first walk of the dominator tree; the variables values are
+        # restored when leaving a node
+        todo = [(self.head, None)]
+        while todo:
+            label, saved = todo.pop()
+            if saved is not None:
+                current.update(saved)
+                continue
+            if label not in self._nodes:
+                continue
+            saved = {}
+
+            def define(var):
+                if var not in saved:
+                    saved[var] = current[var]
+                current[var] = self._new_version(var)
+                return current[var]
+
+            irs = []
+            if label in phis:
+                phi_dsts[label] = [(define(var), var) for var in phis[label]]
+                irs.append([])
+            for exprs in self.ir_arch.blocs[label].irs:
+                # Affectations of a line are parallel: sources are renamed
+                # before the definitions
+                renamed = []
+                for expr in exprs:
+                    dst = expr.dst
+                    if isinstance(dst, m2_expr.ExprMem):
+                        dst = m2_expr.ExprMem(dst.arg.replace_expr(current),
+                                              dst.size)
+                    renamed.append((dst, expr.src.replace_expr(current)))
+                line = []
+                for dst, src in renamed:
+                    if isinstance(dst, m2_expr.ExprId) and \
+                            not expr_is_label(dst):
+                        dst = define(dst)
+                    line.append(m2_expr.ExprAff(dst, src))
+                irs.append(line)
+
+            for succ in self.graph.successors_iter(label):
+                if succ not in phi_args:
+                    continue
+                for index, pred in enumerate(self.phi_preds[succ]):
+                    if pred != label:
+                        continue
+                    for var, args in phi_args[succ].iteritems():
+                        args[index] = current[var]
+
+            lines = [None] * (len(irs) - len(self.ir_arch.blocs[label].irs))
+            lines += self.ir_arch.blocs[label].lines
+            self.blocs[label] = irbloc(label, irs, lines)
+
+            todo.append((label, saved))
+            todo += [(child, None) for child in children.get(label, [])]
+
+        for label, dsts in phi_dsts.iteritems():
+            self.blocs[label].irs[0] = [
+                m2_expr.ExprAff(dst, m2_expr.ExprOp(PHI_OP,
+                                                    *phi_args[label][var]))
+                for dst, var in dsts]
+
+    def _gen_def_use(self):
+        """Compute the def-use chains of the SSA variables"""
+        for ssa_var in self.ssa_to_var:
+            self.defs[ssa_var] = None
+            self.uses[ssa_var] = set()
+        for label, irb in self.blocs.iteritems():
+            for line_nb, exprs in enumerate(irb.irs):
+                for expr in exprs:
+                    if expr.dst in self.ssa_to_var:
+                        self.defs[expr.dst] = (label, line_nb, expr)
+                    for var in expr.get_r(True):
+                        if var in self.ssa_to_var:
+                            self.uses[var].add((label, line_nb, expr))
+
+    def is_phi(self, expr):
+        """Return True if the ExprAff @expr is a phi function"""
+        return isinstance(expr.src, m2_expr.ExprOp) and expr.src.op == PHI_OP
@@ -0,0 +1,512 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Function summaries: the register and memory effects of a function,
+computed once and used in place of the function calls.
+
+Usage:
+    for bloc in blocs:
+        ir_arch.add_bloc(bloc)
+    summary = get_summary(ir_arch, func_offset)
+    print summary.stack_delta, summary.modified_regs
+    # Calls to summarized functions are replaced by their effects
+    sb = symbexec(ir_arch, regs_init, use_summaries=True)
+    dg = DependencyGraph(ir_arch, use_summaries=True)
+"""
+
+import hashlib
+import weakref
+
+import miasm2.expression.expression as m2_expr
+from miasm2.expression.simplifications import expr_simp
+from miasm2.core.asmbloc import asm_label
+from miasm2.core.dataflow import reverse_postorder
+from miasm2.core.graph import DiGraph
+from miasm2.ir.symbexec import symbexec, symbols
+
+
+# Operator of the value of a register modified by a callee to an unknown
+# value: ExprOp(CLOBBER_OP, register value before the call)
+CLOBBER_OP = "call_func_clobber"
+
+# Prefix of the names of the unknown values used during the computation
+UNKNOWN_PREFIX = "summary_unknown."
+
+# ir_arch -> _SummaryState
+_states = weakref.WeakKeyDictionary()
+
+
+class FunctionSummary(object):
+    """Register and memory effects of a function, from its entry to its
+    returns.
+
+    Values are expressions of the registers and memory at the function
+    entry.
+
+    Attributes:
+     - entry: int, offset of the function
+     - ir_hash: str, hash of the function IR (see function_ir_hash)
+     - modified_regs: set of the registers which may differ at the exit
+     - outputs: register -> value at the exit, for the modified registers
+       whose value is known. The other ones are clobbered
+     - mem_writes: list of (ExprMem, value) of the memory written, the
+       function stack frame excluded
+     - mem_complete: False if the function may write memory not described
+       in mem_writes (in loops, or in callees without summary)
+     - stack_delta: int, stack pointer at the exit minus at the entry, or
+       None if it is unknown
+     - callees: offset -> ir_hash of the called functions whose summaries
+       were used (None for the ones without summary)
+    """
+
+    def __init__(self, entry, ir_hash):
+        self.entry = entry
+        self.ir_hash = ir_hash
+        self.modified_regs = set()
+        self.outputs = {}
+        self.mem_writes = []
+        self.mem_complete = True
+        self.stack_delta = None
+        self.callees = {}
+
+    @property
+    def clobbered_regs(self):
+        """Modified registers whose value is unknown"""
+        return set(reg for reg in self.modified_regs
+                   if reg not in self.outputs)
+
+    def get_exprs(self):
+        """Return the effects of the function as a list of ExprAff, to be
+        evaluated at once (as an IR line)
+        Expressions are copied: symbexec marks the expressions it evaluates
+        as terminal ones"""
+        exprs = [m2_expr.ExprAff(reg, value.copy())
+                 for reg, value in self.outputs.iteritems()]
+        exprs += [m2_expr.ExprAff(reg, m2_expr.ExprOp(CLOBBER_OP, reg))
+                  for reg in self.clobbered_regs]
+        exprs += [m2_expr.ExprAff(mem.copy(), value.copy())
+                  for mem, value in self.mem_writes]
+        return exprs
+
+    def apply(self, exprs):
+        """Return the IR line @exprs, calling the function, with the call
+        effects replaced by the function ones"""
+        effects = self.get_exprs()
+        written = set(expr.dst for expr in effects)
+        return [expr for expr in exprs
+                if get_call_target([expr]) is None and
+                expr.dst not in written] + effects
+
+    def __str__(self):
+        out = ["summary of 0x%x" % self.entry]
+        out.append("stack delta: %s" % self.stack_delta)
+        for reg in sorted(self.modified_regs):
+            out.append("%s = %s" % (reg, self.outputs.get(reg, "?")))
+        for mem, value in self.mem_writes:
+            out.append("%s = %s" % (mem, value))
+        if not self.mem_complete:
+            out.append("(other memory writes)")
+        return "\n".join(out)
+
+
+def get_call_target(exprs):
+    """Return the target of the function call in the IR line @exprs (first
+    argument of its call operators), or None if it has no call"""
+    targets = set()
+    for expr in exprs:
+        src = expr.src
+        if isinstance(src, m2_expr.ExprOp) and src.is_function_call() and \
+                src.op != CLOBBER_OP and src.args:
+            targets.add(src.args[0])
+    if len(targets) != 1:
+        return None
+    return targets.pop()
+
+
+def get_target_offset(target):
+    """Return the offset of the call target @target (ExprInt or pinned label
+    ExprId), or None"""
+    if isinstance(target, m2_expr.ExprInt):
+        return int(target.arg)
+    if isinstance(target, m2_expr.ExprId) and \
+            isinstance(target.name, asm_label):
+        return target.name.offset
+    return None
+
+
+def function_graph(ir_arch, entry):
+    """Return the DiGraph of the irblocs of @ir_arch reachable from the label
+    @entry, or None if one of them is not lifted"""
+    graph = DiGraph()
+    graph.add_node(entry)
+    todo = [entry]
+    done = set(todo)
+    while todo:
+        label = todo.pop()
+        irb = ir_arch.blocs.get(label)
+        if irb is None:
+            return None
+        for dst in ir_arch.dst_labels(irb):
+            graph.add_edge(label, dst)
+            if dst not in done:
+                done.add(dst)
+                todo.append(dst)
+    return graph
+
+
+def function_ir_hash(ir_arch, graph):
+    """Return a hash of the irblocs of @graph which does not depend on the
+    labels names: pinned labels are named by offset, and unpinned ones are
+    not distinguished"""
+    texts = []
+    for label in graph.nodes():
+        irb = ir_arch.blocs[label]
+        labels = {}
+        for exprs in irb.irs:
+            for expr in exprs:
+                for elem in expr.get_r(cst_read=True):
+                    if ir_arch.ExprIsLabel(elem):
+                        labels[elem] = m2_expr.ExprId(
+                            _label_name(elem.name), elem.size)
+        lines = [_label_name(label)]
+        for exprs in irb.irs:
+            lines += sorted(str(expr.replace_expr(labels)) for expr in exprs)
+            lines.append("")
+        texts.append("\n".join(lines))
+    return hashlib.sha256("\n".join(sorted(texts))).hexdigest()
+
+
+def _label_name(label):
+    """Canonical name of @label"""
+    if label.offset is None:
+        return "lbl_gen"
+    return "loc_%x" % label.offset
+
+
+class _SummaryBuilder(object):
+    """Symbolic execution of a function along its graph, merging the states
+    at join points. Registers modified in a loop are set to unknown values
+    at each bloc of the loop, as the memory if the loop writes memory.
+
+    Registers start with their initial values (arch.regs.regs_init), so
+    that values computed from the entry registers are not evaluated again
+    (see to_entry_regs)"""
+
+    def __init__(self, ir_arch, graph, entry):
+        self.ir_arch = ir_arch
+        self.graph = graph
+        self.entry = entry
+        self.unknown_nb = 0
+        self.mem_complete = True
+        self.callees = {}
+        self.sb = symbexec(ir_arch, {})
+        self.regs_init = ir_arch.arch.regs.regs_init
+        self.init_regs = dict((init, reg)
+                              for reg, init in self.regs_init.iteritems())
+
+        # label -> (registers written in its loop, True if it writes memory)
+        self.loops = {}
+        for scc in graph.compute_strongly_connected_components():
+            label = next(iter(scc))
+            if len(scc) == 1 and label not in graph.successors(label):
+                continue
+            regs, mem = set(), False
+            for label in scc:
+                for exprs in ir_arch.blocs[label].irs:
+                    for expr in exprs:
+                        if isinstance(expr.dst, m2_expr.ExprMem):
+                            mem = True
+                        else:
+                            regs.add(expr.dst)
+                    if get_call_target(exprs) is not None:
+                        mem = True
+            for label in scc:
+                self.loops[label] = (regs, mem)
+
+    def to_entry_regs(self, expr):
+        """Return @expr with the initial values replaced by their registers"""
+        return expr.replace_expr(self.init_regs)
+
+    def unknown(self, expr):
+        """Return a new unknown value of the size of @expr"""
+        self.unknown_nb += 1
+        return m2_expr.ExprId("%s%d" % (UNKNOWN_PREFIX, self.unknown_nb),
+                              expr.size)
+
+    @staticmethod
+    def is_known(expr, mem_havoc):
+        """Return True if @expr does not read unknown values (nor memory, if
+        the memory is unknown)"""
+        for elem in expr.get_r(mem_read=True):
+            if isinstance(elem, m2_expr.ExprMem):
+                if mem_havoc:
+                    return False
+            elif isinstance(elem.name, str) and \
+                    elem.name.startswith(UNKNOWN_PREFIX):
+                return False
+        return True
+
+    def merge(self, states):
+        """Merge @states, list of (symbols, memory havoc flag). Differing
+        values are replaced by unknown ones"""
+        merged = states[0][0].copy()
+        mem_havoc = any(havoc for _, havoc in states)
+        for syms, _ in states[1:]:
+            for key in set(merged.symbols_id).union(syms.symbols_id):
+                if merged.symbols_id.get(key, key) != \
+                        syms.symbols_id.get(key, key):
+                    merged.symbols_id[key] = self.unknown(key)
+            for addr in set(merged.symbols_mem).union(syms.symbols_mem):
+                value_a = merged.symbols_mem.get(addr)
+                value_b = syms.symbols_mem.get(addr)
+                if value_a == value_b:
+                    continue
+                mems = [value[0] for value in [value_a, value_b]
+                        if value is not None]
+                if len(mems) == 2 and mems[0].size != mems[1].size:
+                    # Overlapping writes: forget them
+                    del merged.symbols_mem[addr]
+                    mem_havoc = True
+                    continue
+                merged.symbols_mem[addr] = (mems[0], self.unknown(mems[0]))
+        return merged, mem_havoc
+
+    def forget_stack_frame(self, syms):
+        """Remove from @syms the memory below the stack pointer"""
+        sp = self.ir_arch.sp
+        sp_val = syms.symbols_id.get(sp, sp)
+        for addr, (mem, _) in syms.symbols_mem.items():
+            if addr.size != sp_val.size:
+                continue
+            diff = expr_simp(addr - sp_val)
+            if isinstance(diff, m2_expr.ExprInt) and \
+                    int(diff.arg) >> (diff.size - 1):
+                del syms[mem]
+
+    def eval_line(self, exprs):
+        """Symbolic execution of the IR line @exprs, using the callee summary
+        of function calls"""
+        target = get_call_target(exprs)
+        if target is not None:
+            offset = get_target_offset(
+                self.sb.expr_simp(self.sb.eval_expr(target, {})))
+            summary = None
+            if offset is not None:
+                summary = get_summary(self.ir_arch, offset)
+                label = self.ir_arch.symbol_pool.getby_offset(offset)
+                if label not in _get_state(self.ir_arch).pending:
+                    self.callees[offset] = (None if summary is None
+                                            else summary.ir_hash)
+            if summary is None:
+                self.mem_complete = False
+            else:
+                exprs = summary.apply(exprs)
+                self.mem_complete &= summary.mem_complete
+        self.sb.eval_ir(exprs)
+
+    def run(self):
+        """Return the merged state of the function exits, or None if it has
+        no exit"""
+        out_states = {}
+        for label in reverse_postorder(self.graph, [self.entry]):
+            states = [out_states[pred]
+                      for pred in self.graph.predecessors_iter(label)
+                      if pred in out_states]
+            if label == self.entry:
+                syms = symbols()
+                for reg, init in self.regs_init.iteritems():
+                    syms[reg] = init
+                states.append((syms, False))
+            syms, mem_havoc = self.merge(states)
+            if label in self.loops:
+                regs, mem = self.loops[label]
+                for reg in regs:
+                    syms[reg] = self.unknown(reg)
+                if mem:
+                    syms.symbols_mem.clear()
+                    mem_havoc = True
+            self.sb.symbols = syms
+            for exprs in self.ir_arch.blocs[label].irs:
+                self.eval_line(exprs)
+            out_states[label] = (self.sb.symbols, mem_havoc)
+
+        exits = []
+        for label in self.graph.leaves():
+            syms, mem_havoc = out_states[label]
+            syms = syms.copy()
+            self.forget_stack_frame(syms)
+            exits.append((syms, mem_havoc))
+        if not exits:
+            return None
+        return self.merge(exits)
+
+
+def compute_summary(ir_arch, graph, entry, ir_hash):
+    """Return the FunctionSummary of the function of @ir_arch whose irblocs
+    are @graph, starting at the label @entry, or None if it never returns
+    @ir_hash: function_ir_hash of @graph"""
+    builder = _SummaryBuilder(ir_arch, graph, entry)
+    state = builder.run()
+    if state is None:
+        return None
+    syms, mem_havoc = state
+
+    summary = FunctionSummary(entry.offset, ir_hash)
+    summary.callees = builder.callees
+    summary.mem_complete = builder.mem_complete and not mem_havoc
+    ignored = set([ir_arch.IRDst, ir_arch.pc])
+    for reg in ir_arch.arch.regs.all_regs_ids:
+        value = builder.to_entry_regs(syms.symbols_id.get(reg, reg))
+        if reg in ignored or value == reg:
+            continue
+        summary.modified_regs.add(reg)
+        if builder.is_known(value, mem_havoc):
+            summary.outputs[reg] = value
+    for mem, value in syms.symbols_mem.itervalues():
+        mem = builder.to_entry_regs(mem)
+        value = builder.to_entry_regs(value)
+        if builder.is_known(mem.arg, mem_havoc) and \
+                builder.is_known(value, mem_havoc):
+            summary.mem_writes.append((mem, value))
+        else:
+            summary.mem_complete = False
+
+    sp = ir_arch.sp
+    if sp not in summary.modified_regs:
+        summary.stack_delta = 0
+    elif sp in summary.outputs:
+        delta = expr_simp(summary.outputs[sp] - sp)
+        if isinstance(delta, m2_expr.ExprInt):
+            delta = int(delta.arg)
+            if delta >> (sp.size - 1):
+                delta -= 1 << sp.size
+            summary.stack_delta = delta
+    return summary
+
+
+class _SummaryState(object):
+    """Summaries of the functions of an ir_arch"""
+
+    def __init__(self):
+        # label -> FunctionSummary
+        self.summaries = {}
+        # Labels of the functions whose summary is being computed
+        self.pending = set()
+        # label -> (function graph, IR stamp, IR hash)
+        self.functions = {}
+
+
+def _get_state(ir_arch):
+    """Return the _SummaryState of @ir_arch"""
+    state = _states.get(ir_arch)
+    if state is None:
+        state = _states[ir_arch] = _SummaryState()
+    return state
+
+
+def _ir_stamp(ir_arch, graph):
+    """Return the stamp of the irblocs of @graph: the irblocs and their
+    lines. Stamps are compared by identity of their items, which is cheaper
+    than the IR hash, and detects the lines modified in place"""
+    stamp = []
+    for label in graph.nodes():
+        irb = ir_arch.blocs.get(label)
+        stamp.append(irb)
+        if irb is not None:
+            stamp += [tuple(exprs) for exprs in irb.irs]
+    return stamp
+
+
+def _get_function(ir_arch, label):
+    """Return the (graph, IR hash) of the function of @ir_arch starting at
+    @label, or None if it is not entirely lifted. They are computed again
+    only if the IR of the function changes"""
+    functions = _get_state(ir_arch).functions
+    cached = functions.get(label)
+    if cached is not None:
+        graph, stamp, ir_hash = cached
+        if _ir_stamp(ir_arch, graph) == stamp:
+            return graph, ir_hash
+    graph = function_graph(ir_arch, label)
+    if graph is None:
+        functions.pop(label, None)
+        return None
+    ir_hash = function_ir_hash(ir_arch, graph)
+    functions[label] = (graph, _ir_stamp(ir_arch, graph), ir_hash)
+    return graph, ir_hash
+
+
+def get_summaries(ir_arch):
+    """Return the function summaries computed for @ir_arch:
+    label -> FunctionSummary"""
+    return _get_state(ir_arch).summaries
+
+
+def get_ir_hash(ir_arch, entry):
+    """Return the hash of the IR of the function of @ir_arch starting at
+    @entry (ExprId/ExprInt/label/int), or None if it is not entirely
+    lifted"""
+    function = _get_function(ir_arch, ir_arch.get_label(entry))
+    if function is None:
+        return None
+    return function[1]
+
+
+def get_summary(ir_arch, entry):
+    """Return the FunctionSummary of the function of @ir_arch starting at
+    @entry (ExprId/ExprInt/label/int), or None if it is not entirely lifted
+    or never returns.
+
+    Summaries are computed once, and again only if the IR of the function
+    (or of its callees) changes. They are stored in the analysis database
+    'ir_arch.db', if any.
+    """
+    label = ir_arch.get_label(entry)
+    state = _get_state(ir_arch)
+    function = _get_function(ir_arch, label)
+    if function is None or label in state.pending:
+        return None
+    graph, ir_hash = function
+
+    summary = state.summaries.get(label)
+    if summary is None or summary.ir_hash != ir_hash:
+        summary = None
+        if ir_arch.db is not None and label.offset is not None:
+            summary = ir_arch.db.get_summary(ir_arch, label.offset, ir_hash)
+    if summary is not None and \
+            all(get_ir_hash(ir_arch, offset) == callee_hash
+                for offset, callee_hash in summary.callees.iteritems()):
+        state.summaries[label] = summary
+        return summary
+
+    state.pending.add(label)
+    try:
+        summary = compute_summary(ir_arch, graph, label, ir_hash)
+    finally:
+        state.pending.discard(label)
+    if summary is None:
+        return None
+    state.summaries[label] = summary
+    if ir_arch.db is not None and label.offset is not None:
+        ir_arch.db.add_summary(ir_arch, summary)
+    return summary
+
+
+def apply_call_summary(ir_arch, exprs, eval_cb=None):
+    """Return the IR line @exprs with the effects of its function call
+    replaced by the callee summary (see get_summary), or None if the line
+    has no call or the callee has no summary
+    @eval_cb: (optional) function returning the value of the call target
+    """
+    target = get_call_target(exprs)
+    if target is None:
+        return None
+    if eval_cb is not None:
+        target = eval_cb(target)
+    offset = get_target_offset(target)
+    if offset is None:
+        return None
+    summary = get_summary(ir_arch, offset)
+    if summary is None:
+        return None
+    return summary.apply(exprs)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+"""Cross-reference and constant index of disassembled code.
+
+Usage:
+    xrefs = XrefIndex()
+    mdis = dis_x86_32(bs)
+    mdis.dis_bloc_callback = xrefs.chain(mdis.dis_bloc_callback)
+    blocs = mdis.dis_multibloc(entry_point)   # Index built while decoding
+    for offset, kind in xrefs.references(0x401000):
+        print hex(offset), kind
+"""
+
+from bisect import bisect_left
+
+import miasm2.expression.expression as m2_expr
+from miasm2.expression.simplifications import expr_simp
+from miasm2.core.asmbloc import asm_label
+
+
+# Reference to a flow destination (jump / call target)
+XREF_CODE = "code"
+# Reference to a constant: memory address, displacement or immediate
+XREF_DATA = "data"
+
+
+def get_expr_refs(expr, out, kind=XREF_DATA):
+    """Append to @out the (value, kind) couples referenced by @expr: labels
+    offsets and integers, tagged with @kind"""
+    todo = [(expr, kind)]
+    while todo:
+        expr, kind = todo.pop()
+        if isinstance(expr, m2_expr.ExprInt):
+            out.append((int(expr.arg), kind))
+        elif isinstance(expr, m2_expr.ExprId):
+            if isinstance(expr.name, asm_label) and \
+                    expr.name.offset is not None:
+                out.append((int(expr.name.offset), kind))
+        elif isinstance(expr, m2_expr.ExprMem):
+            # Memory addresses are always data references
+            todo.append((expr.arg, XREF_DATA))
+        elif isinstance(expr, m2_expr.ExprOp):
+            todo += [(arg, kind) for arg in expr.args]
+        elif isinstance(expr, m2_expr.ExprSlice):
+            todo.append((expr.arg, kind))
+        elif isinstance(expr, m2_expr.ExprCompose):
+            todo += [(arg[0], kind) for arg in expr.args]
+        elif isinstance(expr, m2_expr.ExprCond):
+            todo += [(expr.cond, kind), (expr.src1, kind), (expr.src2, kind)]
+        elif isinstance(expr, m2_expr.ExprAff):
+            todo += [(expr.dst, kind), (expr.src, kind)]
+    return out
+
+
+def get_instr_refs(instr):
+    """Return the list of (value, kind) referenced by the arguments of
+    @instr. Destinations of flow instructions are tagged XREF_CODE, other
+    constants XREF_DATA"""
+    out = []
+    dstflow = instr.breakflow() and instr.dstflow()
+    for arg in instr.args:
+        if instr.flow_only:
+            arg = expr_simp(arg)
+        get_expr_refs(arg, out, XREF_CODE if dstflow else XREF_DATA)
+    return out
+
+
+class XrefIndex(object):
+    """Index of the addresses and constants referenced by instructions.
+
+    For each referenced value, the index stores the offsets of the
+    referencing instructions with the reference kind (XREF_CODE or
+    XREF_DATA). Instructions are indexed by offset: indexing again an
+    instruction (bloc split, disassembly restarted, ...) is a no-op.
+
+    The index is filled during disassembly when used as (or chained to) the
+    engine 'dis_bloc_callback', or explicitly with add_bloc / add_blocs (for
+    instance for blocks loaded from an analysis database).
+    """
+
+    def __init__(self):
+        # value -> list of (instruction offset, kind)
+        self._refs = {}
+        # instruction offset -> list of (value, kind)
+        self._instr_refs = {}
+        # Sorted referenced values, for range queries; None if outdated
+        self._sorted = None
+
+    def __len__(self):
+        return len(self._instr_refs)
+
+    def __contains__(self, value):
+        return value in self._refs
+
+    def add_instr(self, instr):
+        """Index the references of @instr"""
+        offset = instr.offset
+        if offset in self._instr_refs:
+            return
+        refs = get_instr_refs(instr)
+        self._instr_refs[offset] = refs
+        for value, kind in refs:
+            if value not in self._refs:
+                self._refs[value] = []
+                self._sorted = None
+            self._refs[value].append((offset, kind))
+
+    def add_bloc(self, bloc):
+        """Index the instructions of @bloc"""
+        for instr in bloc.lines:
+            self.add_instr(instr)
+
+    def add_blocs(self, blocs):
+        """Index the instructions of each bloc of @blocs"""
+        for bloc in blocs:
+            self.add_bloc(bloc)
+
+    def __call__(self, mnemo, attrib, pool_bin, cur_bloc, offsets_to_dis,
+                 symbol_pool):
+        """dis_bloc_callback interface"""
+        self.add_bloc(cur_bloc)
+
+    def chain(self, callback):
+        """Return a dis_bloc_callback indexing each disassembled bloc, then
+        calling @callback (if not None)"""
+        if callback is None:
+            return self
+
+        def dis_bloc_callback(mnemo, attrib, pool_bin, cur_bloc,
+                              offsets_to_dis, symbol_pool):
+            self.add_bloc(cur_bloc)
+            callback(mnemo, attrib, pool_bin, cur_bloc, offsets_to_dis,
+                     symbol_pool)
+        return dis_bloc_callback
+
+    def references(self, value, kind=None):
+        """Return the list of (instruction offset, kind) referencing @value
+        @kind: (optional) only keep references of this kind"""
+        refs = self._refs.get(value, [])
+        if kind is None:
+            return list(refs)
+        return [ref for ref in refs if ref[1] == kind]
+
+    def references_range(self, start, stop, kind=None):
+        """Yield the (value, instruction offset, kind) for the referenced
+        values in [@start, @stop[, by increasing value
+        @kind: (optional) only keep references of this kind"""
+        if self._sorted is None:
+            self._sorted = sorted(self._refs)
+        values = self._sorted
+        for i in xrange(bisect_left(values, start), len(values)):
+            value = values[i]
+            if value >= stop:
+                break
+            for offset, ref_kind in self._refs[value]:
+                if kind is None or ref_kind == kind:
+                    yield value, offset, ref_kind
+
+    def instr_references(self, offset):
+        """Return the list of (value, kind) referenced by the instruction at
+        @offset"""
+        return list(self._instr_refs.get(offset, []))
@@ -298,7 +298,8 @@ deref_ext2 = Group(LBRACK + gpregs_32_64 + COMMA + gpregs_32_64 +
                    Optional(all_extend2_t + int_or_expr) + RBRACK).setParseAction(deref_ext2op)
 
 
-class additional_info:
+class additional_info(object):
+    __slots__ = ["except_on_instr", "lnk", "cond"]
 
     def __init__(self):
         self.except_on_instr = False
@@ -325,6 +326,7 @@ conds_inv_expr, _, conds_inv_info = gen_regs(CONDS_INV, {})
 
 
 class instruction_aarch64(instruction):
+    __slots__ = []
     delayslot = 0
 
     def __init__(self, *args, **kargs):
@@ -439,6 +441,7 @@ class mn_aarch64(cls_mn):
     sp = {'l': SP, 'b': SP}
     instruction = instruction_aarch64
     max_instruction_len = 4
+    decode_table_bits = 10
     alignment = 4
 
     @classmethod
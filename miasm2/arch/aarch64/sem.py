@@ -6,6 +6,14 @@ from miasm2.core.sembuilder import SemBuilder
 
 EXCEPT_PRIV_INSN = (1 << 17)
 
+# Registers rewritten by irbloc_fix_regs_for_mode
+replace_regs_ids = frozenset(replace_regs)
+# 32 bits registers -> 64 bits registers zero extended when they are written
+replace_regs32_to_64 = dict((reg, slc.arg)
+                            for reg, slc in replace_regs.iteritems()
+                            if isinstance(reg, m2_expr.ExprId) and
+                            reg.size == 32)
+
 # CPSR: N Z C V
 
 
@@ -770,7 +778,14 @@ class ir_aarch64l(ir):
         return instr_ir, extra_ir
 
     def expr_fix_regs_for_mode(self, e):
-        return e.replace_expr(replace_regs)
+        cache = self.get_fix_regs_cache(self.attrib)
+        if cache is None:
+            return e.replace_expr(replace_regs)
+        fixed = cache.get(e)
+        if fixed is None:
+            fixed = e.replace_expr(replace_regs)
+            cache[e] = fixed
+        return fixed
 
     def expraff_fix_regs_for_mode(self, e):
         dst = self.expr_fix_regs_for_mode(e.dst)
@@ -778,20 +793,41 @@ class ir_aarch64l(ir):
         return m2_expr.ExprAff(dst, src)
 
     def irbloc_fix_regs_for_mode(self, irbloc, mode=64):
+        cache = self.get_fix_regs_cache(self.attrib, "line")
         for irs in irbloc.irs:
             for i, e in enumerate(irs):
-                """
-                special case for 64 bits:
-                if destination is a 32 bit reg, zero extend the 64 bit reg
-                """
-                if (isinstance(e.dst, m2_expr.ExprId) and
-                        e.dst.size == 32 and
-                        e.dst in replace_regs):
-                    src = self.expr_fix_regs_for_mode(e.src)
-                    dst = replace_regs[e.dst].arg
-                    e = m2_expr.ExprAff(dst, src.zeroExtend(64))
-                irs[i] = self.expr_fix_regs_for_mode(e)
-        irbloc.dst = self.expr_fix_regs_for_mode(irbloc.dst)
+                fixed = None if cache is None else cache.get(e)
+                if fixed is None:
+                    fixed = self._line_fix_regs_for_mode(e)
+                    if cache is not None:
+                        cache[e] = fixed
+                irs[i] = fixed
+        dst = irbloc.dst
+        if dst is not None:
+            fixed = self.expr_fix_regs_for_mode(dst)
+            if fixed is not dst:
+                irbloc.dst = fixed
+
+    def _line_fix_regs_for_mode(self, e):
+        """Return the ExprAff @e of an irbloc with its registers fixed"""
+        dst = e.dst
+        # Fast path: no register to fix
+        if dst not in replace_regs_ids and \
+                replace_regs_ids.isdisjoint(e.get_r(True)):
+            return e
+        """
+        special case for 64 bits:
+        if destination is a 32 bit reg, zero extend the 64 bit reg
+        """
+        if dst in replace_regs32_to_64:
+            src = self.expr_fix_regs_for_mode(e.src)
+            return m2_expr.ExprAff(replace_regs32_to_64[dst],
+                                   src.zeroExtend(64))
+        src = self.expr_fix_regs_for_mode(e.src)
+        dst = self.expr_fix_regs_for_mode(dst)
+        if dst is e.dst and src is e.src:
+            return e
+        return m2_expr.ExprAff(dst, src)
 
     def mod_pc(self, instr, instr_ir, extra_ir):
         "Replace PC by the instruction's offset"
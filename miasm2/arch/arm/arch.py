@@ -269,7 +269,8 @@ def permut_args(order, args):
     return out
 
 
-class additional_info:
+class additional_info(object):
+    __slots__ = ["except_on_instr", "lnk", "cond"]
 
     def __init__(self):
         self.except_on_instr = False
@@ -278,6 +279,7 @@ class additional_info:
 
 
 class instruction_arm(instruction):
+    __slots__ = []
     delayslot = 0
 
     def __init__(self, *args, **kargs):
@@ -420,6 +422,7 @@ class instruction_arm(instruction):
         return ExprInt_from(expr, self.offset+8)
 
 class instruction_armt(instruction_arm):
+    __slots__ = []
 
     def __init__(self, *args, **kargs):
         super(instruction_armt, self).__init__(*args, **kargs)
@@ -504,6 +507,7 @@ class mn_arm(cls_mn):
     sp = {'l':SP, 'b':SP}
     instruction = instruction_arm
     max_instruction_len = 4
+    decode_table_bits = 10
     alignment = 4
 
     @classmethod
@@ -604,6 +608,7 @@ class mn_armt(cls_mn):
     sp = SP
     instruction = instruction_armt
     max_instruction_len = 4
+    decode_table_bits = 10
     alignment = 4
 
     @classmethod
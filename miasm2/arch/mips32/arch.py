@@ -68,7 +68,9 @@ def ast_int2expr(a):
 my_var_parser = cpu.parse_ast(ast_id2expr, ast_int2expr)
 base_expr.setParseAction(my_var_parser)
 
-class additional_info:
+class additional_info(object):
+    __slots__ = ["except_on_instr"]
+
     def __init__(self):
         self.except_on_instr = False
 
@@ -78,6 +80,7 @@ br_2 = ['BEQ', 'BEQL', 'BNE']
 
 
 class instruction_mips32(cpu.instruction):
+    __slots__ = []
     delayslot = 1
 
     def __init__(self, *args, **kargs):
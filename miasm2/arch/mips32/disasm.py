@@ -5,12 +5,18 @@ from miasm2.arch.mips32.arch import mn_mips32
 
 class dis_mips32b(disasmEngine):
     attrib = 'b'
+    # Blocs ending with a delay slot are often split: keep the decoded
+    # instructions
+    instr_cache_size = 100000
+
     def __init__(self, bs=None, **kwargs):
         super(dis_mips32b, self).__init__(mn_mips32, self.attrib, bs, **kwargs)
 
 
 class dis_mips32l(disasmEngine):
     attrib = "l"
+    instr_cache_size = 100000
+
     def __init__(self, bs=None, **kwargs):
         super(dis_mips32l, self).__init__(mn_mips32, self.attrib, bs, **kwargs)
 
@@ -100,13 +100,15 @@ sreg_p = Group(deref_pinc | deref_nooff |
                deref_off | base_expr).setParseAction(deref_expr)
 
 
-class additional_info:
+class additional_info(object):
+    __slots__ = ["except_on_instr"]
 
     def __init__(self):
         self.except_on_instr = False
 
 
 class instruction_msp430(instruction):
+    __slots__ = []
     delayslot = 0
 
     def dstflow(self):
@@ -379,13 +379,15 @@ class sh4_pc32imm(m_arg):
         self.value = v
         return True
 
-class additional_info:
+class additional_info(object):
+    __slots__ = ["except_on_instr"]
 
     def __init__(self):
         self.except_on_instr = False
 
 
 class instruction_sh4(instruction):
+    __slots__ = []
     delayslot = 0
 
     def __init__(self, *args, **kargs):
@@ -445,14 +445,31 @@ repeat_mn = ["INS", "OUTS",
 segm2enc = {CS: 1, SS: 2, DS: 3, ES: 4, FS: 5, GS: 6}
 enc2segm = dict([(x[1], x[0]) for x in segm2enc.items()])
 
-
-class group:
+# Legacy prefix byte -> (pre_dis_info field, value)
+prefix2info = {'\x66': ('opmode', 1),
+               '\x67': ('admode', 1),
+               '\xf0': ('g1', 1),
+               '\xf2': ('g1', 2),
+               '\xf3': ('g1', 4),
+               '\x2e': ('g2', 1),
+               '\x36': ('g2', 2),
+               '\x3e': ('g2', 3),
+               '\x26': ('g2', 4),
+               '\x64': ('g2', 5),
+               '\x65': ('g2', 6),
+               }
+
+
+class group(object):
+    __slots__ = ["value"]
 
     def __init__(self):
         self.value = None
 
 
-class additional_info:
+class additional_info(object):
+    __slots__ = ["except_on_instr", "g1", "g2", "vopmode", "stk", "v_opmode",
+                 "v_admode", "prefixed", "prefix"]
 
     def __init__(self):
         self.except_on_instr = False
@@ -466,6 +483,7 @@ class additional_info:
 
 
 class instruction_x86(instruction):
+    __slots__ = []
     delayslot = 0
 
     def __init__(self, *args, **kargs):
@@ -712,30 +730,10 @@ class mn_x86(cls_mn):
                         }
         while True:
             c = v.getbytes(offset)
-            if c == '\x66':
-                pre_dis_info['opmode'] = 1
-            elif c == '\x67':
-                pre_dis_info['admode'] = 1
-            elif c == '\xf0':
-                pre_dis_info['g1'] = 1
-            elif c == '\xf2':
-                pre_dis_info['g1'] = 2
-            elif c == '\xf3':
-                pre_dis_info['g1'] = 4
-
-            elif c == '\x2e':
-                pre_dis_info['g2'] = 1
-            elif c == '\x36':
-                pre_dis_info['g2'] = 2
-            elif c == '\x3e':
-                pre_dis_info['g2'] = 3
-            elif c == '\x26':
-                pre_dis_info['g2'] = 4
-            elif c == '\x64':
-                pre_dis_info['g2'] = 5
-            elif c == '\x65':
-                pre_dis_info['g2'] = 6
-
+            prefix_info = prefix2info.get(c)
+            if prefix_info is not None:
+                fname, value = prefix_info
+                pre_dis_info[fname] = value
             elif mode == 64 and c in '@ABCDEFGHIJKLMNO':
                 x = ord(c)
                 pre_dis_info['rex_p'] = 1
@@ -752,6 +750,63 @@ class mn_x86(cls_mn):
             offset += 1
         return pre_dis_info, v, mode, offset, offset - offset_o
 
+    @classmethod
+    def guess_mnemo(cls, bs, attrib, pre_dis_info, offset):
+        """Return the candidates classes matching the bytes at @offset
+        Same walk of the bintree as cls_mn.guess_mnemo, but the (up to)
+        max_instruction_len bytes following @offset are read at once: the
+        fields are extracted from them instead of being read bit per bit
+        from @bs"""
+        if hasattr(bs, 'getlen'):
+            bs_l = bs.getlen()
+        else:
+            bs_l = len(bs)
+        window_l = max(0, min(cls.max_instruction_len, bs_l - offset))
+        try:
+            window = cls.getbytes(bs, offset, window_l)
+        except IOError:
+            window = None
+        if window is None or len(window) != window_l:
+            return super(mn_x86, cls).guess_mnemo(bs, attrib, pre_dis_info,
+                                                  offset)
+        window_bits = window_l * 8
+        window_v = int(window.encode('hex'), 16) if window else 0
+
+        candidates = set()
+        # fname_values dictionnaries are shared between a node and its sons,
+        # and copied only when a son adds a field value
+        todo = [(pre_dis_info, branch, 0) for branch in cls.bintree.items()]
+        for fname_values, branch, offset_b in todo:
+            (l, fmask, fbits, fname, flen), vals = branch
+
+            if flen is not None:
+                l = flen(attrib, fname_values)
+            if l is not None:
+                end = offset_b + l
+                if end <= window_bits:
+                    v = (window_v >> (window_bits - end)) & ((1 << l) - 1)
+                else:
+                    try:
+                        v = cls.getbits(bs, attrib, offset * 8 + offset_b, l)
+                    except IOError:
+                        # Raised if offset is out of bound
+                        continue
+                offset_b = end
+                if v & fmask != fbits:
+                    continue
+                if fname is not None and not fname in fname_values:
+                    fname_values = dict(fname_values)
+                    fname_values[fname] = v
+            for nb, v in vals.iteritems():
+                if 'mn' in nb:
+                    candidates.update(v)
+                else:
+                    todo.append((fname_values, (nb, v), offset_b))
+
+        if not candidates:
+            raise Disasm_Exception('cannot disasm (guess) at %X' % offset)
+        return list(candidates)
+
     @classmethod
     def get_cls_instance(cls, cc, mode, infos=None):
         for opmode in [0, 1]:
@@ -788,6 +843,12 @@ class mn_x86(cls_mn):
             self.g1.value = infos.g1.value
             self.g2.value = infos.g2.value
 
+    @classmethod
+    def asm_infos_key(cls, infos):
+        if infos is None:
+            return None
+        return (infos.g1.value, infos.g2.value)
+
     def reset_class(self):
         super(mn_x86, self).reset_class()
         if hasattr(self, "opmode"):
@@ -1843,7 +1904,35 @@ def expr2modrm(expr, parent, w8, sx=0, xmm=0, mm=0):
         return [dct_expr], None, True
     return parse_mem(expr, parent, w8, sx, xmm, mm)
 
+# Cache of modrm2expr results, keyed by the (static) modrm descriptions of
+# byte2modrm and the operand sizes. Memory operands with a displacement are
+# cached as their (terms, size), the displacement being added on decoding
+modrm2expr_cache = {}
+
+
 def modrm2expr(modrm, parent, w8, sx=0, xmm=0, mm=0):
+    """Return the expression of the ModRM/SIB description @modrm (an item of
+    byte2modrm) decoded for the instruction @parent"""
+    key = (id(modrm), w8, sx, xmm, mm, parent.v_opmode(), parent.v_admode(),
+           parent.rex_p.value)
+    cached = modrm2expr_cache.get(key)
+    if cached is not None and cached[0] is modrm:
+        expr = cached[1]
+    else:
+        expr = modrm2expr_nocache(modrm, parent, w8, sx, xmm, mm)
+        modrm2expr_cache[key] = modrm, expr
+    if not isinstance(expr, tuple):
+        return expr
+    if parent.disp.value is None:
+        return None
+    terms, size = expr
+    disp = ExprInt_fromsize(parent.v_admode(), parent.disp.expr.arg)
+    return ExprMem(ExprOp('+', *(terms + (disp,))), size=size)
+
+
+def modrm2expr_nocache(modrm, parent, w8, sx=0, xmm=0, mm=0):
+    """Return the expression of @modrm, or (terms, size) for memory operands
+    with a displacement"""
     o = []
     if not modrm[f_isad]:
         modrm_k = [x[0] for x in modrm.iteritems() if x[1] == 1]
@@ -1875,11 +1964,6 @@ def modrm2expr(modrm, parent, w8, sx=0, xmm=0, mm=0):
             if scale != 1:
                 expr = ExprInt_fromsize(admode, scale) * expr
             o.append(expr)
-    if f_imm in modrm:
-        if parent.disp.value is None:
-            return None
-        o.append(ExprInt_fromsize(admode, parent.disp.expr.arg))
-    expr = ExprOp('+', *o)
     if w8 == 0:
         opmode = 8
     elif sx == 1:
@@ -1891,8 +1975,9 @@ def modrm2expr(modrm, parent, w8, sx=0, xmm=0, mm=0):
     elif mm:
         opmode = 64
 
-    expr = ExprMem(expr, size=opmode)
-    return expr
+    if f_imm in modrm:
+        return tuple(o), opmode
+    return ExprMem(ExprOp('+', *o), size=opmode)
 
 
 class x86_rm_arg(m_arg):
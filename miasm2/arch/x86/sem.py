@@ -43,6 +43,16 @@ EXCEPT_ILLEGAL_INSN = (1 << 18)
 EXCEPT_UNK_MNEMO = (1 << 19)
 
 
+# Registers rewritten by irbloc_fix_regs_for_mode, per mode
+replace_regs_ids = dict((mode, frozenset(regs))
+                        for mode, regs in replace_regs.iteritems())
+# 32 bits registers -> 64 bits registers zero extended when they are written
+replace_regs32_to_64 = dict((reg, slc.arg)
+                            for reg, slc in replace_regs[64].iteritems()
+                            if isinstance(reg, m2_expr.ExprId) and
+                            reg.size == 32)
+
+
 """
 http://www.emulators.com/docs/nx11_flags.htm
 
@@ -3574,6 +3584,14 @@ class ir_x86_16(ir):
     def mod_pc(self, instr, instr_ir, extra_ir):
         pass
 
+    def get_lift_cache_key(self, instr):
+        key = ir.get_lift_cache_key(self, instr)
+        if key is None:
+            return None
+        # Segmentation modes change the memory accesses semantic
+        return key + (self.do_stk_segm, self.do_ds_segm, self.do_str_segm,
+                      self.do_all_segm)
+
     def get_ir(self, instr):
         args = instr.args[:]
         my_ss = None
@@ -3650,7 +3668,14 @@ class ir_x86_16(ir):
         return e_n, [cond_bloc, c] + extra_ir
 
     def expr_fix_regs_for_mode(self, e, mode=64):
-        return e.replace_expr(replace_regs[mode])
+        cache = self.get_fix_regs_cache(mode)
+        if cache is None:
+            return e.replace_expr(replace_regs[mode])
+        fixed = cache.get(e)
+        if fixed is None:
+            fixed = e.replace_expr(replace_regs[mode])
+            cache[e] = fixed
+        return fixed
 
     def expraff_fix_regs_for_mode(self, e, mode=64):
         dst = self.expr_fix_regs_for_mode(e.dst, mode)
@@ -3658,21 +3683,42 @@ class ir_x86_16(ir):
         return m2_expr.ExprAff(dst, src)
 
     def irbloc_fix_regs_for_mode(self, irbloc, mode=64):
+        cache = self.get_fix_regs_cache(mode, "line")
         for irs in irbloc.irs:
             for i, e in enumerate(irs):
-                """
-                special case for 64 bits:
-                if destination is a 32 bit reg, zero extend the 64 bit reg
-                """
-                if mode == 64:
-                    if (isinstance(e.dst, m2_expr.ExprId) and \
-                            e.dst.size == 32 and \
-                            e.dst in replace_regs[64]):
-                        src = self.expr_fix_regs_for_mode(e.src, mode)
-                        dst = replace_regs[64][e.dst].arg
-                        e = m2_expr.ExprAff(dst, src.zeroExtend(64))
-                irs[i] = self.expr_fix_regs_for_mode(e, mode)
-        irbloc.dst = self.expr_fix_regs_for_mode(irbloc.dst, mode)
+                fixed = None if cache is None else cache.get(e)
+                if fixed is None:
+                    fixed = self._line_fix_regs_for_mode(e, mode)
+                    if cache is not None:
+                        cache[e] = fixed
+                irs[i] = fixed
+        dst = irbloc.dst
+        if dst is not None:
+            fixed = self.expr_fix_regs_for_mode(dst, mode)
+            if fixed is not dst:
+                irbloc.dst = fixed
+
+    def _line_fix_regs_for_mode(self, e, mode):
+        """Return the ExprAff @e of an irbloc with its registers fixed for
+        @mode"""
+        dst = e.dst
+        # Fast path: no register to fix
+        regs = replace_regs_ids[mode]
+        if dst not in regs and regs.isdisjoint(e.get_r(True)):
+            return e
+        """
+        special case for 64 bits:
+        if destination is a 32 bit reg, zero extend the 64 bit reg
+        """
+        if mode == 64 and dst in replace_regs32_to_64:
+            src = self.expr_fix_regs_for_mode(e.src, mode)
+            return m2_expr.ExprAff(replace_regs32_to_64[dst],
+                                   src.zeroExtend(64))
+        src = self.expr_fix_regs_for_mode(e.src, mode)
+        dst = self.expr_fix_regs_for_mode(dst, mode)
+        if dst is e.dst and src is e.src:
+            return e
+        return m2_expr.ExprAff(dst, src)
 
 
 class ir_x86_32(ir_x86_16):
@@ -3,12 +3,18 @@
 
 import logging
 import inspect
+import copy
+import multiprocessing
+from cStringIO import StringIO
+import cPickle as pickle
+from bisect import bisect_right
+from collections import deque, namedtuple
 
 
 import miasm2.expression.expression as m2_expr
 from miasm2.expression.simplifications import expr_simp
 from miasm2.expression.modint import moduint, modint
-from miasm2.core.utils import Disasm_Exception, pck
+from miasm2.core.utils import Disasm_Exception, pck, BoundedDict
 from miasm2.core.graph import DiGraph
 from miasm2.core.interval import interval
 
@@ -32,9 +38,13 @@ def expr_is_int_or_label(e):
         (isinstance(e, m2_expr.ExprId) and isinstance(e.name, asm_label))
 
 
-class asm_label:
+class asm_label(object):
     "Stand for an assembly label"
 
+    # Attributes set by other modules (rarely used) go to the instance dict,
+    # which is only allocated on demand
+    __slots__ = ["name", "offset", "fixedblocs", "attrib", "__dict__"]
+
     def __init__(self, name="", offset=None):
         self.fixedblocs = False
         if is_int(name):
@@ -67,6 +77,8 @@ class asm_raw:
         return repr(self.raw)
 
 class asm_constraint(object):
+    __slots__ = ["label", "c_t"]
+
     c_to = "c_to"
     c_next = "c_next"
     c_bad = "c_bad"
@@ -80,6 +92,7 @@ class asm_constraint(object):
 
 
 class asm_constraint_next(asm_constraint):
+    __slots__ = []
 
     def __init__(self, label=None):
         super(asm_constraint_next, self).__init__(
@@ -87,6 +100,7 @@ class asm_constraint_next(asm_constraint):
 
 
 class asm_constraint_to(asm_constraint):
+    __slots__ = []
 
     def __init__(self, label=None):
         super(asm_constraint_to, self).__init__(
@@ -94,6 +108,7 @@ class asm_constraint_to(asm_constraint):
 
 
 class asm_constraint_bad(asm_constraint):
+    __slots__ = []
 
     def __init__(self, label=None):
         super(asm_constraint_bad, self).__init__(
@@ -102,6 +117,11 @@ class asm_constraint_bad(asm_constraint):
 
 class asm_bloc(object):
 
+    # Attributes set by other modules (rarely used) go to the instance dict,
+    # which is only allocated on demand
+    __slots__ = ["bto", "lines", "label", "alignment", "size", "max_size",
+                 "__dict__"]
+
     def __init__(self, label=None, alignment=1):
         self.bto = set()
         self.lines = []
@@ -334,11 +354,51 @@ class asm_symbol_pool:
         return label
 
 
+def copy_instr(instr):
+    """Return a copy of @instr which can be modified (arguments turned into
+    labels, renamed by a callback, ...) without altering @instr"""
+    new_instr = copy.copy(instr)
+    new_instr.args = list(instr.args)
+    if instr.additional_info is not None:
+        new_instr.additional_info = copy.copy(instr.additional_info)
+    return new_instr
+
+
+def dis_instr_cached(mnemo, pool_bin, attrib, offset, instr_cache=None,
+                     flow_only=False):
+    """Disassemble the instruction at @offset
+    If @instr_cache (offset -> instruction) is set, reuse the instruction
+    already decoded at this @offset, or record the newly decoded one.
+    The returned instruction is always a fresh copy.
+    @flow_only: (optional) decode in flow only mode (see cls_mn.dis)
+    """
+    if instr_cache is None:
+        return mnemo.dis(pool_bin, attrib, offset, flow_only=flow_only)
+    instr = instr_cache.get(offset)
+    if instr is None or (instr.flow_only and not flow_only):
+        instr = mnemo.dis(pool_bin, attrib, offset, flow_only=flow_only)
+        instr_cache[offset] = instr
+    return copy_instr(instr)
+
+
+def decode_bloc_full(mnemo, pool_bin, cur_bloc, attrib={}, instr_cache=None):
+    """Fully decode the lines of @cur_bloc disassembled in flow only mode
+    Instructions modifying the control flow are already fully decoded, and
+    kept as is (their destinations may have been turned into labels)
+    """
+    for i, instr in enumerate(cur_bloc.lines):
+        if not instr.flow_only:
+            continue
+        cur_bloc.lines[i] = dis_instr_cached(mnemo, pool_bin, attrib,
+                                             instr.offset, instr_cache)
+    return cur_bloc
+
+
 def dis_bloc(mnemo, pool_bin, cur_bloc, offset, job_done, symbol_pool,
              dont_dis=[], split_dis=[
              ], follow_call=False, dontdis_retcall=False, lines_wd=None,
              dis_bloc_callback=None, dont_dis_nulstart_bloc=False,
-             attrib={}):
+             attrib={}, instr_cache=None, flow_only=False):
     # pool_bin.offset = offset
     lines_cpt = 0
     in_delayslot = False
@@ -367,7 +427,8 @@ def dis_bloc(mnemo, pool_bin, cur_bloc, offset, job_done, symbol_pool,
         off_i = offset
         try:
             # print repr(pool_bin.getbytes(offset, 4))
-            instr = mnemo.dis(pool_bin, attrib, offset)
+            instr = dis_instr_cached(mnemo, pool_bin, attrib, offset,
+                                     instr_cache, flow_only)
         except (Disasm_Exception, IOError), e:
             log_asmbloc.warning(e)
             instr = None
@@ -378,10 +439,15 @@ def dis_bloc(mnemo, pool_bin, cur_bloc, offset, job_done, symbol_pool,
             break
 
         # XXX TODO nul start block option
-        if dont_dis_nulstart_bloc and instr.b.count('\x00') == instr.l:
-            log_asmbloc.warning("reach nul instr at %X", int(off_i))
-            cur_bloc.add_cst(off_i, asm_constraint.c_bad, symbol_pool)
-            break
+        if dont_dis_nulstart_bloc:
+            if instr.flow_only:
+                instr_bytes = mnemo.getbytes(pool_bin, off_i, instr.l)
+            else:
+                instr_bytes = instr.b
+            if instr_bytes.count('\x00') == instr.l:
+                log_asmbloc.warning("reach nul instr at %X", int(off_i))
+                cur_bloc.add_cst(off_i, asm_constraint.c_bad, symbol_pool)
+                break
 
         # special case: flow graph modificator in delayslot
         if in_delayslot and instr and (instr.splitflow() or instr.breakflow()):
@@ -452,7 +518,9 @@ def split_bloc(mnemo, attrib, pool_bin, blocs,
                 continue
             bloc_dst.append(c.label)
 
-    bloc_dst = [x.offset for x in bloc_dst if x.offset is not None]
+    # Sorted index of destinations, to find the ones inside a bloc by
+    # dichotomy
+    bloc_dst = sorted(set(x.offset for x in bloc_dst if x.offset is not None))
 
     j = -1
     while j < len(blocs) - 1:
@@ -460,9 +528,11 @@ def split_bloc(mnemo, attrib, pool_bin, blocs,
         cb = blocs[j]
         a, b = cb.get_range()
 
-        for off in bloc_dst:
-            if not (off > a and off <= b):
-                continue
+        # Destinations in ]a, b]
+        i = bisect_right(bloc_dst, a)
+        while i < len(bloc_dst) and bloc_dst[i] <= b:
+            off = bloc_dst[i]
+            i += 1
             l = symbol_pool.getby_offset_create(off)
             new_b = cb.split(off, l)
             log_asmbloc.debug("split bloc %x", off)
@@ -481,15 +551,39 @@ def split_bloc(mnemo, attrib, pool_bin, blocs,
 
     return blocs
 
+def gen_dont_dis_index(dont_dis):
+    """Index @dont_dis, a list of offsets and [start, stop[ ranges
+    Return the single offsets in a set, and the ranges in a canonical
+    interval"""
+    dont_dis_offsets = set()
+    dont_dis_ranges = []
+    for dd in dont_dis:
+        if isinstance(dd, tuple):
+            dd_a, dd_b = dd
+            dont_dis_ranges.append((dd_a, dd_b - 1))
+        else:
+            dont_dis_offsets.add(int(dd))
+    return dont_dis_offsets, interval(dont_dis_ranges)
+
+
 def dis_bloc_all(mnemo, pool_bin, offset, job_done, symbol_pool, dont_dis=[],
                  split_dis=[], follow_call=False, dontdis_retcall=False,
                  blocs_wd=None, lines_wd=None, blocs=None,
                  dis_bloc_callback=None, dont_dis_nulstart_bloc=False,
-                 attrib={}):
+                 attrib={}, instr_cache=None, flow_only=False, db=None):
+    """Disassemble the blocks reachable from @offset, return the list of
+    blocks
+    @db: (optional) analysis database (see miasm2.analysis.database); blocks
+    already stored in it are loaded instead of being disassembled again, and
+    @dis_bloc_callback is not run on them
+    """
     log_asmbloc.info("dis bloc all")
     if blocs is None:
         blocs = []
-    todo = [offset]
+    todo = deque([offset])
+
+    dont_dis_offsets, dont_dis_ranges = gen_dont_dis_index(dont_dis)
+    split_dis = set(int(x) for x in split_dis)
 
     bloc_cpt = 0
     while len(todo):
@@ -498,32 +592,38 @@ def dis_bloc_all(mnemo, pool_bin, offset, job_done, symbol_pool, dont_dis=[],
             log_asmbloc.debug("blocs watchdog reached at %X", int(offset))
             break
 
-        n = int(todo.pop(0))
+        n = int(todo.popleft())
         if n is None:
             continue
         if n in job_done:
             continue
 
-        if n in dont_dis:
-            continue
-        dd_flag = False
-        for dd in dont_dis:
-            if not isinstance(dd, tuple):
-                continue
-            dd_a, dd_b = dd
-            if dd_a <= n < dd_b:
-                dd_flag = True
-                break
-        if dd_flag:
+        if n in dont_dis_offsets or n in dont_dis_ranges:
             continue
+
+        if db is not None:
+            cur_bloc = db.get_bloc(n, symbol_pool)
+            if cur_bloc is not None and cur_bloc.lines:
+                offsets = cur_bloc.get_offsets()
+                if not any(x in split_dis or x in dont_dis_offsets or
+                           x in dont_dis_ranges for x in offsets[1:]):
+                    job_done.update(offsets)
+                    todo += [cst.label.offset for cst in cur_bloc.bto
+                             if cst.c_t != asm_constraint.c_bad and
+                             cst.label.offset is not None]
+                    blocs.append(cur_bloc)
+                    continue
+
         l = symbol_pool.getby_offset_create(n)
         cur_bloc = asm_bloc(l)
         todo += dis_bloc(mnemo, pool_bin, cur_bloc, n, job_done, symbol_pool,
-                         dont_dis, split_dis, follow_call, dontdis_retcall,
+                         dont_dis_offsets, split_dis, follow_call,
+                         dontdis_retcall,
                          dis_bloc_callback=dis_bloc_callback,
                          lines_wd=lines_wd,
                          dont_dis_nulstart_bloc=dont_dis_nulstart_bloc,
-                         attrib=attrib)
+                         attrib=attrib, instr_cache=instr_cache,
+                         flow_only=flow_only)
         blocs.append(cur_bloc)
 
     return split_bloc(mnemo, attrib, pool_bin, blocs,
@@ -702,7 +802,14 @@ class BlockChain(object):
         """Best effort merge two block chains
         Return the list of resulting blockchains"""
         self.blocks += chain.blocks
-        self.place()
+        if not self.pinned or chain.pinned:
+            self.place()
+            return [self]
+
+        # Blocks appended after the pinned one: only extend the bounds
+        self.max_size += chain.max_size
+        for block in chain.blocks:
+            self.offset_max += block.max_size + (block.alignment - block.max_size) % block.alignment
         return [self]
 
     def fix_blocks(self, modified_labels):
@@ -866,29 +973,78 @@ def filter_exprid_label(exprs):
     """Extract labels from list of ExprId @exprs"""
     return set(expr.name for expr in exprs if isinstance(expr.name, asm_label))
 
+def get_line_labels(instr):
+    """Extract labels used by the line @instr"""
+    symbols = set()
+    if isinstance(instr, asm_raw):
+        if isinstance(instr.raw, list):
+            for expr in instr.raw:
+                symbols.update(m2_expr.get_expr_ids(expr))
+    else:
+        for arg in instr.args:
+            symbols.update(m2_expr.get_expr_ids(arg))
+    return filter_exprid_label(symbols)
+
 def get_block_labels(block):
     """Extract labels used by @block"""
-    symbols = set()
+    labels = set()
     for instr in block.lines:
-        if isinstance(instr, asm_raw):
-            if isinstance(instr.raw, list):
-                for expr in instr.raw:
-                    symbols.update(m2_expr.get_expr_ids(expr))
-        else:
-            for arg in instr.args:
-                symbols.update(m2_expr.get_expr_ids(arg))
-    labels = filter_exprid_label(symbols)
+        labels.update(get_line_labels(instr))
     return labels
 
-def assemble_block(mnemo, block, symbol_pool, conservative=False):
+def get_block_position_dependent_lines(block):
+    """Return the indexes of the lines of @block whose encoding may depend on
+    their own offset: instructions using labels (including the special '$')
+    or modifying the flow (relative destinations)"""
+    out = set()
+    for i, instr in enumerate(block.lines):
+        if isinstance(instr, asm_raw):
+            continue
+        if instr.dstflow() or get_line_labels(instr):
+            out.add(i)
+    return out
+
+def assemble_instr(mnemo, instr, offset, symbol_pool, conservative=False):
+    """Assemble the instruction @instr at @offset using @symbol_pool
+    Update instr's offset, data and length
+    @conservative: (optional) use original bytes when possible
+    """
+    saved_args = list(instr.args)
+    instr.offset = offset
+
+    # Replace instruction's arguments by resolved ones
+    instr.args = instr.resolve_args_with_symbols(symbol_pool)
+
+    if instr.dstflow():
+        instr.fixDstOffset()
+
+    try:
+        cached_candidate, candidates = conservative_asm(
+            mnemo, instr, symbol_pool, conservative)
+    finally:
+        # Restore original arguments
+        instr.args = saved_args
+
+    instr.data = cached_candidate
+    instr.l = len(cached_candidate)
+
+def assemble_block(mnemo, block, symbol_pool, conservative=False,
+                   lines=None, position_dependent=None):
     """Assemble a @block using @symbol_pool
     @conservative: (optional) use original bytes when possible
+    @lines: (optional) indexes of the lines to assemble again, default to all
+    the lines
+    @position_dependent: (optional) indexes of the lines to assemble again if
+    their offset has changed (see get_block_position_dependent_lines)
+    Return True iff the size of @block has changed
     """
     offset_i = 0
+    old_size = block.size
 
-    for instr in block.lines:
+    for i, instr in enumerate(block.lines):
+        rework = lines is None or i in lines
         if isinstance(instr, asm_raw):
-            if isinstance(instr.raw, list):
+            if rework and isinstance(instr.raw, list):
                 # Fix special asm_raw
                 data = ""
                 for expr in instr.raw:
@@ -900,79 +1056,91 @@ def assemble_block(mnemo, block, symbol_pool, conservative=False):
             offset_i += instr.l
             continue
 
-        # Assemble an instruction
-        saved_args = list(instr.args)
-        instr.offset = block.label.offset + offset_i
+        offset = block.label.offset + offset_i
+        if (not rework and position_dependent is not None and
+            i in position_dependent and instr.offset != offset):
+            rework = True
 
-        # Replace instruction's arguments by resolved ones
-        instr.args = instr.resolve_args_with_symbols(symbol_pool)
-
-        if instr.dstflow():
-            instr.fixDstOffset()
-
-        old_l = instr.l
-        cached_candidate, candidates = conservative_asm(
-            mnemo, instr, symbol_pool, conservative)
-
-        # Restore original arguments
-        instr.args = saved_args
-
-        # We need to update the block size
-        block.size = block.size - old_l + len(cached_candidate)
-        instr.data = cached_candidate
-        instr.l = len(cached_candidate)
+        if rework:
+            # We need to update the block size
+            old_l = instr.l
+            assemble_instr(mnemo, instr, offset, symbol_pool, conservative)
+            block.size = block.size - old_l + instr.l
+        else:
+            instr.offset = offset
 
         offset_i += instr.l
+    return block.size != old_size
 
 
 def asmbloc_final(mnemo, blocks, blockChains, symbol_pool, conservative=False):
     """Resolve and assemble @blockChains using @symbol_pool until fixed point is
-    reached"""
+    reached
+
+    Relaxation is incremental: once every line has been assembled, only the
+    lines using a moved label, and the position dependent lines which have
+    moved are assembled again; only the chains containing a resized block are
+    placed again.
+    """
 
     log_asmbloc.debug("asmbloc_final")
 
     # Init structures
     lbl2block = {block.label:block for block in blocks}
-    blocks_using_label = {}
+    lines_using_label = {}
+    position_dependent = {}
     for block in blocks:
-        labels = get_block_labels(block)
-        for label in labels:
-            blocks_using_label.setdefault(label, set()).add(block)
+        for i, instr in enumerate(block.lines):
+            for label in get_line_labels(instr):
+                lines_using_label.setdefault(label, []).append((block, i))
+        position_dependent[block] = get_block_position_dependent_lines(block)
 
     block2chain = {}
     for chain in blockChains:
         for block in chain.blocks:
             block2chain[block] = chain
 
-    # Init worklist
-    blocks_to_rework = set(blocks)
+    # Init worklists: assemble every line of every block
+    chains_to_fix = list(blockChains)
+    lines_to_rework = dict((block, None) for block in blocks)
+    assembled = 0
 
-    # Fix and re-assemble blocks until fixed point is reached
+    # Fix and re-assemble lines until fixed point is reached
     while True:
 
         # Propagate pinned blocks into chains
         modified_labels = set()
-        for chain in blockChains:
+        for chain in chains_to_fix:
             chain.fix_blocks(modified_labels)
 
         for label in modified_labels:
-            # Retrive block with modified reference
+            # Moved block: its position dependent lines may have to be
+            # assembled again
             if label in lbl2block:
-                blocks_to_rework.add(lbl2block[label])
+                lines_to_rework.setdefault(lbl2block[label], set())
 
-            # Enqueue blocks referencing a modified label
-            if label not in blocks_using_label:
-                continue
-            for block in blocks_using_label[label]:
-                blocks_to_rework.add(block)
+            # Enqueue lines referencing a modified label
+            for block, i in lines_using_label.get(label, []):
+                lines = lines_to_rework.setdefault(block, set())
+                if lines is not None:
+                    lines.add(i)
 
         # No more work
-        if not blocks_to_rework:
+        if not lines_to_rework:
             break
 
-        while blocks_to_rework:
-            block = blocks_to_rework.pop()
-            assemble_block(mnemo, block, symbol_pool, conservative)
+        chains_to_fix = set()
+        for block, lines in lines_to_rework.iteritems():
+            if lines is None:
+                assembled += len(block.lines)
+            else:
+                assembled += len(lines)
+            if assemble_block(mnemo, block, symbol_pool, conservative,
+                              lines, position_dependent[block]):
+                chains_to_fix.add(block2chain[block])
+        lines_to_rework = {}
+
+    log_asmbloc.debug("asmbloc_final: %d lines assembled", assembled)
 
 
 def sanity_check_blocks(blocks):
@@ -1235,8 +1403,70 @@ def bloc_merge(blocs, dont_merge=[]):
         i = -1
 
 
+# Instruction yielded by disasmEngine.dis_linear
+linear_instr = namedtuple("linear_instr", ["offset", "l", "name", "args"])
+
+
+# Per process state of dis_multibloc_parallel workers
+_dis_worker_state = {}
+
+
+def _dis_worker_init(engine):
+    """Initialize a dis_multibloc_parallel worker process
+    @engine: disasmEngine instance (inherited from the parent process)
+    """
+    _dis_worker_state['engine'] = engine
+    _dis_worker_state['job_done'] = set(engine.job_done)
+    _dis_worker_state['symbol_pool'] = asm_symbol_pool()
+
+
+def _dis_worker(offsets):
+    """Disassemble the CFGs starting at each of @offsets in the worker process
+    Return a tuple:
+     - offsets decoded during this job
+     - pickled list of the blocks disassembled during this job
+    The job_done index is shared by every job handled by this worker, so that
+    an address is decoded at most once per worker. Labels are pickled by
+    name and offset, to be linked back to the parent symbol_pool (see
+    disasmEngine._merge_blocs).
+    """
+    engine = _dis_worker_state['engine']
+    job_done = _dis_worker_state['job_done']
+    done_before = set(job_done)
+    blocs = []
+    for offset in offsets:
+        blocs = dis_bloc_all(engine.arch, engine.bs, offset, job_done,
+                             _dis_worker_state['symbol_pool'],
+                             dont_dis=engine.dont_dis,
+                             split_dis=engine.split_dis,
+                             follow_call=engine.follow_call,
+                             dontdis_retcall=engine.dontdis_retcall,
+                             blocs_wd=engine.blocs_wd,
+                             lines_wd=engine.lines_wd,
+                             blocs=blocs,
+                             dis_bloc_callback=engine.dis_bloc_callback,
+                             dont_dis_nulstart_bloc=engine.dont_dis_nulstart_bloc,
+                             attrib=engine.attrib,
+                             flow_only=engine.flow_only)
+
+    def persistent_id(item):
+        if isinstance(item, asm_label):
+            return (item.name, item.offset)
+        return None
+    blob = StringIO()
+    pickler = pickle.Pickler(blob, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(blocs)
+    return job_done.difference(done_before), blob.getvalue()
+
+
 class disasmEngine(object):
 
+    # Maximum number of decoded instructions kept by the engine and shared by
+    # all its disassemblies, to avoid decoding them again on bloc splits and
+    # re-visits (0 to disable, see get_instr_cache)
+    instr_cache_size = 0
+
     def __init__(self, arch, attrib, bs=None, **kwargs):
         self.arch = arch
         self.attrib = attrib
@@ -1251,9 +1481,36 @@ class disasmEngine(object):
         self.dis_bloc_callback = None
         self.dont_dis_nulstart_bloc = False
         self.job_done = set()
+        self.flow_only = False
+        self.db = None
+        # Call graph recovery state, see dis_callgraph
+        self.functions = {}
+        self.bloc_owners = {}
+        self.callgraph = DiGraph()
+        self._cg_job_done = set()
+        self._cg_bloc_starts = {}
+        self._cg_instr2bloc = {}
+        self._instr_cache = None
         self.__dict__.update(kwargs)
 
+    def get_instr_cache(self):
+        """Return the offset -> instruction cache shared by the disassemblies
+        of the engine, or None if it is disabled: instr_cache_size is 0, or
+        the content of the binary stream may change"""
+        if not self.instr_cache_size or self.bs is None or self.bs.volatile:
+            return None
+        key = (self.bs, self.attrib)
+        if self._instr_cache is None or self._instr_cache[0] != key:
+            # Instructions decoded from another stream / mode are dropped
+            self._instr_cache = (key, BoundedDict(self.instr_cache_size))
+        return self._instr_cache[1]
+
     def dis_bloc(self, offset):
+        if self.db is not None:
+            current_bloc = self.db.get_bloc(offset, self.symbol_pool)
+            if current_bloc is not None:
+                self.job_done.update(current_bloc.get_offsets())
+                return current_bloc
         l = self.symbol_pool.getby_offset_create(offset)
         current_bloc = asm_bloc(l)
         dis_bloc(self.arch, self.bs, current_bloc, offset, self.job_done,
@@ -1264,7 +1521,11 @@ class disasmEngine(object):
                  lines_wd=self.lines_wd,
                  dis_bloc_callback=self.dis_bloc_callback,
                  dont_dis_nulstart_bloc=self.dont_dis_nulstart_bloc,
-                 attrib=self.attrib)
+                 attrib=self.attrib,
+                 instr_cache=self.get_instr_cache(),
+                 flow_only=self.flow_only)
+        if self.db is not None:
+            self.db.add_bloc(current_bloc)
         return current_bloc
 
     def dis_multibloc(self, offset, blocs=None):
@@ -1278,6 +1539,242 @@ class disasmEngine(object):
                              blocs=blocs,
                              dis_bloc_callback=self.dis_bloc_callback,
                              dont_dis_nulstart_bloc=self.dont_dis_nulstart_bloc,
-                             attrib=self.attrib)
+                             attrib=self.attrib,
+                             instr_cache=self.get_instr_cache(),
+                             flow_only=self.flow_only,
+                             db=self.db)
+        if self.db is not None:
+            self.db.add_blocs(blocs)
         return blocs
 
+    def decode_bloc_full(self, bloc):
+        """Fully decode the lines of @bloc, disassembled while flow_only was
+        set
+        Return @bloc"""
+        return decode_bloc_full(self.arch, self.bs, bloc, attrib=self.attrib,
+                                instr_cache=self.get_instr_cache())
+
+    def dis_linear(self, start, stop=None, resync=1):
+        """Linear sweep disassembly of [@start, @stop[
+        Yield a linear_instr (offset, length, name, arguments) for each
+        decoded instruction; neither blocks nor instructions are kept, so
+        arbitrary large ranges can be streamed.
+
+        @start: first offset to disassemble
+        @stop: (optional) end offset, default to the end of the bin_stream
+        @resync: (optional) number of bytes skipped to resynchronize on a
+        decoding error (ie. the instruction alignment of the architecture).
+        If None, the sweep stops at the first decoding error.
+        """
+        if stop is None:
+            stop = self.bs.getlen()
+        offset = start
+        while offset < stop:
+            try:
+                instr = self.arch.dis(self.bs, self.attrib, offset)
+            except (Disasm_Exception, IOError), error:
+                log_asmbloc.debug(error)
+                instr = None
+            if instr is None or offset + instr.l > stop:
+                if resync is None:
+                    log_asmbloc.warning("cannot disasm at %X", int(offset))
+                    break
+                offset += resync
+                continue
+            yield linear_instr(offset, instr.l, instr.name, instr.args)
+            offset += instr.l
+
+    def dis_multibloc_parallel(self, offsets, blocs=None, processes=None,
+                               chunksize=16):
+        """Disassemble the CFGs starting at each of @offsets in a pool of
+        @processes worker processes
+
+        Entry points are sorted and spread over the workers by chunks of
+        @chunksize neighbouring addresses. Each worker explores the CFGs of
+        its entry points and returns its blocks, which are merged in the
+        current process (see _merge_blocs): code reached from several
+        workers is disassembled by each of them, but the result is the same
+        set of blocks as calling dis_multibloc on each offset.
+
+        Workers are forked from the current process: the binary stream and
+        callbacks are inherited, not pickled. Callbacks are run in the
+        workers: their modifications of the blocks are kept, but not their
+        side effects on the current process. With an analysis database, the
+        entry points are disassembled by dis_multibloc.
+
+        @offsets: list of entry points
+        @blocs: (optional) list of already disassembled blocks to extend
+        @processes: (optional) number of workers, default to the CPU count
+        @chunksize: (optional) number of entry points per worker job
+        """
+        offsets = list(offsets)
+        if blocs is None:
+            blocs = []
+        if processes == 1 or len(offsets) < 2 or self.db is not None:
+            for offset in offsets:
+                blocs = self.dis_multibloc(offset, blocs)
+            return blocs
+
+        entries = sorted(set(offsets))
+        chunks = [entries[i:i + chunksize]
+                  for i in xrange(0, len(entries), chunksize)]
+        pool = multiprocessing.Pool(processes, _dis_worker_init, (self,))
+        try:
+            results = pool.map(_dis_worker, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        return self._merge_blocs(blocs, results)
+
+    def _merge_blocs(self, blocs, results):
+        """Merge the (decoded offsets, pickled blocks) @results of
+        dis_multibloc_parallel workers into the list of blocks @blocs
+
+        Blocks found by several workers are kept once: among blocks with the
+        same start, the shortest one (its worker stopped on an address it had
+        already decoded, which starts another block). Blocks containing the
+        start of another block are truncated there, as split_bloc does.
+        Return the merged list of blocks"""
+        symbol_pool = self.symbol_pool
+
+        def persistent_load(pid):
+            name, offset = pid
+            label = symbol_pool.getby_offset(offset)
+            if label is None:
+                if symbol_pool.getby_name(name) is not None:
+                    return symbol_pool.getby_offset_create(offset)
+                label = symbol_pool.add_label(name, offset)
+            return label
+
+        by_start = dict((bloc.label.offset, bloc) for bloc in blocs)
+        known = set(by_start)
+        for job_done, blob in results:
+            self.job_done.update(job_done)
+            unpickler = pickle.Unpickler(StringIO(blob))
+            unpickler.persistent_load = persistent_load
+            for bloc in unpickler.load():
+                start = bloc.label.offset
+                current = by_start.get(start)
+                if current is None or \
+                        (start not in known and
+                         len(bloc.lines) < len(current.lines)):
+                    by_start[start] = bloc
+
+        starts = sorted(by_start)
+        for bloc in by_start.itervalues():
+            if not bloc.lines:
+                continue
+            first, last = bloc.get_range()
+            offsets = set(bloc.get_offsets())
+            i = bisect_right(starts, first)
+            while i < len(starts) and starts[i] <= last:
+                if starts[i] in offsets:
+                    bloc.split(starts[i], by_start[starts[i]].label)
+                    break
+                i += 1
+        return blocs + [by_start[start] for start in starts
+                        if start not in known]
+
+    def _cg_add_bloc(self, bloc, owner):
+        """Index @bloc as a bloc of the function starting at @owner"""
+        self._cg_bloc_starts[bloc.label.offset] = bloc
+        for line in bloc.lines:
+            self._cg_instr2bloc[line.offset] = bloc
+        self.functions[owner].append(bloc)
+        self.bloc_owners.setdefault(bloc.label, set()).add(owner)
+
+    def _cg_get_bloc(self, label):
+        """Return the bloc starting at @label: an already known bloc, the
+        tail of a known bloc split at @label, or a newly disassembled one"""
+        offset = label.offset
+        bloc = self._cg_bloc_starts.get(offset)
+        if bloc is not None:
+            return bloc
+        bloc = self._cg_instr2bloc.get(offset)
+        if bloc is not None:
+            new_bloc = bloc.split(offset, label)
+            if new_bloc is not None:
+                # The tail belongs to every function owning the head
+                for owner in self.bloc_owners[bloc.label]:
+                    self._cg_add_bloc(new_bloc, owner)
+                return new_bloc
+        bloc = asm_bloc(label)
+        dis_bloc(self.arch, self.bs, bloc, offset, self._cg_job_done,
+                 self.symbol_pool,
+                 dont_dis=self.dont_dis, split_dis=self.split_dis,
+                 follow_call=False,
+                 dontdis_retcall=self.dontdis_retcall,
+                 lines_wd=self.lines_wd,
+                 dis_bloc_callback=self.dis_bloc_callback,
+                 dont_dis_nulstart_bloc=self.dont_dis_nulstart_bloc,
+                 attrib=self.attrib,
+                 instr_cache=self.get_instr_cache(),
+                 flow_only=self.flow_only)
+        return bloc
+
+    def dis_function(self, entry):
+        """Recover the control flow graph of the function starting at @entry
+        (asm_label or offset), once per entry
+        Blocs already known from other functions are reused (and split if
+        @entry flow reaches their middle). The function blocs are stored in
+        self.functions[entry label], their owners in self.bloc_owners, and
+        the calls in self.callgraph
+        Return the set of labels called by the function"""
+        if not isinstance(entry, asm_label):
+            entry = self.symbol_pool.getby_offset_create(entry)
+        if entry in self.functions:
+            return set(self.callgraph.successors(entry))
+        self.functions[entry] = []
+        dont_dis_offsets, dont_dis_ranges = gen_dont_dis_index(self.dont_dis)
+
+        callees = set()
+        done = set()
+        todo = [entry]
+        while todo:
+            label = todo.pop()
+            if label in done or label.offset is None:
+                continue
+            done.add(label)
+            if (label.offset in dont_dis_offsets or
+                    label.offset in dont_dis_ranges):
+                continue
+            bloc = self._cg_get_bloc(label)
+            if entry not in self.bloc_owners.get(bloc.label, ()):
+                self._cg_add_bloc(bloc, entry)
+            for cst in bloc.bto:
+                if cst.c_t == asm_constraint.c_bad:
+                    continue
+                if isinstance(cst.label, asm_label):
+                    todo.append(cst.label)
+            instr = bloc.get_subcall_instr()
+            if instr is None:
+                continue
+            for dst in instr.getdstflow(self.symbol_pool):
+                if (isinstance(dst, m2_expr.ExprId) and
+                        isinstance(dst.name, asm_label) and
+                        dst.name.offset is not None):
+                    callees.add(dst.name)
+        self.callgraph.add_node(entry)
+        for callee in callees:
+            self.callgraph.add_edge(entry, callee)
+        return callees
+
+    def dis_callgraph(self, offsets):
+        """Recover the functions reachable from the entries @offsets
+        (asm_labels or offsets) through calls, and their call graph
+        The analysis is incremental: functions already recovered by a
+        previous call are neither disassembled nor traversed again, new
+        entries only extend the current state
+        Return self.callgraph, a DiGraph of the functions entry labels"""
+        todo = []
+        for offset in offsets:
+            if not isinstance(offset, asm_label):
+                offset = self.symbol_pool.getby_offset_create(offset)
+            todo.append(offset)
+        while todo:
+            entry = todo.pop()
+            if entry in self.functions:
+                continue
+            todo += self.dis_function(entry)
+        return self.callgraph
+
@@ -19,6 +19,10 @@
 
 class bin_stream(object):
 
+    # True if the stream content may change: decoded instructions are then
+    # not shared between disassemblies (see disasmEngine.get_instr_cache)
+    volatile = False
+
     def __init__(self, *args, **kargs):
         pass
 
@@ -165,6 +169,8 @@ class bin_stream_elf(bin_stream_container):
 
 class bin_stream_vm(bin_stream):
 
+    volatile = True
+
     def __init__(self, vm, offset=0L, base_offset=0L):
         self.offset = offset
         self.base_offset = base_offset
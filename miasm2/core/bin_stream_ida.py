@@ -11,6 +11,9 @@ class bin_stream_ida(bin_stream_str):
     Don't generate xrange using address computation:
     It can raise error on overflow 7FFFFFFF with 32 bit python
     """
+    # The IDA database may be patched
+    volatile = True
+
     def getbytes(self, start, l=1):
         o = ""
         for ad in xrange(l):
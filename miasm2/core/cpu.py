@@ -11,7 +11,7 @@ import pyparsing
 import miasm2.expression.expression as m2_expr
 from miasm2.core import asmbloc
 from miasm2.core.bin_stream import bin_stream, bin_stream_str
-from miasm2.core.utils import Disasm_Exception
+from miasm2.core.utils import Disasm_Exception, BoundedDict
 from miasm2.expression.simplifications import expr_simp
 
 log = logging.getLogger("cpuhelper")
@@ -697,6 +697,12 @@ def gen_bsint(value, l, args):
 
 total_scans = 0
 
+# Operand made of a single token (register, integer, identifier), followed by
+# the next operand or the end of the line. Parsers consuming a comma do it
+# inside brackets / parenthesis or after a dereference marker, so such an
+# operand is parsed the same way alone or followed by the next ones.
+simple_operand = re.compile(r'(-?[\w.$@]+)\s*(?:,|$)')
+
 
 def branch2nodes(branch, nodes=None):
     if nodes is None:
@@ -910,12 +916,48 @@ class metamn(type):
 
 
 class instruction(object):
+    # Instructions are numerous in a whole binary disassembly: their
+    # attributes are slots. Subclasses without __slots__ keep their other
+    # attributes in a __dict__
+    __slots__ = ["name", "mode", "args", "additional_info", "flow_only",
+                 "data", "offset", "l", "b"]
 
     def __init__(self, name, mode, args, additional_info=None):
         self.name = name
         self.mode = mode
         self.args = args
         self.additional_info = additional_info
+        # True if the instruction was decoded in flow only mode (see
+        # cls_mn.dis)
+        self.flow_only = False
+
+    def _get_attrs(self):
+        """Return the (name, value) of the set attributes of the instruction:
+        slots, and __dict__ items if any"""
+        out = []
+        for cls in self.__class__.__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if name in ["__dict__", "__weakref__"]:
+                    continue
+                try:
+                    out.append((name, getattr(self, name)))
+                except AttributeError:
+                    pass
+        out += getattr(self, "__dict__", {}).items()
+        return out
+
+    def __copy__(self):
+        new_instr = self.__class__.__new__(self.__class__)
+        for name, value in self._get_attrs():
+            setattr(new_instr, name, value)
+        return new_instr
+
+    def __getstate__(self):
+        return dict(self._get_attrs())
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
 
     def gen_args(self, args):
         out = ', '.join([str(x) for x in args])
@@ -982,9 +1024,109 @@ class cls_mn(object):
     instruction = instruction
     # Block's offset alignement
     alignment = 1
+    # Maximum number of instructions whose encodings are cached by asm (0 to
+    # disable the cache)
+    asm_cache_size = 10000
+    # Maximum number of operand strings whose parsing results are cached by
+    # fromstring (0 to disable the cache)
+    parse_cache_size = 10000
+    # Number of instruction bits indexing the decode tables used by
+    # guess_mnemo (None to walk the bintree instead)
+    decode_table_bits = None
+
+    @classmethod
+    def gen_decode_tables(cls):
+        """Return the decode tables of the instruction classes, or None if
+        some fields have a variable length
+        The tables are {instruction length: (shift, index_mask, buckets)}:
+        the instructions are indexed on their bits [shift, shift +
+        decode_table_bits[, and each bucket lists the (class, mask, bits) of
+        the classes whose fixed bits match the index. The window is chosen to
+        minimize the buckets' sizes."""
+        classes = {}
+        for cc in cls.all_mn:
+            length, mask, bits = 0, 0, 0
+            for f in cc.fields:
+                if f.flen is not None:
+                    return None
+                if not f.l:
+                    continue
+                mask = (mask << f.l) | f.fmask
+                bits = (bits << f.l) | f.fbits
+                length += f.l
+            classes.setdefault(length, []).append((cc, mask, bits))
+
+        tables = {}
+        for length, infos in classes.iteritems():
+            index_l = min(cls.decode_table_bits, length)
+            index_mask = (1 << index_l) - 1
+            best = None
+            for shift in xrange(length - index_l + 1):
+                size = 0
+                for _, mask, _ in infos:
+                    fixed = bin((mask >> shift) & index_mask).count('1')
+                    size += 1 << (index_l - fixed)
+                if best is None or size < best[0]:
+                    best = size, shift
+            shift = best[1]
+            buckets = [[] for _ in xrange(1 << index_l)]
+            for cc, mask, bits in infos:
+                index_fixed = (mask >> shift) & index_mask
+                index_bits = (bits >> shift) & index_fixed
+                free = index_mask & ~index_fixed
+                # Enumerate the values of the free bits of the window
+                sub = free
+                while True:
+                    buckets[index_bits | sub].append((cc, mask, bits))
+                    if not sub:
+                        break
+                    sub = (sub - 1) & free
+            tables[length] = shift, index_mask, buckets
+        return tables
+
+    @classmethod
+    def get_decode_tables(cls):
+        """Return the decode tables (see gen_decode_tables), or None if they
+        are disabled or not applicable
+        Tables are computed on first use, and again if instructions are
+        added"""
+        if not cls.decode_table_bits:
+            return None
+        cached = cls.__dict__.get('_decode_tables')
+        if cached is None or cached[0] != len(cls.all_mn):
+            cached = len(cls.all_mn), cls.gen_decode_tables()
+            cls._decode_tables = cached
+        return cached[1]
+
+    @classmethod
+    def guess_mnemo_tables(cls, tables, bs, attrib, offset):
+        """Return the candidates classes matching the instruction at @offset,
+        using the decode @tables, or None if the instruction bits cannot be
+        read at once"""
+        candidates = set()
+        for length, (shift, index_mask, buckets) in tables.iteritems():
+            try:
+                v = cls.getbits(bs, attrib, offset * 8, length)
+            except IOError:
+                # Raised if offset is out of bound
+                continue
+            except ValueError:
+                return None
+            for cc, mask, bits in buckets[(v >> shift) & index_mask]:
+                if v & mask == bits:
+                    candidates.add(cc)
+        return [c for c in candidates]
 
     @classmethod
     def guess_mnemo(cls, bs, attrib, pre_dis_info, offset):
+        tables = cls.get_decode_tables()
+        if tables is not None:
+            candidates = cls.guess_mnemo_tables(tables, bs, attrib, offset)
+            if candidates:
+                return candidates
+            if candidates is not None:
+                raise Disasm_Exception('cannot disasm (guess) at %X' % offset)
+
         candidates = []
 
         candidates = set()
@@ -1089,7 +1231,13 @@ class cls_mn(object):
         return fields
 
     @classmethod
-    def dis(cls, bs_o, mode_o = None, offset=0):
+    def dis(cls, bs_o, mode_o = None, offset=0, flow_only=False):
+        """Disassemble the instruction at @offset of @bs_o
+        @flow_only: (optional) if set, only instructions modifying the control
+        flow are fully decoded. Other ones are returned without their bytes
+        (no 'b' attribute), with unsimplified arguments, and have their
+        'flow_only' attribute set.
+        """
         if not isinstance(bs_o, bin_stream):
             bs_o = bin_stream_str(bs_o)
 
@@ -1104,6 +1252,11 @@ class cls_mn(object):
         else:
             bs_l = len(bs)
 
+        # With decode tables, fields have a fixed length: instructions are
+        # read at once, by length
+        tables = cls.get_decode_tables()
+        words = {}
+
         alias = False
         for c in candidates:
             log.debug("*" * 40, mode, c.mode)
@@ -1111,6 +1264,16 @@ class cls_mn(object):
 
             c = cls.all_mn_inst[c][0]
 
+            word = None
+            if tables is not None:
+                if c.mn_len not in words:
+                    try:
+                        words[c.mn_len] = cls.getbits(bs, mode, offset * 8,
+                                                      c.mn_len)
+                    except (IOError, ValueError):
+                        words[c.mn_len] = None
+                word = words[c.mn_len]
+
             c.reset_class()
             c.mode = mode
 
@@ -1138,7 +1301,11 @@ class cls_mn(object):
                     if bs_l * 8 - offset_b < l:
                         getok = False
                         break
-                    bv = cls.getbits(bs, mode, offset_b, l)
+                    if word is None:
+                        bv = cls.getbits(bs, mode, offset_b, l)
+                    else:
+                        end = offset_b + l - offset * 8
+                        bv = (word >> (c.mn_len - end)) & ((1 << l) - 1)
                     offset_b += l
                     if not f.fname in fname_values:
                         fname_values[f.fname] = bv
@@ -1161,10 +1328,11 @@ class cls_mn(object):
 
             if not ret:
                 continue
-            for a in c.args:
-                a.expr = expr_simp(a.expr)
+            if not flow_only:
+                for a in c.args:
+                    a.expr = expr_simp(a.expr)
+                c.b = cls.getbytes(bs, offset_o, c.l)
 
-            c.b = cls.getbytes(bs, offset_o, c.l)
             c.offset = offset_o
             c = c.post_dis()
             if c is None:
@@ -1173,9 +1341,14 @@ class cls_mn(object):
             instr = cls.instruction(c.name, mode, c_args,
                                     additional_info=c.additional_info())
             instr.l = prefix_len + total_l / 8
-            instr.b = cls.getbytes(bs, offset_o, instr.l)
             instr.offset = offset_o
             instr.get_info(c)
+            if flow_only and not (instr.breakflow() or instr.splitflow()):
+                instr.flow_only = True
+            else:
+                if flow_only:
+                    instr.args = [expr_simp(arg) for arg in instr.args]
+                instr.b = cls.getbytes(bs, offset_o, instr.l)
             if c.alias:
                 alias = True
             out.append(instr)
@@ -1207,6 +1380,7 @@ class cls_mn(object):
         out = []
         out_args = []
         parsers = defaultdict(dict)
+        cache = cls.get_parse_cache()
 
         for cc in clist:
             for c in cls.get_cls_instance(cc, mode):
@@ -1223,17 +1397,30 @@ class cls_mn(object):
                         parser = f.parser
                     else:
                         parser = (f.parser,)
+                    # Fast path: a single token operand is scanned alone, so
+                    # that its result is shared by every line using it
+                    operand = simple_operand.match(args_str)
+                    if operand is not None:
+                        operand = operand.group(1)
+                    else:
+                        operand = args_str
                     for p in parser:
                         if p in parsers[(i, start_i)]:
                             continue
+                        key = (p, operand)
+                        if cache is not None and key in cache:
+                            parsers[(i, start_i)][p] = cache[key]
+                            continue
                         try:
                             total_scans += 1
-                            v, start, stop = p.scanString(args_str).next()
+                            v, start, stop = p.scanString(operand).next()
                         except StopIteration:
                             v, start, stop = [None], None, None
                         if start != 0:
                             v, start, stop = [None], None, None
                         parsers[(i, start_i)][p] = v[0], start, stop
+                        if cache is not None:
+                            cache[key] = v[0], start, stop
 
                     start, stop = f.fromstring(args_str, parsers[(i, start_i)])
                     if start != 0:
@@ -1283,17 +1470,89 @@ class cls_mn(object):
         c.mode = mode
         yield c
 
+    @classmethod
+    def asm_infos_key(cls, infos):
+        """Return a hashable summary of the additional information @infos
+        used by dup_info, or None if it is not used"""
+        return None
+
+    @classmethod
+    def get_asm_candidates(cls, name, args_nb):
+        """Return the instruction classes named @name taking @args_nb
+        arguments
+        The index is computed once per mnemonic, so that classes whose
+        operands can't match are not instanciated by asm"""
+        if '_asm_candidates' not in cls.__dict__:
+            cls._asm_candidates = {}
+        index = cls._asm_candidates.get(name)
+        if index is None:
+            index = {}
+            for cc in cls.all_mn_name[name]:
+                cc_args_nb = len(cls.all_mn_inst[cc][0].args)
+                index.setdefault(cc_args_nb, []).append(cc)
+            cls._asm_candidates[name] = index
+        return index.get(args_nb, [])
+
+    @classmethod
+    def get_asm_cache(cls):
+        """Return the cache of asm results, or None if it is disabled
+        The cache is bounded to asm_cache_size elements, and is keyed by
+        (mnemonic, mode, original arguments, resolved arguments, additional
+        information)"""
+        if not cls.asm_cache_size:
+            return None
+        if '_asm_cache' not in cls.__dict__:
+            cls._asm_cache = BoundedDict(cls.asm_cache_size)
+        return cls._asm_cache
+
+    @classmethod
+    def get_parse_cache(cls):
+        """Return the cache of operand parsing results used by fromstring, or
+        None if it is disabled
+        The cache is bounded to parse_cache_size elements, and is keyed by
+        (parser, operand string)"""
+        if not cls.parse_cache_size:
+            return None
+        if '_parse_cache' not in cls.__dict__:
+            cls._parse_cache = BoundedDict(cls.parse_cache_size)
+        return cls._parse_cache
+
     @classmethod
     def asm(cls, instr, symbols=None):
         """
         Re asm instruction by searching mnemo using name and args. We then
         can modify args and get the hex of a modified instruction
         """
-        clist = cls.all_mn_name[instr.name]
-        clist = [x for x in clist]
+        args = instr.resolve_args_with_symbols(symbols)
+
+        cache = cls.get_asm_cache()
+        if cache is not None:
+            key = (instr.name, instr.mode, tuple(instr.args), tuple(args),
+                   cls.asm_infos_key(instr.additional_info))
+            if key in cache:
+                vals = cache[key]
+                if vals is None:
+                    raise ValueError('cannot asm %r %r' %
+                                     (instr.name,
+                                      [str(x) for x in instr.args]))
+                return list(vals)
+
+        try:
+            vals = cls.asm_candidates(instr, args)
+        except ValueError:
+            if cache is not None:
+                cache[key] = None
+            raise
+        if cache is not None:
+            cache[key] = tuple(vals)
+        return vals
+
+    @classmethod
+    def asm_candidates(cls, instr, args):
+        """Return the encodings of @instr, with resolved arguments @args"""
+        clist = cls.get_asm_candidates(instr.name, len(instr.args))
         vals = []
         candidates = []
-        args = instr.resolve_args_with_symbols(symbols)
 
         for cc in clist:
 
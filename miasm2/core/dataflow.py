@@ -0,0 +1,199 @@
+"""Generic iterative dataflow analyses on a DiGraph.
+
+Analysed facts (definitions, registers, ...) are numbered, and sets of facts
+are represented as integer bitsets: bit i is set iff the fact of number i is
+in the set.
+"""
+
+import heapq
+
+
+def iter_bits(bitset):
+    """Yield the index of each bit set in the integer @bitset, by increasing
+    index"""
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+class BitsetNumbering(object):
+    """Numbering of hashable objects, to represent sets of them as integer
+    bitsets"""
+
+    def __init__(self):
+        self._objects = []
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, obj):
+        return obj in self._indexes
+
+    def add(self, obj):
+        """Number @obj (if not already numbered) and return its bit"""
+        index = self._indexes.get(obj)
+        if index is None:
+            index = self._indexes[obj] = len(self._objects)
+            self._objects.append(obj)
+        return 1 << index
+
+    def bit(self, obj):
+        """Return the bit of the numbered object @obj"""
+        return 1 << self._indexes[obj]
+
+    def to_bitset(self, objs):
+        """Return the bitset of the numbered objects @objs"""
+        bitset = 0
+        for obj in objs:
+            bitset |= 1 << self._indexes[obj]
+        return bitset
+
+    def to_objects(self, bitset):
+        """Return the list of the objects of @bitset"""
+        return [self._objects[index] for index in iter_bits(bitset)]
+
+
+def reverse_postorder(graph, heads, next_cb=None):
+    """Return the nodes of @graph reachable from @heads in reverse
+    postorder of a depth first walk, followed by the remaining nodes
+    @next_cb: (optional) function returning the successors of a node
+    (default: graph.successors_iter)"""
+    if next_cb is None:
+        next_cb = graph.successors_iter
+    order = []
+    done = set()
+    for roots in [heads, graph.nodes()]:
+        postorder = []
+        for root in roots:
+            if root in done:
+                continue
+            done.add(root)
+            todo = [(root, iter(next_cb(root)))]
+            while todo:
+                node, sons = todo[-1]
+                for son in sons:
+                    if son not in done:
+                        done.add(son)
+                        todo.append((son, iter(next_cb(son))))
+                        break
+                else:
+                    todo.pop()
+                    postorder.append(node)
+        order += reversed(postorder)
+    return order
+
+
+class DataFlowAnalysis(object):
+    """Iterative bit vector dataflow analysis on a DiGraph.
+
+    Each node has a 'gen' and a 'kill' bitset. In the analysis direction,
+    the state entering a node is the union of its 'boundary' bitset (if any)
+    and of the states leaving its neighbours, and the state leaving it is:
+        gen | (entering & ~kill)
+
+    States are computed with a worklist, visiting nodes in reverse postorder
+    (of the reversed graph for backward analyses). After compute():
+     - before[node] is the state at the beginning of @node
+     - after[node] is the state at the end of @node
+    """
+
+    # Backward analyses propagate states from successors to predecessors
+    backward = False
+
+    def __init__(self, graph):
+        self.graph = graph
+        # node -> bitset
+        self.gen = {}
+        self.kill = {}
+        # Bitsets always entering a node (function entry / exit states, ...)
+        self.boundary = {}
+        self.before = {}
+        self.after = {}
+
+    def transfer(self, node, state):
+        """Return the state leaving @node, @state entering it"""
+        return self.gen.get(node, 0) | (state & ~self.kill.get(node, 0))
+
+    def _directions(self):
+        """Return the (previous nodes callback, next nodes callback, entering
+        states, leaving states) of the analysis direction"""
+        if self.backward:
+            return (self.graph.successors_iter, self.graph.predecessors_iter,
+                    self.after, self.before)
+        return (self.graph.predecessors_iter, self.graph.successors_iter,
+                self.before, self.after)
+
+    def compute(self, heads=None):
+        """Compute the states of each node of the graph, visiting @heads
+        first (default: heads of the graph, or its leaves for backward
+        analyses)"""
+        _, next_cb, state_in, state_out = self._directions()
+        if heads is None:
+            if self.backward:
+                heads = self.graph.leaves()
+            else:
+                heads = self.graph.heads()
+
+        self._order = reverse_postorder(self.graph, heads, next_cb)
+        self._priority = dict((node, i) for i, node in enumerate(self._order))
+        for node in self._order:
+            state_in[node] = self.boundary.get(node, 0)
+            state_out[node] = self.transfer(node, state_in[node])
+        self._propagate(self._order)
+
+    def _propagate(self, nodes):
+        """Recompute the states of @nodes, and of the nodes depending on them,
+        until a fixpoint is reached. Return the set of nodes whose states
+        changed"""
+        prev_cb, next_cb, state_in, state_out = self._directions()
+        priority = self._priority
+        todo = [priority[node] for node in nodes]
+        heapq.heapify(todo)
+        in_todo = set(nodes)
+        changed = set()
+        while todo:
+            node = self._order[heapq.heappop(todo)]
+            in_todo.discard(node)
+            state = self.boundary.get(node, 0)
+            for prev in prev_cb(node):
+                state |= state_out.get(prev, 0)
+            if state != state_in[node]:
+                state_in[node] = state
+                changed.add(node)
+            new_out = self.transfer(node, state)
+            if new_out == state_out[node]:
+                continue
+            state_out[node] = new_out
+            changed.add(node)
+            for succ in next_cb(node):
+                if succ not in in_todo and succ in priority:
+                    in_todo.add(succ)
+                    heapq.heappush(todo, priority[succ])
+        return changed
+
+    def update(self, nodes):
+        """Update the states after a change of the gen, kill, boundary or
+        transfer function of @nodes. Only the nodes depending on them are
+        recomputed, from their boundary state: the fixpoint reached from the
+        current states could keep facts which do not hold anymore (in loops).
+        Return the set of nodes whose states changed
+        PRE: compute(), and the graph edges are unchanged since"""
+        _, next_cb, state_in, state_out = self._directions()
+        old_states = {}
+        todo = [node for node in nodes if node in self._priority]
+        while todo:
+            node = todo.pop()
+            if node in old_states or node not in self._priority:
+                continue
+            old_states[node] = state_in[node], state_out[node]
+            state_in[node] = self.boundary.get(node, 0)
+            state_out[node] = self.transfer(node, state_in[node])
+            todo += next_cb(node)
+
+        changed = self._propagate(old_states)
+        changed.difference_update(old_states)
+        changed.update(node for node, states in old_states.iteritems()
+                       if states != (state_in[node], state_out[node]))
+        return changed
@@ -10,6 +10,8 @@ class DiGraph(object):
         self._nodes_succ = {}
         # N -> Nodes N2 with a edge (N2 -> N)
         self._nodes_pred = {}
+        # Incremented on each modification of the nodes or edges
+        self._version = 0
 
     def __repr__(self):
         out = []
@@ -19,6 +21,12 @@ class DiGraph(object):
             out.append("%s -> %s" % (src, dst))
         return '\n'.join(out)
 
+    @property
+    def version(self):
+        """Modification stamp of the graph: it changes each time a node or an
+        edge is added or removed"""
+        return self._version
+
     def nodes(self):
         return self._nodes
 
@@ -31,6 +39,7 @@ class DiGraph(object):
         self._nodes.add(node)
         self._nodes_succ[node] = []
         self._nodes_pred[node] = []
+        self._version += 1
 
     def del_node(self, node):
         """Delete the @node of the graph; Also delete every edge to/from this
@@ -38,6 +47,7 @@ class DiGraph(object):
 
         if node in self._nodes:
             self._nodes.remove(node)
+            self._version += 1
         for pred in self.predecessors(node):
             self.del_edge(pred, node)
         for succ in self.successors(node):
@@ -51,6 +61,7 @@ class DiGraph(object):
         self._edges.append((src, dst))
         self._nodes_succ[src].append(dst)
         self._nodes_pred[dst].append(src)
+        self._version += 1
 
     def add_uniq_edge(self, src, dst):
         """Add an edge from @src to @dst if it doesn't already exist"""
@@ -62,6 +73,7 @@ class DiGraph(object):
         self._edges.remove((src, dst))
         self._nodes_succ[src].remove(dst)
         self._nodes_pred[dst].remove(src)
+        self._version += 1
 
     def predecessors_iter(self, node):
         if not node in self._nodes_pred:
@@ -326,18 +338,22 @@ shape = "box"
         idoms = self.compute_immediate_dominators(head)
         frontier = {}
 
-        for node in idoms:
-            if self._nodes_pred[node] >= 2:
-                for predecessor in self.predecessors_iter(node):
-                    runner = predecessor
-                    if runner not in idoms:
-                        continue
-                    while runner != idoms[node]:
-                        if runner not in frontier:
-                            frontier[runner] = set()
-
-                        frontier[runner].add(node)
-                        runner = idoms[runner]
+        # The head has no immediate dominator, and is a join node as soon as
+        # it has a predecessor (loop on the head)
+        for node in idoms.keys() + [head]:
+            if len(self._nodes_pred[node]) < 2 and node != head:
+                continue
+            for predecessor in self.predecessors_iter(node):
+                runner = predecessor
+                if runner not in idoms and runner != head:
+                    # Predecessor not reachable from head
+                    continue
+                while runner != idoms.get(node):
+                    if runner not in frontier:
+                        frontier[runner] = set()
+
+                    frontier[runner].add(node)
+                    runner = idoms.get(runner)
         return frontier
 
     def _walk_generic_first(self, head, flag, succ_cb):
@@ -507,3 +523,66 @@ shape = "box"
                             done.add(current.node)
 
                         yield scc
+
+
+class CachedDiGraph(DiGraph):
+    """DiGraph memoizing its dominators, loops and strongly connected
+    components.
+
+    Results are computed once, and again only after a modification of the
+    graph (see DiGraph.version). They are shared between the callers: they
+    must not be modified.
+    """
+
+    def __init__(self):
+        super(CachedDiGraph, self).__init__()
+        # key -> (graph version, result)
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        """Return the result of @compute(), memoized under @key until the
+        graph is modified"""
+        cached = self._cache.get(key)
+        if cached is None or cached[0] != self._version:
+            cached = self._cache[key] = (self._version, compute())
+        return cached[1]
+
+    def compute_dominators(self, head):
+        return self._cached(
+            ("dominators", head),
+            lambda: super(CachedDiGraph, self).compute_dominators(head))
+
+    def compute_postdominators(self, leaf):
+        return self._cached(
+            ("postdominators", leaf),
+            lambda: super(CachedDiGraph, self).compute_postdominators(leaf))
+
+    def compute_immediate_dominators(self, head):
+        return self._cached(
+            ("immediate_dominators", head),
+            lambda: super(CachedDiGraph,
+                          self).compute_immediate_dominators(head))
+
+    def compute_dominance_frontier(self, head):
+        return self._cached(
+            ("dominance_frontier", head),
+            lambda: super(CachedDiGraph,
+                          self).compute_dominance_frontier(head))
+
+    def compute_back_edges(self, head):
+        return iter(self._cached(
+            ("back_edges", head),
+            lambda: list(super(CachedDiGraph,
+                               self).compute_back_edges(head))))
+
+    def compute_natural_loops(self, head):
+        return iter(self._cached(
+            ("natural_loops", head),
+            lambda: list(super(CachedDiGraph,
+                               self).compute_natural_loops(head))))
+
+    def compute_strongly_connected_components(self):
+        return iter(self._cached(
+            ("strongly_connected_components",),
+            lambda: list(super(CachedDiGraph,
+                               self).compute_strongly_connected_components())))
@@ -1,3 +1,5 @@
+from bisect import bisect_right
+
 INT_EQ = 0      # Equivalent
 INT_B_IN_A = 1  # B in A
 INT_A_IN_B = -1 # A in B
@@ -112,10 +114,12 @@ class interval(object):
                     return False
             return True
         else:
-            for intervalA in self.intervals:
-                if intervalA[0] <= other <= intervalA[1]:
-                    return True
-            return False
+            # Canonical intervals are sorted and disjoint: only the last one
+            # starting before @other may contain it
+            index = bisect_right(self.intervals, (other, float('inf')))
+            if index == 0:
+                return False
+            return other <= self.intervals[index - 1][1]
 
     def __eq__(self, i):
         return self.intervals == i.intervals
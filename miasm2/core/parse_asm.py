@@ -19,6 +19,30 @@ size2pck = {8: 'B',
             64: 'Q',
             }
 
+EMPTY_RE = re.compile(r'\s*$')
+COMMENT_RE = re.compile(r'\s*;\S*')
+LOCAL_FORGET_LABEL_RE = re.compile(r'\s*\.LF[BE]\d\s*:')
+LOCAL_LABEL_RE = re.compile(r'\s*(\.L\S+)\s*:')
+DIRECTIVE_START_RE = re.compile(r'\s*\.')
+DIRECTIVE_RE = re.compile(r'\s*\.(\S+)')
+LABEL_RE = re.compile(r'\s*(\S+)\s*:')
+
+# Data declaration parsers, by element size
+data_parsers = {}
+
+
+def get_data_parser(size):
+    """Return the parser of @size bits elements of data declarations"""
+    if size not in data_parsers:
+        base_expr = gen_base_expr()[2]
+        my_var_parser = parse_ast(lambda x: m2_expr.ExprId(x, size),
+                                  lambda x:
+                                      m2_expr.ExprInt_fromsize(size, x))
+        base_expr.setParseAction(my_var_parser)
+        data_parsers[size] = base_expr
+    return data_parsers[size]
+
+
 class DirectiveAlign(object):
     """Stand for alignment representation"""
 
@@ -78,25 +102,25 @@ def parse_txt(mnemo, attrib, txt, symbol_pool=None, gen_label_index=0):
     # parse each line
     for line in txt.split('\n'):
         # empty
-        if re.match(r'\s*$', line):
+        if EMPTY_RE.match(line):
             continue
         # comment
-        if re.match(r'\s*;\S*', line):
+        if COMMENT_RE.match(line):
             continue
         # labels to forget
-        r = re.match(r'\s*\.LF[BE]\d\s*:', line)
+        r = LOCAL_FORGET_LABEL_RE.match(line)
         if r:
             continue
         # label beginning with .L
-        r = re.match(r'\s*(\.L\S+)\s*:', line)
+        r = LOCAL_LABEL_RE.match(line)
         if r:
             l = r.groups()[0]
             l = symbol_pool.getby_name_create(l)
             lines.append(l)
             continue
         # directive
-        if re.match(r'\s*\.', line):
-            r = re.match(r'\s*\.(\S+)', line)
+        if DIRECTIVE_START_RE.match(line):
+            r = DIRECTIVE_RE.match(line)
             directive = r.groups()[0]
             if directive == 'text':
                 lines = lines_text
@@ -131,11 +155,7 @@ def parse_txt(mnemo, attrib, txt, symbol_pool=None, gen_label_index=0):
                 data_int = []
 
                 # parser
-                base_expr = gen_base_expr()[2]
-                my_var_parser = parse_ast(lambda x: m2_expr.ExprId(x, size),
-                                          lambda x:
-                                              m2_expr.ExprInt_fromsize(size, x))
-                base_expr.setParseAction(my_var_parser)
+                base_expr = get_data_parser(size)
 
                 for b in data_raw:
                     b = b.strip()
@@ -171,7 +191,7 @@ def parse_txt(mnemo, attrib, txt, symbol_pool=None, gen_label_index=0):
             raise ValueError("unknown directive %s" % str(directive))
 
         # label
-        r = re.match(r'\s*(\S+)\s*:', line)
+        r = LABEL_RE.match(line)
         if r:
             l = r.groups()[0]
             l = symbol_pool.getby_name_create(l)
@@ -99,16 +99,26 @@ class BoundedDict(UserDict.DictMixin):
                 self._counter = collections.Counter(self._data.keys())
 
         self._data[asked_key] = value
-        self._counter.update([asked_key])
+        self._counter[asked_key] += 1
 
     def keys(self):
         "Return the list of dict's keys"
         return self._data.keys()
 
     def __getitem__(self, key):
-        self._counter.update([key])
+        value = self._data[key]
+        self._counter[key] += 1
+        return value
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._counter[key] += 1
         return self._data[key]
 
+    def __contains__(self, key):
+        return key in self._data
+
     def __delitem__(self, key):
         if self._delete_cb is not None:
             self._delete_cb(key)
@@ -167,6 +167,11 @@ class Expr(object):
             self._hash = self._exprhash()
         return self._hash
 
+    # Expressions are pickled as their constructor arguments (see
+    # __reduce__): pickles stay compact, and cached values (the hash, which
+    # may depend on objects identity (asm_label), read / write sets, ...) are
+    # computed again after unpickling
+
     def pre_eq(self, other):
         """Return True if ids are equal;
         False if instances are obviously not equal
@@ -354,6 +359,9 @@ class ExprInt(Expr):
         self._arg = arg
         self._size = self.arg.size
 
+    def __reduce__(self):
+        return self.__class__, (self._arg,)
+
     arg = property(lambda self: self._arg)
 
     def __eq__(self, other):
@@ -424,6 +432,9 @@ class ExprId(Expr):
 
         self._name, self._size = name, size
 
+    def __reduce__(self):
+        return self.__class__, (self._name, self._size)
+
     name = property(lambda self: self._name)
 
     def __eq__(self, other):
@@ -498,6 +509,9 @@ class ExprAff(Expr):
 
         self._size = self.dst.size
 
+    def __reduce__(self):
+        return self.__class__, (self._dst, self._src)
+
     dst = property(lambda self: self._dst)
     src = property(lambda self: self._src)
 
@@ -505,17 +519,30 @@ class ExprAff(Expr):
     def __str__(self):
         return "%s = %s" % (str(self._dst), str(self._src))
 
+    # ExprAff are immutable: their read and written elements are computed
+    # once, and copied for the callers
+    _r_cache = None
+    _w_cache = None
+
     def get_r(self, mem_read=False, cst_read=False):
-        elements = self._src.get_r(mem_read, cst_read)
-        if isinstance(self._dst, ExprMem):
-            elements.update(self._dst.arg.get_r(mem_read, cst_read))
-        return elements
+        if self._r_cache is None:
+            self._r_cache = {}
+        elements = self._r_cache.get((mem_read, cst_read))
+        if elements is None:
+            elements = self._src.get_r(mem_read, cst_read)
+            if isinstance(self._dst, ExprMem):
+                elements.update(self._dst.arg.get_r(mem_read, cst_read))
+            elements = frozenset(elements)
+            self._r_cache[(mem_read, cst_read)] = elements
+        return set(elements)
 
     def get_w(self):
-        if isinstance(self._dst, ExprMem):
-            return set([self._dst])  # [memreg]
-        else:
-            return self._dst.get_w()
+        if self._w_cache is None:
+            if isinstance(self._dst, ExprMem):
+                self._w_cache = frozenset([self._dst])  # [memreg]
+            else:
+                self._w_cache = frozenset(self._dst.get_w())
+        return set(self._w_cache)
 
     def _exprhash(self):
         return hash((EXPRAFF, hash(self._dst), hash(self._src)))
@@ -587,6 +614,9 @@ class ExprCond(Expr):
         self._cond, self._src1, self._src2 = cond, src1, src2
         self._size = self.src1.size
 
+    def __reduce__(self):
+        return self.__class__, (self._cond, self._src1, self._src2)
+
     cond = property(lambda self: self._cond)
     src1 = property(lambda self: self._src1)
     src2 = property(lambda self: self._src2)
@@ -665,6 +695,9 @@ class ExprMem(Expr):
 
         self._arg, self._size = arg, size
 
+    def __reduce__(self):
+        return self.__class__, (self._arg, self._size)
+
     arg = property(lambda self: self._arg)
 
     def __str__(self):
@@ -779,6 +812,9 @@ class ExprOp(Expr):
 
         self._size = sz
 
+    def __reduce__(self):
+        return self.__class__, (self._op,) + self._args
+
     op = property(lambda self: self._op)
     args = property(lambda self: self._args)
 
@@ -860,6 +896,9 @@ class ExprSlice(Expr):
         self._arg, self._start, self._stop = arg, start, stop
         self._size = self._stop - self._start
 
+    def __reduce__(self):
+        return self.__class__, (self._arg, self._start, self._stop)
+
     arg = property(lambda self: self._arg)
     start = property(lambda self: self._start)
     stop = property(lambda self: self._stop)
@@ -962,6 +1001,9 @@ class ExprCompose(Expr):
 
         self._size = self._args[-1][2]
 
+    def __reduce__(self):
+        return self.__class__, (self._args,)
+
     args = property(lambda self: self._args)
 
     def __str__(self):
@@ -4,7 +4,8 @@
 import logging
 
 from miasm2.ir.symbexec import symbexec
-from miasm2.core.graph import DiGraph
+from miasm2.core.graph import CachedDiGraph
+from miasm2.core.dataflow import BitsetNumbering, DataFlowAnalysis
 from miasm2.expression.expression \
     import ExprAff, ExprCond, ExprId, ExprInt, ExprMem
 
@@ -14,6 +15,293 @@ console_handler.setFormatter(logging.Formatter("%(levelname)-5s: %(message)s"))
 log.addHandler(console_handler)
 log.setLevel(logging.WARNING)
 
+
+class ReachingDefinitions(DataFlowAnalysis):
+    """Reaching definitions of registers in the irblocs of an ira, along its
+    graph.
+
+    A definition is a (label, line number, ExprAff) triple, for each ExprAff
+    of the line writing a register. Sets of definitions are bitsets of
+    'defs' numbering.
+    """
+
+    def __init__(self, ir_arch, regs):
+        """Number the definitions of @regs in the irblocs of @ir_arch
+        PRE: gen_graph()"""
+        super(ReachingDefinitions, self).__init__(ir_arch.g)
+        self.defs = BitsetNumbering()
+        # register -> bitset of its definitions
+        self.reg_defs = {}
+        # label -> for each line, {register: bitset of its definitions}
+        self.line_defs = {}
+        self._line_reach = {}
+
+        regs = set(regs)
+        for label in self.graph.nodes():
+            irb = ir_arch.blocs.get(label)
+            if irb is None:
+                continue
+            lines = []
+            for line_nb, exprs in enumerate(irb.irs):
+                # If a register is written several times in a line, the last
+                # ExprAff is its definition
+                line_exprs = {}
+                for expr in exprs:
+                    for dst in expr.get_w():
+                        if dst in regs:
+                            line_exprs[dst] = expr
+                defs = {}
+                for dst, expr in line_exprs.iteritems():
+                    bit = self.defs.add((label, line_nb, expr))
+                    defs[dst] = bit
+                    self.reg_defs[dst] = self.reg_defs.get(dst, 0) | bit
+                lines.append(defs)
+            self.line_defs[label] = lines
+
+        for label, lines in self.line_defs.iteritems():
+            # Last definitions of each register written by the bloc
+            last_defs = {}
+            for defs in lines:
+                last_defs.update(defs)
+            gen = kill = 0
+            for reg, bits in last_defs.iteritems():
+                gen |= bits
+                kill |= self.reg_defs[reg]
+            self.gen[label] = gen
+            self.kill[label] = kill
+
+    def line_reach(self, label, line_nb):
+        """Return the bitset of the definitions reaching the beginning of the
+        line @line_nb of the irbloc @label
+        PRE: compute()"""
+        reach = self._line_reach.get(label)
+        if reach is None:
+            reach = []
+            state = self.before[label]
+            for defs in self.line_defs[label]:
+                reach.append(state)
+                for reg, bits in defs.iteritems():
+                    state = (state & ~self.reg_defs[reg]) | bits
+            self._line_reach[label] = reach
+        return reach[line_nb]
+
+    def reg_reach(self, label, line_nb, reg):
+        """Return the bitset of the definitions of @reg reaching the beginning
+        of the line @line_nb of the irbloc @label"""
+        return self.line_reach(label, line_nb) & self.reg_defs.get(reg, 0)
+
+
+class Liveness(DataFlowAnalysis):
+    """Registers liveness in the irblocs of an ira, along its graph.
+
+    Sets of registers are bitsets of 'regs' numbering. The registers
+    returned by ira.get_out_regs are live at the end of the leaves, and
+    every register is live at the end of an irbloc with a successor out of
+    the irblocs.
+    """
+
+    backward = True
+
+    def __init__(self, ir_arch, regs):
+        """Compute the registers of @regs read and written by the irblocs of
+        @ir_arch
+        PRE: gen_graph()"""
+        super(Liveness, self).__init__(ir_arch.g)
+        self.ir_arch = ir_arch
+        self.regs = BitsetNumbering()
+        for reg in regs:
+            self.regs.add(reg)
+        # label -> for each line, its transfer data (see line_transfer)
+        self.lines = {}
+        self._line_live = {}
+        for label in self.graph.nodes():
+            self.init_bloc(label)
+
+    def bloc_lines(self, irb):
+        """Return the transfer data of each line of @irb: bitsets of the
+        registers read and written by the line"""
+        lines = []
+        for line_nb in xrange(len(irb.irs)):
+            read_elements, written_elements = irb.get_line_rw(line_nb)
+            read = written = 0
+            for reg in read_elements:
+                if reg in self.regs:
+                    read |= self.regs.bit(reg)
+            for reg in written_elements:
+                if reg in self.regs:
+                    written |= self.regs.bit(reg)
+            lines.append((read, written))
+        return lines
+
+    def line_transfer(self, line, state):
+        """Return the registers live at the beginning of a line, @state being
+        live at its end and @line its transfer data"""
+        read, written = line
+        return read | (state & ~written)
+
+    def init_bloc(self, label):
+        """(Re)compute the transfer data and the boundary state of the irbloc
+        @label (which may not be in the irblocs anymore)"""
+        self._line_live.pop(label, None)
+        self.boundary.pop(label, None)
+        irb = self.ir_arch.blocs.get(label)
+        if irb is None:
+            for attr in [self.lines, self.gen, self.kill]:
+                attr.pop(label, None)
+            return
+
+        self.lines[label] = self.bloc_lines(irb)
+        self.init_gen_kill(label)
+
+        successors = self.graph.successors(label)
+        if any(succ not in self.ir_arch.blocs for succ in successors):
+            self.boundary[label] = (1 << len(self.regs)) - 1
+        elif not successors:
+            self.boundary[label] = self.regs.to_bitset(
+                reg for reg in self.ir_arch.get_out_regs(irb)
+                if reg in self.regs)
+
+    def init_gen_kill(self, label):
+        """Compute the gen and kill bitsets of the irbloc @label from its
+        lines transfer data"""
+        gen = kill = 0
+        for read, written in reversed(self.lines[label]):
+            gen = read | (gen & ~written)
+            kill |= written
+        self.gen[label] = gen
+        self.kill[label] = kill
+
+    def update(self, nodes):
+        changed = super(Liveness, self).update(nodes)
+        for label in changed:
+            self._line_live.pop(label, None)
+        return changed
+
+    def line_live(self, label, line_nb):
+        """Return the bitset of the registers live at the end of the line
+        @line_nb of the irbloc @label
+        PRE: compute()"""
+        live = self._line_live.get(label)
+        if live is None:
+            live = []
+            state = self.after[label]
+            for line in reversed(self.lines[label]):
+                live.append(state)
+                state = self.line_transfer(line, state)
+            live.reverse()
+            self._line_live[label] = live
+        return live[line_nb]
+
+
+class StrongLiveness(Liveness):
+    """Strongly live registers in the irblocs of an ira, along its graph.
+
+    Useful affectations are memory writes, function calls, IRDst
+    affectations and affectations of strongly live registers. A register is
+    strongly live if it may be read by a useful affectation: the other
+    affectations of ExprId are dead code.
+
+    After local modifications of the irblocs, update_blocs re-propagates
+    only through the irblocs depending on the modified ones. Removing dead
+    code does not change the strongly live registers.
+    """
+
+    def __init__(self, ir_arch, regs):
+        super(StrongLiveness, self).__init__(ir_arch, regs)
+        # Labels of the irblocs modified, or whose strongly live registers
+        # changed, since the last dead code removal (ira.remove_dead_exprs)
+        self.modified = set(self.lines)
+
+    def bloc_lines(self, irb):
+        """Return the transfer data of each line of @irb: bitset of the
+        registers written, bitset of the registers read by useful
+        affectations, and list of (register bit, read bitset, ExprAff) of the
+        affectations useful iff the register is strongly live after the
+        line (a 0 bit for the never useful ones)"""
+        lines = []
+        for exprs in irb.irs:
+            # If a register is written several times in a line, only its last
+            # affectation may be useful
+            last = {}
+            for expr in exprs:
+                last[expr.dst] = expr
+            written = forced = 0
+            optional = []
+            for expr in exprs:
+                read = 0
+                for reg in expr.get_r(True):
+                    if reg in self.regs:
+                        read |= self.regs.bit(reg)
+                dst = expr.dst
+                if dst in self.regs:
+                    written |= self.regs.bit(dst)
+                if not isinstance(dst, ExprId) or \
+                        expr.src.is_function_call() or \
+                        (dst == self.ir_arch.IRDst and last[dst] is expr):
+                    forced |= read
+                elif dst in self.regs and last[dst] is expr:
+                    optional.append((self.regs.bit(dst), read, expr))
+                else:
+                    optional.append((0, read, expr))
+            lines.append((written, forced, optional))
+        return lines
+
+    def line_transfer(self, line, state):
+        written, forced, optional = line
+        for bit, read, _ in optional:
+            if state & bit:
+                forced |= read
+        return forced | (state & ~written)
+
+    def init_gen_kill(self, label):
+        # The transfer function is not a gen / kill one
+        pass
+
+    def transfer(self, node, state):
+        for line in reversed(self.lines.get(node, [])):
+            state = self.line_transfer(line, state)
+        return state
+
+    def update_blocs(self, labels):
+        """Update the analysis after modifications of the irblocs @labels
+        (edited, added to or removed from the irblocs)
+        PRE: compute(), and the graph edges are unchanged since"""
+        labels = set(labels)
+        for label in list(labels):
+            old_lines = self.lines.get(label)
+            self.init_bloc(label)
+            if self.lines.get(label) == old_lines:
+                labels.discard(label)
+        self.modified.update(labels)
+        self.modified.update(self.update(labels))
+
+    def remove_exprs(self, label, exprs):
+        """Forget the dead affectations @exprs, list of (line number,
+        ExprAff), removed from the irbloc @label. The strongly live
+        registers are unchanged"""
+        lines = self.lines[label]
+        irs = self.ir_arch.blocs[label].irs
+        for line_nb, expr in exprs:
+            _, forced, optional = lines[line_nb]
+            optional = [entry for entry in optional if entry[2] is not expr]
+            written = 0
+            for line_expr in irs[line_nb]:
+                if line_expr.dst in self.regs:
+                    written |= self.regs.bit(line_expr.dst)
+            lines[line_nb] = written, forced, optional
+
+    def dead_exprs(self, label):
+        """Return the list of (line number, ExprAff) which are dead code in
+        the irbloc @label
+        PRE: compute()"""
+        dead = []
+        for line_nb, (_, _, optional) in enumerate(self.lines[label]):
+            live = self.line_live(label, line_nb)
+            dead += [(line_nb, expr) for bit, _, expr in optional
+                     if not live & bit]
+        return dead
+
+
 class ira:
 
     def ira_regs_ids(self):
@@ -65,25 +353,48 @@ class ira:
 
         return done
 
+    def dst_labels(self, irb):
+        """Return the list of the labels @irb may jump to"""
+        labels = []
+        for d in self.dst_trackback(irb):
+            if isinstance(d, ExprInt):
+                d = ExprId(
+                    self.symbol_pool.getby_offset_create(int(d.arg)))
+            if self.ExprIsLabel(d):
+                labels.append(d.name)
+        return labels
+
     def gen_graph(self, link_all = True):
         """
         Gen irbloc digraph
         @link_all: also gen edges to non present irblocs
+
+        An existing graph is updated in place: its memoized dominators, loops
+        and strongly connected components (see CachedDiGraph) are kept if
+        its nodes and edges are unchanged.
         """
-        self.g = DiGraph()
+        nodes = set()
+        edges = set()
         for lbl, b in self.blocs.items():
-            # print 'add', lbl
-            self.g.add_node(lbl)
-            # dst = self.get_bloc_dst(b)
-            dst = self.dst_trackback(b)
-            # print "\tdst", dst
-            for d in dst:
-                if isinstance(d, ExprInt):
-                    d = ExprId(
-                        self.symbol_pool.getby_offset_create(int(d.arg)))
-                if self.ExprIsLabel(d):
-                    if d.name in self.blocs or link_all is True:
-                        self.g.add_edge(lbl, d.name)
+            nodes.add(lbl)
+            for dst in self.dst_labels(b):
+                if dst in self.blocs or link_all is True:
+                    nodes.add(dst)
+                    edges.add((lbl, dst))
+
+        graph = getattr(self, 'g', None)
+        if not isinstance(graph, CachedDiGraph):
+            graph = self.g = CachedDiGraph()
+        for src, dst in list(graph.edges()):
+            if (src, dst) not in edges:
+                graph.del_edge(src, dst)
+        for node in list(graph.nodes()):
+            if node not in nodes:
+                graph.del_node(node)
+        for node in nodes:
+            graph.add_node(node)
+        for src, dst in edges:
+            graph.add_uniq_edge(src, dst)
 
     def graph(self):
         """Output the graphviz script"""
@@ -145,24 +456,30 @@ class ira:
           - Instructions writing in memory
           - Function call instructions
         Return set of intial useful instructions
+        PRE: compute_reach(self)
         """
 
+        reach = self.reaching_defs
         useful = set()
+        useful_defs = 0
 
         for node in self.g.nodes():
             if node not in self.blocs:
                 continue
 
             block = self.blocs[node]
+            if not block.irs:
+                continue
+            line_defs = reach.line_defs[node]
+            last = len(block.irs) - 1
             successors = self.g.successors(node)
             has_son = bool(successors)
-            for p_son in successors:
-                if p_son not in self.blocs:
-                    # Leaf has lost its son: don't remove anything
-                    # reaching this block
-                    for r in self.ira_regs_ids():
-                        useful.update(block.cur_reach[-1][r].union(
-                                block.defout[-1][r]))
+            if any(p_son not in self.blocs for p_son in successors):
+                # Leaf has lost its son: don't remove anything
+                # reaching this block
+                useful_defs |= reach.line_reach(node, last)
+                for bits in line_defs[last].itervalues():
+                    useful_defs |= bits
 
             # Function call, memory write or IRDst affectation
             for k, ir in enumerate(block.irs):
@@ -172,15 +489,15 @@ class ira:
                         useful.add((block.label, k, i_cur))
                     if isinstance(i_cur.dst, ExprMem):
                         useful.add((block.label, k, i_cur))
-                    useful.update(block.defout[k][self.IRDst])
+                useful_defs |= line_defs[k].get(self.IRDst, 0)
 
             # Affecting return registers
             if not has_son:
                 for r in self.get_out_regs(block):
-                    useful.update(block.defout[-1][r]
-                                  if block.defout[-1][r] else
-                                  block.cur_reach[-1][r])
+                    useful_defs |= (line_defs[last].get(r, 0) or
+                                    reach.reg_reach(node, last, r))
 
+        useful.update(reach.defs.to_objects(useful_defs))
         return useful
 
     def _mark_useful_code(self):
@@ -195,29 +512,24 @@ class ira:
 
         """
 
+        reach = self.reaching_defs
+        regs_ids = set(self.ira_regs_ids())
         useful = self.init_useful_instr()
-        worklist = useful.copy()
+        useful_defs = reach.defs.to_bitset(elem for elem in useful
+                                           if elem in reach.defs)
+        worklist = list(useful)
         while worklist:
-            elem = worklist.pop()
-            useful.add(elem)
-            irb, irs_ind, ins = elem
-
-            block = self.blocs[irb]
-            instr_defout = block.defout[irs_ind]
-            cur_kill = block.cur_kill[irs_ind]
-            cur_reach = block.cur_reach[irs_ind]
+            irb, irs_ind, ins = worklist.pop()
 
             # Handle dependencies of used variables in ins
-            for reg in ins.get_r(True).intersection(self.ira_regs_ids()):
-                worklist.update(
-                    cur_reach[reg].difference(useful).difference(
-                        cur_kill[reg]
-                        if not instr_defout[reg] else
-                        set()))
-                for _, _, i in instr_defout[reg]:
-                    # Loop case (i in defout of current block)
-                    if i == ins:
-                        worklist.update(cur_reach[reg].difference(useful))
+            for reg in ins.get_r(True).intersection(regs_ids):
+                new_defs = reach.reg_reach(irb, irs_ind, reg) & ~useful_defs
+                if not new_defs:
+                    continue
+                useful_defs |= new_defs
+                new_useful = reach.defs.to_objects(new_defs)
+                useful.update(new_useful)
+                worklist += new_useful
         return useful
 
     def remove_dead_code(self):
@@ -247,6 +559,7 @@ class ira:
             print '    (%s, %s, %s)' % p
 
     def dump_bloc_state(self, irb):
+        reach = self.reaching_defs
         print '*'*80
         for k, irs in enumerate(irb.irs):
             for i in xrange(len(irs)):
@@ -254,109 +567,102 @@ class ira:
                 print 'instr', k, irs[i]
                 print 5*"-"
                 for v in self.ira_regs_ids():
-                    if irb.cur_reach[k][v]:
+                    v_reach = reach.reg_reach(irb.label, k, v)
+                    v_defout = reach.line_defs[irb.label][k].get(v, 0)
+                    if v_reach:
                         print 'REACH[%d][%s]' % (k, v)
-                        self.print_set(irb.cur_reach[k][v])
-                    if irb.cur_kill[k][v]:
+                        self.print_set(reach.defs.to_objects(v_reach))
+                    if v_defout and v_reach & ~v_defout:
                         print 'KILL[%d][%s]' % (k, v)
-                        self.print_set(irb.cur_kill[k][v])
-                    if irb.defout[k][v]:
+                        self.print_set(reach.defs.to_objects(v_reach &
+                                                             ~v_defout))
+                    if v_defout:
                         print 'DEFOUT[%d][%s]' % (k, v)
-                        self.print_set(irb.defout[k][v])
-
-    def compute_reach_block(self, irb):
-        """Variable influence computation for a single block
-        @irb: irbloc instance
-        PRE: init_reach()
-        """
-
-        reach_block = {key: value.copy()
-                      for key, value in irb.cur_reach[0].iteritems()}
-
-        # Compute reach from predecessors
-        for n_pred in self.g.predecessors(irb.label):
-            p_block = self.blocs[n_pred]
-
-            # Handle each register definition
-            for c_reg in self.ira_regs_ids():
-                # REACH(n) = U[p in pred] DEFOUT(p) U REACH(p)\KILL(p)
-                pred_through = p_block.defout[-1][c_reg].union(
-                    p_block.cur_reach[-1][c_reg].difference(
-                        p_block.cur_kill[-1][c_reg]))
-                reach_block[c_reg].update(pred_through)
-
-        # If a predecessor has changed
-        if reach_block != irb.cur_reach[0]:
-            irb.cur_reach[0] = reach_block
-            for c_reg in self.ira_regs_ids():
-                if irb.defout[0][c_reg]:
-                    # KILL(n) = DEFOUT(n) ? REACH(n)\DEFOUT(n) : EMPTY
-                    irb.cur_kill[0][c_reg].update(
-                        reach_block[c_reg].difference(irb.defout[0][c_reg]))
-
-        # Compute reach and kill for block's instructions
-        for i in xrange(1, len(irb.irs)):
-            for c_reg in self.ira_regs_ids():
-                # REACH(n) = U[p in pred] DEFOUT(p) U REACH(p)\KILL(p)
-                pred_through = irb.defout[i - 1][c_reg].union(
-                    irb.cur_reach[i - 1][c_reg].difference(
-                        irb.cur_kill[i - 1][c_reg]))
-                irb.cur_reach[i][c_reg].update(pred_through)
-                if irb.defout[i][c_reg]:
-                    # KILL(n) = DEFOUT(n) ? REACH(n)\DEFOUT(n) : EMPTY
-                    irb.cur_kill[i][c_reg].update(
-                        irb.cur_reach[i][c_reg].difference(
-                            irb.defout[i][c_reg]))
-
-    def _test_kill_reach_fix(self):
-        """Return True iff a fixed point has been reached during reach
-        analysis"""
-
-        fixed = True
-        for node in self.g.nodes():
-            if node in self.blocs:
-                irb = self.blocs[node]
-                if (irb.cur_reach != irb.prev_reach or
-                    irb.cur_kill != irb.prev_kill):
-                    fixed = False
-                    irb.prev_reach = irb.cur_reach[:]
-                    irb.prev_kill = irb.cur_kill[:]
-        return fixed
+                        self.print_set(reach.defs.to_objects(v_defout))
 
     def compute_reach(self):
         """
-        Compute reach, defout and kill sets until a fixed point is reached.
+        Compute the definitions of registers reaching each irbloc line, in
+        'reaching_defs' (ReachingDefinitions instance)
 
         Source : Kennedy, K. (1979). A survey of data flow analysis techniques.
         IBM Thomas J. Watson Research Division, page 43
 
         PRE: gen_graph()
         """
-        fixed_point = False
         log.debug('iteration...')
-        while not fixed_point:
-            for node in self.g.nodes():
-                if node in self.blocs:
-                    self.compute_reach_block(self.blocs[node])
-            fixed_point = self._test_kill_reach_fix()
+        self.reaching_defs = ReachingDefinitions(self, self.ira_regs_ids())
+        self.reaching_defs.compute()
+        return self.reaching_defs
+
+    def compute_liveness(self):
+        """Return the registers liveness in each irbloc line (Liveness
+        instance)
+        PRE: gen_graph()
+        """
+        liveness = Liveness(self, self.ira_regs_ids())
+        liveness.compute()
+        return liveness
 
-    def dead_simp(self):
+    def compute_strong_liveness(self):
+        """Return the strongly live registers in each irbloc line
+        (StrongLiveness instance)
+        PRE: gen_graph()
+        """
+        liveness = StrongLiveness(self, self.ira_regs_ids())
+        liveness.compute()
+        return liveness
+
+    def remove_dead_exprs(self, liveness):
+        """Remove the dead affectations of the irblocs modified since the last
+        call (see StrongLiveness.modified)
+        @liveness: StrongLiveness instance, up to date
+        Return the set of labels of the modified irblocs
+        """
+        modified = set()
+        for label in liveness.modified:
+            if label not in self.blocs:
+                continue
+            dead = liveness.dead_exprs(label)
+            if not dead:
+                continue
+            irs = self.blocs[label].irs
+            for line_nb, expr in dead:
+                irs[line_nb].remove(expr)
+            liveness.remove_exprs(label, dead)
+            modified.add(label)
+        liveness.modified.clear()
+        return modified
+
+    def dead_simp(self, liveness=None, labels=None):
         """
         This function is used to analyse relation of a * complete function *
         This means the blocks under study represent a solid full function graph.
 
-        Source : Kennedy, K. (1979). A survey of data flow analysis techniques.
-        IBM Thomas J. Watson Research Division, page 43
+        Dead affectations are found with a strong liveness analysis, then
+        expressions are simplified. To alternate dead code removal and other
+        transformations, the returned analysis can be given to the next call,
+        with the labels of the irblocs modified in between: only the irblocs
+        depending on them are then processed.
+
+        @liveness: (optional) StrongLiveness returned by a previous call
+        @labels: (optional) labels of the irblocs modified since this call,
+        without changing the graph edges
+        Return the StrongLiveness instance of the resulting irblocs
 
         PRE: gen_graph()
         """
-        # Update r/w variables for all irblocs
-        self.get_rw(self.ira_regs_ids())
-        # Liveness step
-        self.compute_reach()
-        self.remove_dead_code()
+        if liveness is None:
+            liveness = self.compute_strong_liveness()
+            labels = self.blocs.keys()
+        else:
+            labels = labels or []
+            liveness.update_blocs(labels)
+            labels = [label for label in labels if label in self.blocs]
+        labels = self.remove_dead_exprs(liveness).union(labels)
         # Simplify expressions
-        self.simplify_blocs()
+        liveness.update_blocs(self.simplify_blocs(labels))
+        return liveness
 
     def gen_equations(self):
         for irb in self.blocs.values():
@@ -20,11 +20,18 @@
 #
 
 
+from bisect import bisect_left, bisect_right, insort
+from cStringIO import StringIO
+import cPickle as pickle
+from itertools import izip
+import multiprocessing
+
 import miasm2.expression.expression as m2_expr
 from miasm2.expression.expression_helper import get_missing_interval
 from miasm2.core import asmbloc
 from miasm2.expression.simplifications import expr_simp
 from miasm2.core.asmbloc import asm_symbol_pool
+from miasm2.core.utils import BoundedDict
 
 
 class irbloc(object):
@@ -35,8 +42,29 @@ class irbloc(object):
         self.irs = irs
         self.lines = lines
         self.except_automod = True
+
+    def _get_irs(self):
+        return self._irs
+
+    def _set_irs(self, irs):
+        self._irs = irs
         self._dst = None
         self._dst_linenb = None
+        # line number -> (line ExprAff, read elements, written elements)
+        self._lines_rw = {}
+
+    irs = property(_get_irs, _set_irs)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lines_rw']
+        state['irs'] = state.pop('_irs')
+        return state
+
+    def __setstate__(self, state):
+        irs = state.pop('irs')
+        self.__dict__.update(state)
+        self.irs = irs
 
 
     def _get_dst(self):
@@ -73,40 +101,43 @@ class irbloc(object):
         """Line number of the IRDst setting statement in the current irs"""
         return self._dst_linenb
 
+    def get_line_rw(self, line_nb):
+        """Return the (read, written) frozensets of the elements of the line
+        @line_nb (memory reads included). They are computed once, and again
+        only if the line content changes"""
+        line = tuple(self._irs[line_nb])
+        cached = self._lines_rw.get(line_nb)
+        if cached is not None and cached[0] == line:
+            return cached[1:]
+        read, written = set(), set()
+        for expr in line:
+            read.update(expr.get_r(mem_read=True))
+            written.update(expr.get_w())
+        read, written = frozenset(read), frozenset(written)
+        self._lines_rw[line_nb] = (line, read, written)
+        return read, written
+
     def get_rw(self, regs_ids):
         """
-        Computes the variables read and written by each instructions
-        Initialize attributes needed for in/out and reach computation.
+        Computes the variables read and written by each instructions, and
+        their definitions (see get_line_rw)
         @regs_ids : ids of registers used in IR
         """
         self.r = []
         self.w = []
-        self.cur_reach = [{reg: set() for reg in regs_ids}
-                          for _ in xrange(len(self.irs))]
-        self.prev_reach = [{reg: set() for reg in regs_ids}
-                           for _ in xrange(len(self.irs))]
-        self.cur_kill = [{reg: set() for reg in regs_ids}
-                         for _ in xrange(len(self.irs))]
-        self.prev_kill = [{reg: set() for reg in regs_ids}
-                          for _ in xrange(len(self.irs))]
         self.defout = [{reg: set() for reg in regs_ids}
                        for _ in xrange(len(self.irs))]
 
         for k, ir in enumerate(self.irs):
-            r, w = set(), set()
+            read, written = self.get_line_rw(k)
             for i in ir:
-                r.update(x for x in i.get_r(True)
-                         if isinstance(x, m2_expr.ExprId))
-                w.update(x for x in i.get_w()
-                         if isinstance(x, m2_expr.ExprId))
-                if isinstance(i.dst, m2_expr.ExprMem):
-                    r.update(x for x in i.dst.arg.get_r(True)
-                             if isinstance(x, m2_expr.ExprId))
                 self.defout[k].update((x, {(self.label, k, i)})
                                       for x in i.get_w()
                                       if isinstance(x, m2_expr.ExprId))
-            self.r.append(r)
-            self.w.append(w)
+            self.r.append(set(x for x in read
+                              if isinstance(x, m2_expr.ExprId)))
+            self.w.append(set(x for x in written
+                              if isinstance(x, m2_expr.ExprId)))
 
     def __str__(self):
         o = []
@@ -119,20 +150,548 @@ class irbloc(object):
         return "\n".join(o)
 
 
+class irblocs_dict(dict):
+    """label -> irbloc dictionnary, indexing the address ranges of the
+    irblocs instructions.
+
+    The instructions of an irbloc are indexed when it is added: its lines
+    must be set beforehand (as in ir.add_bloc). If the lines of an irbloc
+    are changed afterwards, it must be set again (blocs[label] = irb) to
+    update the index.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(irblocs_dict, self).__init__()
+        # Sorted instruction offsets
+        self._starts = []
+        # instruction offset -> {label: instruction end}
+        self._ranges = {}
+        # label -> indexed instruction offsets
+        self._label_starts = {}
+        # Maximum indexed instruction length
+        self._max_len = 0
+        self.update(*args, **kwargs)
+
+    def __reduce__(self):
+        # The index is rebuilt from the items, as dict items are restored
+        # by the unpickler before the instance attributes
+        return (self.__class__, (dict(self),))
+
+    def __copy__(self):
+        return self.__class__(self)
+
+    def _index(self, label, irb):
+        starts = set()
+        for line in irb.lines:
+            if line is None or line.offset is None:
+                continue
+            start, stop = line.offset, line.offset + line.l
+            ranges = self._ranges.get(start)
+            if ranges is None:
+                ranges = self._ranges[start] = {}
+                insort(self._starts, start)
+            ranges[label] = max(ranges.get(label, stop), stop)
+            self._max_len = max(self._max_len, stop - start)
+            starts.add(start)
+        self._label_starts[label] = starts
+
+    def _unindex(self, label):
+        for start in self._label_starts.pop(label, []):
+            ranges = self._ranges[start]
+            del ranges[label]
+            if not ranges:
+                del self._ranges[start]
+                del self._starts[bisect_left(self._starts, start)]
+
+    def __setitem__(self, label, irb):
+        if label in self:
+            self._unindex(label)
+        super(irblocs_dict, self).__setitem__(label, irb)
+        self._index(label, irb)
+
+    def __delitem__(self, label):
+        super(irblocs_dict, self).__delitem__(label)
+        self._unindex(label)
+
+    def pop(self, label, *args):
+        if label in self:
+            self._unindex(label)
+        return super(irblocs_dict, self).pop(label, *args)
+
+    def popitem(self):
+        label, irb = super(irblocs_dict, self).popitem()
+        self._unindex(label)
+        return label, irb
+
+    def setdefault(self, label, default=None):
+        if label not in self:
+            self[label] = default
+        return self[label]
+
+    def update(self, *args, **kwargs):
+        for label, irb in dict(*args, **kwargs).iteritems():
+            self[label] = irb
+
+    def clear(self):
+        super(irblocs_dict, self).clear()
+        self._starts = []
+        self._ranges = {}
+        self._label_starts = {}
+        self._max_len = 0
+
+    def getby_range(self, start, stop):
+        """Return the set of irblocs with an instruction overlapping
+        [@start, @stop["""
+        out = set()
+        starts = self._starts
+        for i in xrange(bisect_right(starts, start - self._max_len),
+                        bisect_left(starts, stop)):
+            for label, instr_stop in self._ranges[starts[i]].iteritems():
+                if instr_stop > start:
+                    out.add(self[label])
+        return out
+
+
+class lift_template(object):
+    """Snapshot of the IR of an instruction lifted at a given offset, reused
+    to lift the instructions of same key (see ir.get_lift_cache_key) at
+    other offsets.
+
+    Offset dependent parts of the IR are found by comparing the IR of two
+    liftings at different offsets: integers and labels shifted by the offsets
+    difference are relocated, labels generated during the lifting are
+    generated again. Until this comparison is done, the template is only
+    reused at its own offset.
+
+    As the offsets difference may not explain all the offsets (destinations
+    aligned by the semantic, as Thumb BLX), the relocated labels are also
+    checked against the label arguments of each instruction it is
+    instanciated for. The changes made by the lifting to the instruction
+    arguments are replayed on the instructions it is instanciated for.
+    """
+
+    def __init__(self, offset, instr_ir, extra_ir, gen_labels,
+                 except_on_instr, arg_labels, args_lifted=None):
+        self.offset = offset
+        self.instr_ir = tuple(instr_ir)
+        self.extra_ir = tuple((irb.label, tuple(tuple(irs) for irs in irb.irs))
+                              for irb in extra_ir or [])
+        self.gen_labels = tuple(gen_labels)
+        self.except_on_instr = except_on_instr
+        # Label of each instruction argument (see get_arg_labels)
+        self.arg_labels = arg_labels
+        # (arguments before, arguments after) the lifting, if it modified
+        # them, else None
+        self.args_lifted = args_lifted
+        # (argument index, label, kind) of the labels of the instruction
+        # arguments used by the IR, None until the template is validated
+        self.arg_kinds = None
+        # Relocated ExprInt and labels, None until the template is validated
+        self.reloc_ints = None
+        self.reloc_labels = None
+        # ExprId of relocated or generated labels
+        self.reloc_ids = None
+        # ExprId of generated labels
+        self.gen_ids = []
+        # For each ExprAff, True if it must be relocated
+        self.moved = None
+        if self.gen_labels:
+            kinds, ids, self.moved = self._match(0, self.instr_ir,
+                                                 self.extra_ir,
+                                                 self.gen_labels)
+            self.gen_ids = [expr for expr in ids if kinds[expr.name] == "gen"]
+
+    def _match_label(self, label_a, label_b, delta, gen_labels, kinds):
+        """Check that @label_a of the template corresponds to @label_b of a
+        lifting shifted by @delta, generating @gen_labels; record the kind of
+        @label_a in @kinds. Return False on mismatch"""
+        if label_a in self.gen_labels:
+            index = self.gen_labels.index(label_a)
+            kind = "gen"
+            if gen_labels[index] is not label_b:
+                return False
+        elif label_a is label_b:
+            kind = "const"
+        elif (label_a.offset is not None and label_b.offset is not None and
+              label_b.offset == label_a.offset + delta):
+            kind = "reloc"
+        else:
+            return False
+        return kinds.setdefault(label_a, kind) == kind
+
+    def _match_expr(self, expr_a, expr_b, delta, gen_labels, kinds, ids):
+        """Check that @expr_a of the template corresponds to @expr_b of a
+        lifting shifted by @delta. Return None on mismatch, else True if
+        @expr_a contains integers or labels to relocate"""
+        moved = False
+        todo = [(expr_a, expr_b)]
+        while todo:
+            expr_a, expr_b = todo.pop()
+            if expr_a.__class__ is not expr_b.__class__ or \
+                    expr_a.size != expr_b.size:
+                return None
+            if isinstance(expr_a, m2_expr.ExprInt):
+                value_a, value_b = int(expr_a.arg), int(expr_b.arg)
+                # Equal integers are constants: offset dependent integers
+                # have the PC size, and cannot be equal for a non null delta
+                mask = m2_expr.size2mask(expr_a.size)
+                if value_a == value_b:
+                    kind = "const"
+                elif (value_a + delta) & mask == value_b:
+                    kind = "reloc"
+                    moved = True
+                else:
+                    return None
+                if kinds.setdefault(expr_a, kind) != kind:
+                    return None
+            elif isinstance(expr_a, m2_expr.ExprId):
+                if isinstance(expr_a.name, asmbloc.asm_label) and \
+                        isinstance(expr_b.name, asmbloc.asm_label):
+                    if not self._match_label(expr_a.name, expr_b.name, delta,
+                                             gen_labels, kinds):
+                        return None
+                    ids.add(expr_a)
+                    moved |= kinds[expr_a.name] != "const"
+                elif expr_a != expr_b:
+                    return None
+            elif isinstance(expr_a, m2_expr.ExprAff):
+                todo += [(expr_a.dst, expr_b.dst), (expr_a.src, expr_b.src)]
+            elif isinstance(expr_a, m2_expr.ExprMem):
+                todo.append((expr_a.arg, expr_b.arg))
+            elif isinstance(expr_a, m2_expr.ExprOp):
+                if expr_a.op != expr_b.op or \
+                        len(expr_a.args) != len(expr_b.args):
+                    return None
+                todo += zip(expr_a.args, expr_b.args)
+            elif isinstance(expr_a, m2_expr.ExprSlice):
+                if expr_a.start != expr_b.start or expr_a.stop != expr_b.stop:
+                    return None
+                todo.append((expr_a.arg, expr_b.arg))
+            elif isinstance(expr_a, m2_expr.ExprCompose):
+                if [arg[1:] for arg in expr_a.args] != \
+                        [arg[1:] for arg in expr_b.args]:
+                    return None
+                todo += [(arg_a[0], arg_b[0]) for arg_a, arg_b
+                         in zip(expr_a.args, expr_b.args)]
+            elif isinstance(expr_a, m2_expr.ExprCond):
+                todo += [(expr_a.cond, expr_b.cond),
+                         (expr_a.src1, expr_b.src1),
+                         (expr_a.src2, expr_b.src2)]
+            elif expr_a != expr_b:
+                return None
+        return moved
+
+    def _match(self, delta, instr_ir, extra_ir, gen_labels):
+        """Match the template to the lifting (@instr_ir, @extra_ir) of the
+        same instruction shifted by @delta, which generated @gen_labels.
+        Return the kind ("const", "reloc" or "gen") of the template integers
+        and labels, the template label ExprIds and the list of moved template
+        ExprAff, or None if the IR differences are not explained by @delta"""
+        if len(gen_labels) != len(self.gen_labels) or \
+                len(instr_ir) != len(self.instr_ir) or \
+                len(extra_ir) != len(self.extra_ir):
+            return None
+        kinds = {}
+        ids = set()
+        pairs = zip(self.instr_ir, instr_ir)
+        for (label, irs), irs_b in zip(self.extra_ir, extra_ir):
+            label_b, irs_b = irs_b
+            if len(irs) != len(irs_b) or \
+                    not self._match_label(label, label_b, delta, gen_labels,
+                                          kinds):
+                return None
+            for exprs_a, exprs_b in zip(irs, irs_b):
+                if len(exprs_a) != len(exprs_b):
+                    return None
+                pairs += zip(exprs_a, exprs_b)
+        moved = []
+        for expr_a, expr_b in pairs:
+            expr_moved = self._match_expr(expr_a, expr_b, delta, gen_labels,
+                                          kinds, ids)
+            if expr_moved is None:
+                return None
+            moved.append(expr_moved)
+        return kinds, ids, moved
+
+    def validate(self, offset, instr_ir, extra_ir, gen_labels):
+        """Compare the template to the lifting (@instr_ir, @extra_ir) of the
+        same instruction at another @offset, which generated @gen_labels, and
+        compute the template relocations. Return False if the IR differences
+        are not explained by the offsets difference"""
+        delta = offset - self.offset
+        extra_ir = [(irb.label, irb.irs) for irb in extra_ir or []]
+        match = self._match(delta, instr_ir, extra_ir, gen_labels)
+        if delta == 0 or match is None:
+            return False
+        kinds, ids, self.moved = match
+        self.reloc_ints = [expr for expr, kind in kinds.iteritems()
+                           if kind == "reloc" and
+                           isinstance(expr, m2_expr.ExprInt)]
+        self.reloc_labels = [label for label, kind in kinds.iteritems()
+                             if kind == "reloc" and
+                             isinstance(label, asmbloc.asm_label)]
+        self.reloc_ids = [expr for expr in ids if kinds[expr.name] != "const"]
+        self.arg_kinds = [(index, label, kinds[label])
+                          for index, label in enumerate(self.arg_labels)
+                          if label in kinds]
+        return True
+
+    @staticmethod
+    def get_arg_labels(instr):
+        """Return the label of each argument of @instr (None for arguments
+        which are not labels)"""
+        return tuple(arg.name if isinstance(arg, m2_expr.ExprId) and
+                     isinstance(arg.name, asmbloc.asm_label) else None
+                     for arg in instr.args)
+
+    def _match_instr(self, instr, delta):
+        """Check that the template relocated by @delta describes @instr:
+        arguments modified by the lifting and relocated labels must be the
+        same"""
+        if self.args_lifted is not None and \
+                tuple(instr.args) != self.args_lifted[0]:
+            return False
+        if self.arg_kinds is None:
+            return self.get_arg_labels(instr) == self.arg_labels
+        arg_labels = self.get_arg_labels(instr)
+        if len(arg_labels) != len(self.arg_labels):
+            return False
+        for index, label, kind in self.arg_kinds:
+            label_b = arg_labels[index]
+            if label_b is None:
+                return False
+            if kind == "const" and label_b is not label:
+                return False
+            if kind == "reloc" and label_b.offset != label.offset + delta:
+                return False
+        return True
+
+    def instanciate(self, ir_arch, instr):
+        """Return the (instr_ir, extra_ir) of the template instruction lifted
+        by @ir_arch for @instr, or None if it cannot be relocated there.
+        Arguments of @instr are modified as the lifting would"""
+        delta = instr.offset - self.offset
+        if not self._match_instr(instr, delta):
+            return None
+        if self.args_lifted is not None:
+            instr.args[:] = self.args_lifted[1]
+        if delta:
+            # Lifters may or may not wrap label offsets around the address
+            # space: do not relocate labels outside of it
+            max_offset = 1 << ir_arch.pc.size
+            for label in self.reloc_labels:
+                if not 0 <= label.offset + delta < max_offset:
+                    return None
+        labels = {}
+        for label in self.gen_labels:
+            labels[label] = ir_arch.gen_label()
+        replace = {}
+        if delta:
+            for label in self.reloc_labels:
+                labels[label] = ir_arch.symbol_pool.getby_offset_create(
+                    label.offset + delta)
+            for expr in self.reloc_ints:
+                replace[expr] = m2_expr.ExprInt_fromsize(
+                    expr.size, int(expr.arg) + delta)
+            for expr in self.reloc_ids:
+                replace[expr] = m2_expr.ExprId(labels[expr.name], expr.size)
+        else:
+            for expr in self.gen_ids:
+                replace[expr] = m2_expr.ExprId(labels[expr.name], expr.size)
+
+        if not replace:
+            return (list(self.instr_ir),
+                    [irbloc(labels.get(label, label),
+                            [list(exprs) for exprs in irs])
+                     for label, irs in self.extra_ir])
+
+        moved = iter(self.moved)
+        instr_ir = [expr.replace_expr(replace) if moved.next() else expr
+                    for expr in self.instr_ir]
+        extra_ir = []
+        for label, irs in self.extra_ir:
+            extra_ir.append(irbloc(labels.get(label, label),
+                                   [[expr.replace_expr(replace)
+                                     if moved.next() else expr
+                                     for expr in exprs]
+                                    for exprs in irs]))
+        return instr_ir, extra_ir
+
+
+# Per process state of ir.add_blocs workers
+_lift_worker_state = {}
+
+
+def _lift_worker_init(ir_arch, blocs, gen_pc_updt):
+    """Initialize an ir.add_blocs worker process
+    @ir_arch: ir instance (inherited from the parent process)
+    @blocs: list of asm_bloc to lift (inherited from the parent process)
+    @gen_pc_updt: add_bloc argument
+    """
+    ir_arch.db = None
+    _lift_worker_state['ir_arch'] = ir_arch
+    _lift_worker_state['blocs'] = blocs
+    _lift_worker_state['gen_pc_updt'] = gen_pc_updt
+
+
+def _lift_worker(indexes):
+    """Lift the blocs of numbers @indexes in the worker process
+    Return a tuple:
+     - lifting cache statistics (hits, misses) of the job
+     - (name, offset) of the labels created by the lifting, in creation order
+     - except_on_instr of each line of each bloc
+     - pickled list of (irblocs, extra irblocs) of each bloc
+    Labels are pickled by name and offset, and the blocs lines by index, to
+    be linked back to the objects of the parent process (see
+    ir._merge_lifted). The blocs of a job are pickled at once, so that the
+    expressions they share are only serialized once.
+    """
+    ir_arch = _lift_worker_state['ir_arch']
+    blocs = _lift_worker_state['blocs']
+    symbol_pool = ir_arch.symbol_pool
+    hits, misses = ir_arch.lift_cache_hits, ir_arch.lift_cache_misses
+    labels_nb = len(symbol_pool.items)
+    lifted = []
+    lines = {}
+    for index in indexes:
+        bloc = blocs[index]
+        ir_arch.blocs = irblocs_dict()
+        ir_blocs_all = ir_arch.add_bloc(bloc,
+                                        _lift_worker_state['gen_pc_updt'])
+        done = set(irb.label for irb in ir_blocs_all)
+        extra = [irb for label, irb in ir_arch.blocs.iteritems()
+                 if label not in done]
+        lifted.append((ir_blocs_all, extra))
+        for i, line in enumerate(bloc.lines):
+            lines[id(line)] = (index, i)
+
+    def persistent_id(item):
+        if isinstance(item, asmbloc.asm_label):
+            return ("label", item.name, item.offset)
+        if id(item) in lines:
+            return ("line",) + lines[id(item)]
+        return None
+    blob = StringIO()
+    pickler = pickle.Pickler(blob, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(lifted)
+
+    created = [(label.name, label.offset)
+               for label in symbol_pool.items[labels_nb:]]
+    excepts = [[getattr(line.additional_info, "except_on_instr", None)
+                for line in blocs[index].lines]
+               for index in indexes]
+    return (ir_arch.lift_cache_hits - hits,
+            ir_arch.lift_cache_misses - misses,
+            created, excepts, blob.getvalue())
+
+
 class ir(object):
 
+    # Maximum number of instructions kept as lifting templates, to reuse the
+    # IR of instructions already lifted at other offsets (0 to disable, see
+    # instr2ir)
+    lift_cache_size = 10000
+
+    # Maximum number of expressions kept with their registers fixed for a
+    # mode, per mode (0 to disable, see expr_fix_regs_for_mode)
+    fix_regs_cache_size = 10000
+    _fix_regs_cache = None
+
     def __init__(self, arch, attrib, symbol_pool=None):
         if symbol_pool is None:
             symbol_pool = asm_symbol_pool()
         self.symbol_pool = symbol_pool
-        self.blocs = {}
+        self.blocs = irblocs_dict()
         self.pc = arch.getpc(attrib)
         self.sp = arch.getsp(attrib)
         self.arch = arch
         self.attrib = attrib
+        # Analysis database (see miasm2.analysis.database)
+        self.db = None
+        self._lift_cache = None
+        # Labels generated by the current lifting (see instr2ir)
+        self._lifted_labels = None
+        # Lifting cache statistics
+        self.lift_cache_hits = 0
+        self.lift_cache_misses = 0
+
+    def get_lift_cache_key(self, instr):
+        """Return the key of @instr in the lifting cache, or None if it must
+        not be cached. Instructions of same key must have the same semantic,
+        up to their offset"""
+        if getattr(instr, "offset", None) is None:
+            return None
+        instr_bytes = getattr(instr, "b", None)
+        if instr_bytes is None:
+            return None
+        return (instr_bytes, instr.mode, instr.name,
+                tuple(arg.__class__ for arg in instr.args))
+
+    def get_lift_cache(self):
+        """Return the key -> lift_template cache of the instance, or None if
+        it is disabled"""
+        if not self.lift_cache_size:
+            return None
+        if self._lift_cache is None:
+            self._lift_cache = BoundedDict(self.lift_cache_size)
+        return self._lift_cache
+
+    def get_fix_regs_cache(self, mode, kind="expr"):
+        """Return the expression -> expression with fixed registers cache of
+        the instance for @mode, or None if it is disabled
+        @kind: "expr" for expressions, "line" for irbloc lines (ExprAff
+        fixed with the line semantic, ie. zero extension of destinations):
+        they have distinct caches, as a same ExprAff is fixed differently"""
+        if not self.fix_regs_cache_size:
+            return None
+        if self._fix_regs_cache is None:
+            self._fix_regs_cache = {}
+        cache = self._fix_regs_cache.get((mode, kind))
+        if cache is None:
+            cache = BoundedDict(self.fix_regs_cache_size)
+            self._fix_regs_cache[(mode, kind)] = cache
+        return cache
 
     def instr2ir(self, l):
-        ir_bloc_cur, ir_blocs_extra = self.get_ir(l)
+        cache = self.get_lift_cache()
+        key = None if cache is None else self.get_lift_cache_key(l)
+        if key is None:
+            return self.get_ir(l)
+
+        template = cache.get(key)
+        if template is not None and (template.offset == l.offset or
+                                     template.reloc_ints is not None):
+            lifted = template.instanciate(self, l)
+            if lifted is not None:
+                self.lift_cache_hits += 1
+                if template.except_on_instr is not None:
+                    l.additional_info.except_on_instr = \
+                        template.except_on_instr
+                return lifted
+
+        self.lift_cache_misses += 1
+        self._lifted_labels = []
+        args = tuple(l.args)
+        try:
+            ir_bloc_cur, ir_blocs_extra = self.get_ir(l)
+            gen_labels = self._lifted_labels
+        finally:
+            self._lifted_labels = None
+        if key not in cache:
+            args_lifted = tuple(l.args)
+            cache[key] = lift_template(l.offset, ir_bloc_cur, ir_blocs_extra,
+                                       gen_labels,
+                                       getattr(l.additional_info,
+                                               "except_on_instr", None),
+                                       lift_template.get_arg_labels(l),
+                                       None if args_lifted == args
+                                       else (args, args_lifted))
+        elif template is not None and \
+                not template.validate(l.offset, ir_bloc_cur, ir_blocs_extra,
+                                      gen_labels):
+            # Offset dependent parts of the IR cannot be relocated
+            cache[key] = None
         return ir_bloc_cur, ir_blocs_extra
 
     def get_label(self, ad):
@@ -177,10 +736,15 @@ class ir(object):
         ]
         """
 
+        # Fast path: at most one affectation per destination
+        if len(affect_list) <= 1 or \
+                len(set(expr.dst for expr in affect_list)) == len(affect_list):
+            return
+
         # Extract side effect
         effect = {}
         for expr in affect_list:
-            effect[expr.dst] = effect.get(expr.dst, []) + [expr]
+            effect.setdefault(expr.dst, []).append(expr)
 
         # Find candidates
         for dst, expr_list in effect.items():
@@ -219,13 +783,25 @@ class ir(object):
             affect_list.append(m2_expr.ExprAff(dst, final_dst))
 
 
+    def _get_blocs(self):
+        return self._blocs
+
+    def _set_blocs(self, blocs):
+        if not isinstance(blocs, irblocs_dict):
+            blocs = irblocs_dict(blocs)
+        self._blocs = blocs
+
+    # label -> irbloc, indexed by instructions addresses (see irblocs_dict)
+    blocs = property(_get_blocs, _set_blocs)
+
     def getby_offset(self, offset):
-        out = set()
-        for irb in self.blocs.values():
-            for l in irb.lines:
-                if l.offset <= offset < l.offset + l.l:
-                    out.add(irb)
-        return out
+        """Return the set of irblocs with an instruction containing @offset"""
+        return self.blocs.getby_range(offset, offset + 1)
+
+    def getby_range(self, start, stop):
+        """Return the set of irblocs with an instruction overlapping
+        [@start, @stop["""
+        return self.blocs.getby_range(start, stop)
 
     def gen_pc_update(self, c, l):
         c.irs.append([m2_expr.ExprAff(self.pc, m2_expr.ExprInt_from(self.pc,
@@ -233,6 +809,14 @@ class ir(object):
         c.lines.append(l)
 
     def add_bloc(self, bloc, gen_pc_updt = False):
+        if self.db is not None:
+            stored = self.db.get_irblocs(self, bloc, gen_pc_updt)
+            if stored is not None:
+                ir_blocs_all, ir_blocs_extra = stored
+                for irb in ir_blocs_all + ir_blocs_extra:
+                    self.blocs[irb.label] = irb
+                return ir_blocs_all
+
         c = None
         ir_blocs_all = []
         for l in bloc.lines:
@@ -255,8 +839,109 @@ class ir(object):
                 ir_blocs_all += ir_blocs_extra
                 c = None
         self.post_add_bloc(bloc, ir_blocs_all)
+        if self.db is not None:
+            self.db.add_irblocs(self, bloc, ir_blocs_all, gen_pc_updt)
         return ir_blocs_all
 
+    def add_blocs(self, blocs, gen_pc_updt=False, processes=None,
+                  chunksize=16):
+        """Lift each asm_bloc of @blocs, in a pool of @processes worker
+        processes, and return the list of the irblocs lifted from each of them
+
+        The semantic lifting (including post_add_bloc) is done by the workers,
+        each one on its own copy of the instance, by chunks of @chunksize
+        neighbouring blocs. The resulting irblocs are merged in the current
+        process, in @blocs order: their labels are linked back to the
+        symbol_pool of the instance, and the labels created during the
+        lifting are created again here, in the same order. The irblocs and
+        label names are then the same as calling add_bloc on each bloc.
+
+        Workers are forked from the current process: the instance, its
+        lifting cache and @blocs are inherited, not pickled.
+
+        If an analysis database is set, the stored irblocs are retrieved in
+        the current process, and only the unknown blocs are lifted.
+
+        @blocs: list of asm_bloc
+        @gen_pc_updt: add_bloc argument
+        @processes: (optional) number of workers, default to the CPU count
+        @chunksize: (optional) number of blocs per worker job
+        """
+        blocs = list(blocs)
+        if processes == 1 or len(blocs) <= 1:
+            return [self.add_bloc(bloc, gen_pc_updt) for bloc in blocs]
+
+        # index -> irblocs
+        lifted = {}
+        if self.db is not None:
+            for index, bloc in enumerate(blocs):
+                stored = self.db.get_irblocs(self, bloc, gen_pc_updt)
+                if stored is not None:
+                    ir_blocs_all, ir_blocs_extra = stored
+                    for irb in ir_blocs_all + ir_blocs_extra:
+                        self.blocs[irb.label] = irb
+                    lifted[index] = ir_blocs_all
+        indexes = [index for index in xrange(len(blocs))
+                   if index not in lifted]
+        chunks = [indexes[i:i + chunksize]
+                  for i in xrange(0, len(indexes), chunksize)]
+        if not chunks:
+            return [lifted[index] for index in xrange(len(blocs))]
+
+        pool = multiprocessing.Pool(processes, _lift_worker_init,
+                                    (self, blocs, gen_pc_updt))
+        try:
+            # Chunks are merged as soon as they are lifted, while the workers
+            # go on with the next ones
+            for chunk, result in izip(chunks,
+                                      pool.imap(_lift_worker, chunks)):
+                hits, misses = result[:2]
+                self.lift_cache_hits += hits
+                self.lift_cache_misses += misses
+                merged = self._merge_lifted(blocs, chunk, *result[2:])
+                for index, (ir_blocs_all, ir_blocs_extra) in zip(chunk,
+                                                                  merged):
+                    for irb in ir_blocs_all + ir_blocs_extra:
+                        self.blocs[irb.label] = irb
+                    if self.db is not None:
+                        self.db.add_irblocs(self, blocs[index], ir_blocs_all,
+                                            gen_pc_updt)
+                    lifted[index] = ir_blocs_all
+        finally:
+            pool.close()
+            pool.join()
+        return [lifted[index] for index in xrange(len(blocs))]
+
+    def _merge_lifted(self, blocs, indexes, created, excepts, blob):
+        """Unpickle the irblocs lifted by an add_blocs worker from the blocs
+        of numbers @indexes (see _lift_worker). Return the list of (irblocs,
+        extra irblocs) of each bloc"""
+        # Create the labels in the worker order, to name them as add_bloc
+        labels = {}
+        for name, offset in created:
+            if offset is None:
+                labels[name] = self.gen_label()
+            else:
+                self.symbol_pool.getby_offset_create(offset)
+
+        def persistent_load(pid):
+            if pid[0] == "line":
+                return blocs[pid[1]].lines[pid[2]]
+            _, name, offset = pid
+            if offset is not None:
+                return self.symbol_pool.getby_offset_create(offset)
+            if name in labels:
+                return labels[name]
+            return self.symbol_pool.getby_name_create(name)
+        unpickler = pickle.Unpickler(StringIO(blob))
+        unpickler.persistent_load = persistent_load
+        for index, bloc_excepts in zip(indexes, excepts):
+            for line, except_on_instr in zip(blocs[index].lines,
+                                             bloc_excepts):
+                if except_on_instr is not None:
+                    line.additional_info.except_on_instr = except_on_instr
+        return unpickler.load()
+
     def expr_fix_regs_for_mode(self, e, *args, **kwargs):
         return e
 
@@ -309,17 +994,31 @@ class ir(object):
     def gen_label(self):
         # TODO: fix hardcoded offset
         l = self.symbol_pool.gen_label()
+        if self._lifted_labels is not None:
+            self._lifted_labels.append(l)
         return l
 
     def get_next_label(self, instr):
         l = self.symbol_pool.getby_offset_create(instr.offset + instr.l)
         return l
 
-    def simplify_blocs(self):
-        for b in self.blocs.values():
+    def simplify_blocs(self, labels=None):
+        """Simplify the expressions of the irblocs
+        @labels: (optional) labels of the irblocs to simplify (default: all)
+        Return the set of labels of the modified irblocs
+        """
+        if labels is None:
+            labels = self.blocs.keys()
+        modified = set()
+        for label in labels:
+            b = self.blocs[label]
             for ir in b.irs:
                 for i, r in enumerate(ir):
-                    ir[i] = m2_expr.ExprAff(expr_simp(r.dst), expr_simp(r.src))
+                    dst, src = expr_simp(r.dst), expr_simp(r.src)
+                    if dst is not r.dst or src is not r.src:
+                        ir[i] = m2_expr.ExprAff(dst, src)
+                        modified.add(label)
+        return modified
 
     def replace_expr_in_ir(self, bloc, rep):
         for irs in bloc.irs:
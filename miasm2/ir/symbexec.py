@@ -85,7 +85,13 @@ class symbexec(object):
     def __init__(self, ir_arch, known_symbols,
                  func_read=None,
                  func_write=None,
-                 sb_expr_simp=expr_simp):
+                 sb_expr_simp=expr_simp,
+                 use_summaries=False):
+        """
+        @use_summaries: (optional) replace the effects of function calls by
+        the summary of the callee, if any (see
+        miasm2.analysis.summary.get_summary)
+        """
         self.symbols = symbols()
         for k, v in known_symbols.items():
             self.symbols[k] = v
@@ -93,6 +99,11 @@ class symbexec(object):
         self.func_write = func_write
         self.ir_arch = ir_arch
         self.expr_simp = sb_expr_simp
+        self.use_summaries = use_summaries
+        if use_summaries:
+            # Imported here: the summaries are built on top of symbexec
+            from miasm2.analysis.summary import apply_call_summary
+            self._apply_call_summary = apply_call_summary
 
     def find_mem_by_addr(self, e):
         if e in self.symbols.symbols_mem:
@@ -397,6 +408,11 @@ class symbexec(object):
         return pool_out.items()
 
     def eval_ir(self, ir):
+        if self.use_summaries:
+            ir = self._apply_call_summary(
+                self.ir_arch, ir,
+                lambda target: self.expr_simp(self.eval_expr(target, {}))
+            ) or ir
         mem_dst = []
         # src_dst = [(x.src, x.dst) for x in ir]
         src_dst = self.eval_ir_expr(ir)
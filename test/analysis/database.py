@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+from miasm2.arch.x86.disasm import dis_x86_32
+from miasm2.arch.x86.ira import ir_a_x86_32
+from miasm2.core import asmbloc
+from miasm2.expression.expression import ExprId
+from miasm2.core.bin_stream import bin_stream_str
+from miasm2.analysis.database import AnalysisDatabase
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+from asm_helpers import gen_binary
+
+
+ASM = '''
+main:
+    PUSH   EBP
+    MOV    EBP, ESP
+    CALL   func
+    MOV    ECX, 4
+loop:
+    DEC    ECX
+    JNZ    loop
+    POP    EBP
+    RET
+func:
+    MOV    EAX, 1
+    TEST   EAX, EAX
+    JZ     end
+    INC    EAX
+end:
+    ADD    EAX, 2
+    RET
+'''
+
+
+def blocs2str(blocs):
+    """Return a canonical string representation of @blocs"""
+    out = []
+    for bloc in blocs:
+        lines = [str(bloc.label)] + [str(line) for line in bloc.lines]
+        lines += sorted(str(cst) for cst in bloc.bto)
+        out.append("\n".join(lines))
+    return "\n".join(sorted(out))
+
+
+class CountingDis(dis_x86_32):
+    """Disassembler counting the decoded instructions"""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingDis, self).__init__(*args, **kwargs)
+        self.decoded = 0
+        self.dis_bloc_callback = self.count
+
+    def count(self, mnemo, attrib, pool_bin, cur_bloc, offsets_to_dis,
+              symbol_pool):
+        self.decoded += len(cur_bloc.lines)
+
+
+class TestAnalysisDatabase(unittest.TestCase):
+
+    def setUp(self):
+        fdesc, self.filename = tempfile.mkstemp(suffix=".db")
+        os.close(fdesc)
+        self.data, symbol_pool = gen_binary(ASM)
+        self.func = symbol_pool.getby_name("func").offset
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_blocs(self):
+        # Reference
+        mdis = dis_x86_32(bin_stream_str(self.data))
+        blocs = mdis.dis_multibloc(0)
+        blocs = mdis.dis_multibloc(self.func, blocs)
+
+        # First run: only main
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        mdis_db = CountingDis(bin_stream_str(self.data), db=db)
+        mdis_db.dis_multibloc(0)
+        decoded = mdis_db.decoded
+        self.assertNotEqual(decoded, 0)
+        db.close()
+
+        # Second run: main is loaded, func is disassembled
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        mdis_db = CountingDis(bin_stream_str(self.data), db=db)
+        blocs_db = mdis_db.dis_multibloc(0)
+        self.assertEqual(mdis_db.decoded, 0)
+        blocs_db = mdis_db.dis_multibloc(self.func, blocs_db)
+        self.assertNotEqual(mdis_db.decoded, 0)
+        self.assertEqual(blocs2str(blocs), blocs2str(blocs_db))
+        self.assertEqual(mdis.job_done, mdis_db.job_done)
+        db.close()
+
+        # Third run: everything is loaded, with the same labels
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        mdis_db = CountingDis(bin_stream_str(self.data), db=db)
+        blocs_db = mdis_db.dis_multibloc(0)
+        blocs_db = mdis_db.dis_multibloc(self.func, blocs_db)
+        self.assertEqual(mdis_db.decoded, 0)
+        self.assertEqual(blocs2str(blocs), blocs2str(blocs_db))
+        for bloc in blocs_db:
+            for cst in bloc.bto:
+                self.assertIs(cst.label,
+                              mdis_db.symbol_pool.getby_offset(
+                                  cst.label.offset))
+        self.assertEqual(len(db.get_bloc_offsets()), len(blocs))
+
+        # Another binary or architecture does not share the analysis
+        other = AnalysisDatabase(self.filename, self.data, "x86_64")
+        self.assertIsNone(other.get_bloc(0, asmbloc.asm_symbol_pool()))
+        other = AnalysisDatabase(self.filename, self.data + "\x00", "x86_32")
+        self.assertIsNone(other.get_bloc(0, asmbloc.asm_symbol_pool()))
+        db.close()
+
+    def test_symbols(self):
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        symbol_pool = asmbloc.asm_symbol_pool()
+        symbol_pool.add_label("main", 0)
+        symbol_pool.add_label("func", self.func)
+        symbol_pool.add_label("unpinned")
+        db.add_symbols(symbol_pool)
+        db.close()
+
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        symbol_pool = asmbloc.asm_symbol_pool()
+        labels = db.load_symbols(symbol_pool)
+        self.assertEqual([(x.name, x.offset) for x in labels],
+                         [("main", 0), ("func", self.func)])
+        self.assertIsNone(symbol_pool.getby_name("unpinned"))
+
+        # Offsets already known keep their current label
+        symbol_pool = asmbloc.asm_symbol_pool()
+        label = symbol_pool.add_label("start", 0)
+        db.load_symbols(symbol_pool)
+        self.assertIs(symbol_pool.getby_offset(0), label)
+
+        # Names already used get the default name of their offset
+        symbol_pool = asmbloc.asm_symbol_pool()
+        symbol_pool.add_label("func", 0x1000)
+        db.load_symbols(symbol_pool)
+        self.assertEqual(symbol_pool.getby_offset(self.func).name,
+                         "loc_%016X" % self.func)
+        db.close()
+
+    def test_version(self):
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        symbol_pool = asmbloc.asm_symbol_pool()
+        symbol_pool.add_label("main", 0)
+        db.add_symbols(symbol_pool)
+        db.close()
+
+        # Same format: objects are kept
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        self.assertEqual(len(db.load_symbols(asmbloc.asm_symbol_pool())), 1)
+        db.close()
+
+        # Another format: the database is emptied
+        class OtherDatabase(AnalysisDatabase):
+            version = AnalysisDatabase.version + 1
+        db = OtherDatabase(self.filename, self.data, "x86_32")
+        self.assertEqual(db.load_symbols(asmbloc.asm_symbol_pool()), [])
+        db.close()
+
+    def test_irblocs(self):
+        def lift(db, processes=1):
+            mdis = dis_x86_32(bin_stream_str(self.data), db=db)
+            mdis.follow_call = True
+            blocs = mdis.dis_multibloc(0)
+            ir_arch = ir_a_x86_32(mdis.symbol_pool)
+            ir_arch.db = db
+            ir_arch.add_blocs(blocs, processes=processes)
+            return ir_arch
+
+        ref = lift(None)
+        # Blocs lifted by add_blocs workers are stored too
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        lift(db, processes=2)
+        db.close()
+
+        db = AnalysisDatabase(self.filename, self.data, "x86_32")
+        ir_arch = lift(db)
+        db.close()
+        self.assertEqual(sorted(str(irb) for irb in ref.blocs.values()),
+                         sorted(str(irb) for irb in ir_arch.blocs.values()))
+        for label, irb in ir_arch.blocs.iteritems():
+            self.assertIs(label, irb.label)
+            self.assertIs(ir_arch.symbol_pool.getby_name(label.name), label)
+            dst = irb.dst
+            if ir_arch.ExprIsLabel(dst):
+                self.assertIs(dst.name,
+                              ir_arch.symbol_pool.getby_name(dst.name.name))
+                self.assertEqual(hash(dst), hash(ExprId(dst.name, dst.size)))
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(
+        TestAnalysisDatabase)
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import unittest
+
+from miasm2.arch.x86.arch import mn_x86
+from miasm2.arch.x86.disasm import dis_x86_32
+from miasm2.arch.x86.ira import ir_a_x86_32
+from miasm2.arch.x86.regs import EAX, ECX, EDX
+from miasm2.core import parse_asm, asmbloc
+from miasm2.core.bin_stream import bin_stream_str
+from miasm2.expression.expression import ExprMem
+from miasm2.analysis.ssa import SSA
+
+
+ASM = '''
+main:
+    MOV    ECX, 0x10
+    XOR    EAX, EAX
+    MOV    EDX, 0x1
+loop:
+    ADD    EAX, ECX
+    MOV    DWORD PTR [EAX], EDX
+    DEC    ECX
+    JNZ    loop
+    MOV    EDX, EAX
+    RET
+'''
+
+
+def gen_ira():
+    """Assemble ASM, lift it and return the ira, the main and the loop
+    labels"""
+    blocs, symbol_pool = parse_asm.parse_txt(mn_x86, 32, ASM)
+    symbol_pool.set_offset(symbol_pool.getby_name("main"), 0)
+    patches = asmbloc.asm_resolve_final(mn_x86, blocs[0], symbol_pool)
+    data = ["\x00"] * (max(patches) + 0x10)
+    for offset, raw in patches.iteritems():
+        data[offset:offset + len(raw)] = list(raw)
+    mdis = dis_x86_32(bin_stream_str("".join(data)))
+    ir_arch = ir_a_x86_32(mdis.symbol_pool)
+    for bloc in mdis.dis_multibloc(0):
+        ir_arch.add_bloc(bloc)
+    ir_arch.gen_graph()
+    loop = symbol_pool.getby_name("loop").offset
+    return ir_arch, ir_arch.get_label(0), ir_arch.get_label(loop)
+
+
+class TestSSA(unittest.TestCase):
+
+    def setUp(self):
+        self.ir_arch, self.head, self.loop = gen_ira()
+        self.ssa = SSA(self.ir_arch, self.head)
+
+    def get_phis(self, label):
+        """Return the {original variable: phi ExprAff} of @label"""
+        irs = self.ssa.blocs[label].irs
+        if not irs or not all(self.ssa.is_phi(expr) for expr in irs[0]):
+            return {}
+        return dict((self.ssa.ssa_to_var[expr.dst], expr) for expr in irs[0])
+
+    def test_single_assignment(self):
+        defined = set()
+        for irb in self.ssa.blocs.itervalues():
+            for exprs in irb.irs:
+                for expr in exprs:
+                    self.assertNotIn(expr.dst, defined)
+                    defined.add(expr.dst)
+        self.assertEqual(len(self.ssa.blocs),
+                         len(list(self.ir_arch.g.reachable_sons(self.head))))
+
+    def test_phis(self):
+        phis = self.get_phis(self.loop)
+        # Loop carried registers, but not EDX which is only read in the loop,
+        # nor the dead flags and IRDst
+        self.assertIn(EAX, phis)
+        self.assertIn(ECX, phis)
+        self.assertNotIn(EDX, phis)
+        self.assertNotIn(self.ir_arch.IRDst, phis)
+        self.assertEqual(self.get_phis(self.head), {})
+
+        preds = self.ssa.phi_preds[self.loop]
+        self.assertEqual(sorted(preds),
+                         sorted(self.ir_arch.g.predecessors(self.loop)))
+        args = phis[ECX].src.args
+        self.assertEqual(len(args), len(preds))
+        for pred, arg in zip(preds, args):
+            # Each argument is the last definition of its predecessor
+            label, _, _ = self.ssa.defs[arg]
+            self.assertEqual(label, pred)
+
+    def test_def_use(self):
+        for ssa_var, var in self.ssa.ssa_to_var.iteritems():
+            definition = self.ssa.defs[ssa_var]
+            if definition is None:
+                self.assertTrue(ssa_var.name.endswith(".0"))
+                continue
+            label, line_nb, expr = definition
+            self.assertIn(expr, self.ssa.blocs[label].irs[line_nb])
+            self.assertEqual(expr.dst, ssa_var)
+            for label, line_nb, expr in self.ssa.uses[ssa_var]:
+                self.assertIn(ssa_var, expr.get_r(True))
+                self.assertIn(expr, self.ssa.blocs[label].irs[line_nb])
+
+        # The memory write of the loop uses the EAX phi and the EDX entry
+        # value
+        phi_eax = self.get_phis(self.loop)[EAX].dst
+        users = [expr for _, _, expr in self.ssa.uses[phi_eax]]
+        self.assertTrue(any(not self.ssa.is_phi(expr) for expr in users))
+        stores = [expr for irb in self.ssa.blocs.itervalues()
+                  for exprs in irb.irs for expr in exprs
+                  if isinstance(expr.dst, ExprMem)]
+        self.assertEqual(len(stores), 1)
+        edx_def = self.ssa.defs[
+            [var for var in stores[0].get_r(True)
+             if self.ssa.ssa_to_var.get(var) == EDX][0]]
+        self.assertEqual(edx_def[0], self.head)
+
+    def test_original_untouched(self):
+        names = set(str(expr.dst) for irb in self.ir_arch.blocs.itervalues()
+                    for exprs in irb.irs for expr in exprs)
+        self.assertIn("ECX", names)
+        self.assertFalse(any("." in name for name in names))
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSSA)
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
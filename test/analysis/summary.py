@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+import miasm2.analysis.summary
+from miasm2.arch.x86.disasm import dis_x86_32
+from miasm2.arch.x86.ira import ir_a_x86_32
+from miasm2.arch.x86.regs import EAX, EBX, ECX, EDX, ESP, ESP_init
+from miasm2.core.bin_stream import bin_stream_str
+from miasm2.expression.expression import ExprAff, ExprInt32, ExprMem
+from miasm2.ir.symbexec import symbexec
+from miasm2.analysis.database import AnalysisDatabase
+from miasm2.analysis.summary import get_summary
+from miasm2.analysis.depgraph import DependencyGraph
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+from asm_helpers import gen_binary
+
+
+ASM = '''
+main:
+    PUSH   EBX
+    MOV    ECX, 0x10
+    CALL   func
+    MOV    EDX, EAX
+    POP    EBX
+    RET
+func:
+    PUSH   EBX
+    LEA    EAX, DWORD PTR [ECX+0x1]
+    MOV    EBX, EAX
+    MOV    DWORD PTR [0x123456], EAX
+    POP    EBX
+    RET
+loop_func:
+    MOV    ECX, 0x4
+    MOV    EAX, 0x1
+loop:
+    ADD    EAX, EAX
+    DEC    ECX
+    JNZ    loop
+    RET
+stack_main:
+    PUSH   0x1234
+    CALL   stack_func
+    ADD    ESP, 0x4
+    RET
+stack_func:
+    MOV    EAX, DWORD PTR [ESP+0x4]
+    RET
+'''
+
+
+DATA, SYMBOL_POOL = gen_binary(ASM)
+FUNC, LOOP_FUNC, STACK_MAIN, STACK_FUNC = [
+    SYMBOL_POOL.getby_name(name).offset
+    for name in ["func", "loop_func", "stack_main", "stack_func"]]
+
+
+def gen_ira(db=None):
+    """Lift the functions of DATA"""
+    mdis = dis_x86_32(bin_stream_str(DATA))
+    ir_arch = ir_a_x86_32(mdis.symbol_pool)
+    ir_arch.db = db
+    for offset in [0, FUNC, LOOP_FUNC, STACK_MAIN, STACK_FUNC]:
+        for bloc in mdis.dis_multibloc(offset):
+            ir_arch.add_bloc(bloc)
+    ir_arch.gen_graph()
+    return ir_arch
+
+
+class TestSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.ir_arch = gen_ira()
+
+    def test_callee(self):
+        summary = get_summary(self.ir_arch, FUNC)
+        self.assertEqual(summary.entry, FUNC)
+        # EBX is saved and restored
+        self.assertEqual(summary.modified_regs, set([EAX, ESP]))
+        self.assertEqual(summary.outputs[EAX], ECX + ExprInt32(1))
+        self.assertEqual(summary.stack_delta, 4)
+        # Local stack frame writes are forgotten
+        self.assertEqual(summary.mem_writes,
+                         [(ExprMem(ExprInt32(0x123456)), ECX + ExprInt32(1))])
+        self.assertTrue(summary.mem_complete)
+        # Computed once
+        self.assertIs(get_summary(self.ir_arch, FUNC), summary)
+
+    def test_caller(self):
+        summary = get_summary(self.ir_arch, 0)
+        self.assertEqual(summary.outputs[EAX], ExprInt32(0x11))
+        self.assertEqual(summary.outputs[EDX], ExprInt32(0x11))
+        self.assertEqual(summary.outputs[ECX], ExprInt32(0x10))
+        self.assertNotIn(EBX, summary.modified_regs)
+        self.assertEqual(summary.stack_delta, 4)
+        self.assertEqual(summary.mem_writes,
+                         [(ExprMem(ExprInt32(0x123456)), ExprInt32(0x11))])
+        self.assertEqual(summary.callees.keys(), [FUNC])
+
+    def test_loop(self):
+        summary = get_summary(self.ir_arch, LOOP_FUNC)
+        self.assertIn(EAX, summary.clobbered_regs)
+        self.assertIn(ECX, summary.clobbered_regs)
+        self.assertEqual(summary.stack_delta, 4)
+
+    def test_stack_argument(self):
+        summary = get_summary(self.ir_arch, STACK_FUNC)
+        self.assertEqual(summary.outputs[EAX],
+                         ExprMem(ESP + ExprInt32(4), 32))
+        # The argument is read in the caller stack frame
+        summary = get_summary(self.ir_arch, STACK_MAIN)
+        self.assertEqual(summary.outputs[EAX], ExprInt32(0x1234))
+        self.assertEqual(summary.stack_delta, 4)
+        sb = symbexec(self.ir_arch, {ESP: ESP_init}, use_summaries=True)
+        sb.emul_ir_blocs(self.ir_arch, STACK_MAIN)
+        self.assertEqual(sb.symbols[EAX], ExprInt32(0x1234))
+
+    def test_lookup(self):
+        summary = get_summary(self.ir_arch, 0)
+        # Unchanged IR is not hashed again
+        function_ir_hash = miasm2.analysis.summary.function_ir_hash
+        def fail(*args):
+            raise RuntimeError("IR hashed")
+        miasm2.analysis.summary.function_ir_hash = fail
+        try:
+            self.assertIs(get_summary(self.ir_arch, 0), summary)
+        finally:
+            miasm2.analysis.summary.function_ir_hash = function_ir_hash
+
+    def test_invalidation(self):
+        caller = get_summary(self.ir_arch, 0)
+        # Patch the IR of the callee: EAX = ECX + 2
+        label = self.ir_arch.get_label(FUNC)
+        for exprs in self.ir_arch.blocs[label].irs:
+            for i, expr in enumerate(exprs):
+                if expr.dst == EAX:
+                    exprs[i] = ExprAff(EAX, ECX + ExprInt32(2))
+        summary = get_summary(self.ir_arch, FUNC)
+        self.assertEqual(summary.outputs[EAX], ECX + ExprInt32(2))
+        # The caller summary depends on the callee one
+        self.assertIsNot(get_summary(self.ir_arch, 0), caller)
+        self.assertEqual(get_summary(self.ir_arch, 0).outputs[EAX],
+                         ExprInt32(0x12))
+
+    def test_symbexec(self):
+        sb = symbexec(self.ir_arch, {}, use_summaries=True)
+        sb.emul_ir_blocs(self.ir_arch, 0)
+        self.assertEqual(sb.symbols[EDX], ExprInt32(0x11))
+        self.assertEqual(sb.symbols[ExprMem(ExprInt32(0x123456))],
+                         ExprInt32(0x11))
+        # Without summaries, the call result is unknown
+        sb = symbexec(self.ir_arch, {})
+        sb.emul_ir_blocs(self.ir_arch, 0)
+        self.assertTrue(sb.symbols[EDX].is_function_call())
+
+    def test_depgraph(self):
+        # Block of main holding MOV EDX, EAX (after the call)
+        label = self.ir_arch.get_label(0xB)
+        self.assertTrue(any(expr.dst == EDX
+                            for exprs in self.ir_arch.blocs[label].irs
+                            for expr in exprs))
+        for use_summaries in [False, True]:
+            dg = DependencyGraph(self.ir_arch, use_summaries=use_summaries)
+            sol = next(dg.get_from_end(label, set([EDX]), set()))
+            values = sol.emul()
+            self.assertEqual(values[EDX] == ExprInt32(0x11), use_summaries)
+
+    def test_database(self):
+        fdesc, filename = tempfile.mkstemp()
+        os.close(fdesc)
+        try:
+            db = AnalysisDatabase(filename, DATA, "x86_32")
+            summary = get_summary(gen_ira(db), 0)
+            db.close()
+
+            # Summaries are loaded, not computed
+            compute_summary = miasm2.analysis.summary.compute_summary
+            def fail(*args):
+                raise RuntimeError("summary computed")
+            miasm2.analysis.summary.compute_summary = fail
+            try:
+                db = AnalysisDatabase(filename, DATA, "x86_32")
+                stored = get_summary(gen_ira(db), 0)
+                db.close()
+            finally:
+                miasm2.analysis.summary.compute_summary = compute_summary
+            self.assertEqual(stored.ir_hash, summary.ir_hash)
+            self.assertEqual(stored.outputs, summary.outputs)
+            self.assertEqual(stored.mem_writes, summary.mem_writes)
+            self.assertEqual(stored.callees, summary.callees)
+        finally:
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSummary)
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import os
+import sys
+import unittest
+
+from miasm2.arch.x86.disasm import dis_x86_32
+from miasm2.core.bin_stream import bin_stream_str
+from miasm2.analysis.xref import XrefIndex, XREF_CODE, XREF_DATA
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+from asm_helpers import gen_binary
+
+
+ASM = '''
+main:
+    PUSH   0x1000
+    MOV    EAX, DWORD PTR [0x2000]
+    MOV    DWORD PTR [EAX+0x1000], ECX
+    CALL   func
+    CALL   DWORD PTR [0x1000]
+    JMP    end
+func:
+    MOV    ECX, 0x2000
+    RET
+end:
+    XOR    EAX, EAX
+    RET
+'''
+
+
+class TestXrefIndex(unittest.TestCase):
+
+    def setUp(self):
+        data, symbol_pool = gen_binary(ASM)
+        self.offsets = dict((name, symbol_pool.getby_name(name).offset)
+                            for name in ["main", "func", "end"])
+        self.mdis = dis_x86_32(bin_stream_str(data))
+
+    def get_blocs(self, xrefs):
+        """Disassemble from main, indexing with @xrefs"""
+        self.called = 0
+
+        def count_cb(*args):
+            self.called += 1
+
+        self.mdis.dis_bloc_callback = xrefs.chain(count_cb)
+        self.mdis.follow_call = True
+        blocs = self.mdis.dis_multibloc(self.offsets["main"])
+        self.assertEqual(self.called, len(blocs))
+        return blocs
+
+    def test_references(self):
+        xrefs = XrefIndex()
+        blocs = self.get_blocs(xrefs)
+        lines = dict((line.offset, line) for bloc in blocs
+                     for line in bloc.lines)
+        self.assertEqual(len(xrefs), len(lines))
+
+        def get_refs(value, kind=None):
+            return sorted((str(lines[offset]), ref_kind)
+                          for offset, ref_kind in xrefs.references(value,
+                                                                   kind))
+
+        self.assertEqual(get_refs(0x1000),
+                         [("CALL       DWORD PTR [0x1000]", XREF_DATA),
+                          ("MOV        DWORD PTR [EAX+0x1000], ECX",
+                           XREF_DATA),
+                          ("PUSH       0x1000", XREF_DATA)])
+        self.assertEqual(get_refs(0x2000),
+                         [("MOV        EAX, DWORD PTR [0x2000]", XREF_DATA),
+                          ("MOV        ECX, 0x2000", XREF_DATA)])
+        self.assertEqual([kind for _, kind in get_refs(self.offsets["func"])],
+                         [XREF_CODE])
+        self.assertEqual(get_refs(self.offsets["end"], XREF_CODE),
+                         get_refs(self.offsets["end"]))
+        self.assertEqual(get_refs(self.offsets["end"], XREF_DATA), [])
+        self.assertEqual(xrefs.references(0x3000), [])
+        self.assertNotIn(0x3000, xrefs)
+
+        # Range query
+        in_range = list(xrefs.references_range(0x1000, 0x2001))
+        self.assertEqual([value for value, _, _ in in_range],
+                         [0x1000] * 3 + [0x2000] * 2)
+        self.assertEqual(list(xrefs.references_range(0x2001, 0x3000)), [])
+
+        # Reverse query
+        for offset, line in lines.iteritems():
+            for value, kind in xrefs.instr_references(offset):
+                self.assertIn((offset, kind), xrefs.references(value))
+
+    def test_idempotent(self):
+        xrefs = XrefIndex()
+        blocs = self.get_blocs(xrefs)
+        refs = xrefs.references(0x1000)
+        xrefs.add_blocs(blocs)
+        self.assertEqual(xrefs.references(0x1000), refs)
+
+        # Explicit indexing gives the same index
+        xrefs_explicit = XrefIndex()
+        xrefs_explicit.add_blocs(blocs)
+        for value in [0x1000, 0x2000, self.offsets["func"]]:
+            self.assertEqual(sorted(xrefs_explicit.references(value)),
+                             sorted(xrefs.references(value)))
+
+    def test_flow_only(self):
+        xrefs = XrefIndex()
+        blocs = self.get_blocs(xrefs)
+        self.mdis = dis_x86_32(bin_stream_str(gen_binary(ASM)[0]))
+        self.mdis.flow_only = True
+        xrefs_flow = XrefIndex()
+        self.get_blocs(xrefs_flow)
+        for value in [0x1000, 0x2000, self.offsets["func"]]:
+            self.assertEqual(sorted(xrefs_flow.references(value)),
+                             sorted(xrefs.references(value)))
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestXrefIndex)
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
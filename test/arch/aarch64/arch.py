@@ -1807,3 +1807,11 @@ for s, l in reg_tests_aarch64[:]:
     print repr(b)
     assert(b in a)
 
+# Test the decode tables: same candidates as the bintree walk
+assert(mn_aarch64.get_decode_tables() is not None)
+for s, l in reg_tests_aarch64:
+    b = bin_stream_str(h2i(l))
+    candidates = set(mn_aarch64.guess_mnemo(b, 'l', {}, 0))
+    mn_aarch64.decode_table_bits = None
+    assert(set(mn_aarch64.guess_mnemo(b, 'l', {}, 0)) == candidates)
+    del mn_aarch64.decode_table_bits
@@ -558,3 +558,20 @@ print 'instr per sec:', instr_num / (time.time() - ts)
 
 import cProfile
 cProfile.run(r'mn_arm.dis("\xe1\xa0\xa0\x06", "l")')
+
+# Test the decode tables: same candidates as the bintree walk
+for mn, tests in [(mn_arm, reg_tests_arm), (mn_armt, reg_tests_armt)]:
+    assert(mn.get_decode_tables() is not None)
+    for s, l in tests:
+        b = bin_stream_str(h2i(l))
+        candidates = set(mn.guess_mnemo(b, 'l', {}, 0))
+        mn.decode_table_bits = None
+        assert(set(mn.guess_mnemo(b, 'l', {}, 0)) == candidates)
+        del mn.decode_table_bits
+# Truncated 32 bits thumb instruction
+try:
+    mn_armt.dis("\x2d\xe9", 'l')
+except Disasm_Exception:
+    pass
+else:
+    raise AssertionError("Disasm_Exception expected")
@@ -2561,3 +2561,39 @@ cProfile.run('profile_dis(o)')
 instr_bytes = '\x65\xc7\x00\x09\x00\x00\x00'
 inst = mn_x86.dis(instr_bytes, 32, 0)
 assert(inst.b == instr_bytes)
+
+# Test the asm cache
+mn_x86.get_asm_cache().clear()
+instr = mn_x86.fromstring("MOV EAX, 0x1", 32)
+candidates = mn_x86.asm(instr)
+assert(len(mn_x86.get_asm_cache()) == 1)
+assert(mn_x86.asm(instr) == candidates)
+assert(len(mn_x86.get_asm_cache()) == 1)
+instr = mn_x86.dis("\xf3\xa4", 32)
+assert(mn_x86.asm(instr)[0] == "\xf3\xa4")
+instr = mn_x86.dis("\xa4", 32)
+assert(mn_x86.asm(instr)[0] == "\xa4")
+assert(len(mn_x86.get_asm_cache()) == 3)
+instr = mn_x86.fromstring("MOV EAX, 0x1", 32)
+instr.args[1] = ExprId("unknown", 32)
+for _ in xrange(2):
+    try:
+        mn_x86.asm(instr)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError expected")
+assert(mn_x86.get_asm_candidates("MOV", 3) == [])
+
+# Test the decoding fast path: cached ModRM expressions, truncated streams
+assert(str(mn_x86.dis("\x8b\x40\x04", 32)) == "MOV        EAX, DWORD PTR [EAX+0x4]")
+assert(str(mn_x86.dis("\x8b\x40\x08", 32)) == "MOV        EAX, DWORD PTR [EAX+0x8]")
+assert(str(mn_x86.dis("\x66\x8b\x40\x08", 32)) == "MOV        AX, WORD PTR [EAX+0x8]")
+assert(str(mn_x86.dis("\x8b\x00", 32)) == "MOV        EAX, DWORD PTR [EAX]")
+for data in ["\x8b\x40", "\xb8\x01\x00"]:
+    try:
+        mn_x86.dis(data, 32)
+    except Disasm_Exception:
+        pass
+    else:
+        raise AssertionError("Disasm_Exception expected")
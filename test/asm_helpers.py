@@ -0,0 +1,17 @@
+"""Helpers shared by the regression tests. Tests are run from their own
+directory, and import this module after adding test/ to sys.path"""
+
+from miasm2.arch.x86.arch import mn_x86
+from miasm2.core import parse_asm, asmbloc
+
+
+def gen_binary(asm):
+    """Assemble the x86 32 bits source @asm, its 'main' label being at 0.
+    Return the binary, padded with 0x10 null bytes, and the symbol_pool"""
+    blocs, symbol_pool = parse_asm.parse_txt(mn_x86, 32, asm)
+    symbol_pool.set_offset(symbol_pool.getby_name("main"), 0)
+    patches = asmbloc.asm_resolve_final(mn_x86, blocs[0], symbol_pool)
+    data = ["\x00"] * (max(patches) + 0x10)
+    for offset, raw in patches.iteritems():
+        data[offset:offset + len(raw)] = list(raw)
+    return "".join(data), symbol_pool
@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             ".."))
+from asm_helpers import gen_binary
+
+
+# Several functions sharing code, used as a disassembly target
+ASM_FUNCS = '''
+main:
+    PUSH   EBP
+    MOV    EBP, ESP
+    CALL   func1
+    CALL   func2
+    CALL   func3
+    POP    EBP
+    RET
+func1:
+    MOV    EAX, 1
+    TEST   EAX, EAX
+    JZ     shared
+    INC    EAX
+shared:
+    ADD    EAX, 2
+    RET
+func2:
+    MOV    ECX, 4
+loop:
+    DEC    ECX
+    JNZ    loop
+    JMP    shared
+func3:
+    XOR    EAX, EAX
+    CMP    EAX, 3
+    JNZ    func1
+    RET
+'''
+
+# Loop whose branch target is the bloc delay slot
+ASM_MIPS = '''
+main:
+    ADDIU      A0, ZERO, 0x10
+    ADDIU      A1, ZERO, 0
+loop:
+    ADDIU      A1, A1, 0x1
+    BNE        A0, ZERO, loop
+    ADDIU      A0, A0, 0xFFFFFFFF
+    BNE        A1, ZERO, slot
+    ADDIU      A2, A2, 0x1
+    MOVN       A1, ZERO, ZERO
+slot:
+    JR         RA
+    ADDIU      A2, A2, 0x1
+'''
+
+
+def gen_funcs():
+    """Assemble ASM_FUNCS at 0, return the binary and the functions'
+    offsets"""
+    data, symbol_pool = gen_binary(ASM_FUNCS)
+    offsets = [symbol_pool.getby_name(name).offset
+               for name in ["main", "func3", "func2", "func1"]]
+    return data, offsets
+
+
+def blocs2str(blocs):
+    """Return a canonical string representation of @blocs"""
+    out = []
+    for bloc in blocs:
+        lines = [str(bloc.label)] + [str(line) for line in bloc.lines]
+        lines += sorted(str(cst) for cst in bloc.bto)
+        out.append("\n".join(lines))
+    return "\n".join(sorted(out))
+
+
+class TestAsmBloc(unittest.TestCase):
+
+    def test_dis_multibloc_parallel(self):
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.arch.x86.disasm import dis_x86_32
+
+        data, offsets = gen_funcs()
+
+        for follow_call, processes, chunksize in [(False, 1, 16),
+                                                  (False, 2, 1),
+                                                  (False, 3, 2),
+                                                  (True, 2, 1),
+                                                  (True, 4, 1)]:
+            # Reference: serial disassembly
+            mdis = dis_x86_32(bin_stream_str(data))
+            mdis.follow_call = follow_call
+            blocs_serial = []
+            for offset in offsets:
+                blocs_serial = mdis.dis_multibloc(offset, blocs_serial)
+
+            # Workers following calls explore the same code
+            mdis_par = dis_x86_32(bin_stream_str(data))
+            mdis_par.follow_call = follow_call
+            blocs_par = mdis_par.dis_multibloc_parallel(offsets,
+                                                        processes=processes,
+                                                        chunksize=chunksize)
+            self.assertEqual(blocs2str(blocs_serial), blocs2str(blocs_par))
+            self.assertEqual(sorted((label.name, label.offset)
+                                    for label in mdis.symbol_pool.items),
+                             sorted((label.name, label.offset)
+                                    for label in mdis_par.symbol_pool.items))
+            self.assertEqual(mdis.job_done, mdis_par.job_done)
+
+    def test_dont_dis(self):
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.arch.x86.disasm import dis_x86_32
+
+        data, offsets = gen_funcs()
+        main, func3, func2, func1 = offsets
+
+        # Forbid func2 (range) and func3 (single offset)
+        mdis = dis_x86_32(bin_stream_str(data))
+        mdis.follow_call = True
+        mdis.dont_dis = [(func2, func1), func3]
+        blocs = mdis.dis_multibloc(main)
+        starts = set(bloc.label.offset for bloc in blocs)
+        self.assertIn(func1, starts)
+        self.assertFalse(any(func2 <= start < func1 for start in starts))
+        self.assertNotIn(func3, starts)
+
+        # Blocs are split on each destination: no bloc contains a label
+        # target other than its first line
+        dsts = set(cst.label.offset for bloc in blocs for cst in bloc.bto)
+        for bloc in blocs:
+            self.assertFalse(dsts.intersection(bloc.get_offsets()[1:]))
+
+    def test_dis_callgraph(self):
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.arch.x86.disasm import dis_x86_32
+
+        data, offsets = gen_funcs()
+        main, func3, func2, func1 = offsets
+
+        decoded = []
+
+        def count_cb(mnemo, attrib, pool_bin, cur_bloc, offsets_to_dis,
+                     symbol_pool):
+            decoded.append(cur_bloc.label.offset)
+
+        mdis = dis_x86_32(bin_stream_str(data))
+        mdis.dis_bloc_callback = count_cb
+        # Start with func2 only, then extend from main
+        graph = mdis.dis_callgraph([func2])
+        self.assertEqual([node.offset for node in graph.nodes()], [func2])
+        decoded_func2 = len(decoded)
+        graph = mdis.dis_callgraph([main])
+        self.assertIs(graph, mdis.callgraph)
+        edges = set((src.offset, dst.offset) for src, dst in graph.edges())
+        self.assertEqual(edges, set([(main, func1), (main, func2),
+                                     (main, func3)]))
+        self.assertEqual(set(label.offset for label in mdis.functions),
+                         set(offsets))
+
+        # Each bloc is disassembled once
+        self.assertEqual(len(decoded), len(set(decoded)))
+        self.assertNotIn(func2, decoded[decoded_func2:])
+        # Known entries are not analysed again
+        mdis.dis_callgraph(offsets)
+        self.assertEqual(len(decoded), len(set(decoded)))
+
+        # Code shared between functions
+        owners = {}
+        for label, owner_labels in mdis.bloc_owners.iteritems():
+            owners[label.offset] = set(owner.offset for owner in owner_labels)
+        shared = mdis.symbol_pool.getby_offset(func1 + 10).offset
+        self.assertEqual(owners[func1], set([func1, func3]))
+        for label, blocs in mdis.functions.iteritems():
+            starts = set(bloc.label.offset for bloc in blocs)
+            self.assertIn(label.offset, starts)
+            for start in starts:
+                self.assertIn(label.offset, owners[start])
+        self.assertEqual(owners[shared], set([func1, func2, func3]))
+
+        # Same blocs as a global disassembly
+        mdis_ref = dis_x86_32(bin_stream_str(data))
+        mdis_ref.follow_call = True
+        blocs_ref = mdis_ref.dis_multibloc(main)
+        blocs = set()
+        for func_blocs in mdis.functions.itervalues():
+            blocs.update(func_blocs)
+        self.assertEqual(sorted(bloc.get_offsets() for bloc in blocs),
+                         sorted(bloc.get_offsets() for bloc in blocs_ref))
+
+    def test_lean_objects(self):
+        import copy
+        import cPickle as pickle
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.core import asmbloc
+
+        data = "\x90\x8b\x44\x24\x08\xc3"
+        bs = bin_stream_str(data)
+        instr = mn_x86.dis(bs, 32, 1)
+        label = asmbloc.asm_label("test", 1)
+        bloc = asmbloc.asm_bloc(label)
+        bloc.addline(instr)
+        bloc.addto(asmbloc.asm_constraint_next(label))
+        for obj in [instr, instr.additional_info, label, bloc,
+                    list(bloc.bto)[0]]:
+            self.assertTrue(hasattr(obj, "__slots__"))
+        self.assertFalse(hasattr(instr, "__dict__"))
+        self.assertFalse(hasattr(list(bloc.bto)[0], "__dict__"))
+
+        # Bytes are copied at decoding: they do not change if the
+        # bin_stream is patched
+        self.assertEqual(instr.b, data[1:5])
+        bs.bin = "\x90" * len(data)
+        self.assertEqual(instr.b, data[1:5])
+        self.assertEqual(asmbloc.copy_instr(instr).b, data[1:5])
+
+        # Pickled instructions embed their bytes, not the bin_stream
+        raw = pickle.dumps(instr, pickle.HIGHEST_PROTOCOL)
+        self.assertNotIn(data, raw)
+        loaded = pickle.loads(raw)
+        self.assertEqual(loaded.b, instr.b)
+        self.assertEqual((loaded.offset, loaded.l), (1, 4))
+        self.assertEqual(str(loaded), str(instr))
+        self.assertEqual(loaded.additional_info.g1.value,
+                         instr.additional_info.g1.value)
+
+        # Attributes of subclasses without slots are copied and pickled
+        instr_cls = type("instruction_ext", (instr.__class__,), {})
+        ext = instr_cls(instr.name, instr.mode, instr.args,
+                        instr.additional_info)
+        ext.offset, ext.l, ext.b = instr.offset, instr.l, instr.b
+        ext.comment = "ext"
+        self.assertEqual(copy.copy(ext).comment, "ext")
+        loaded = instr_cls.__new__(instr_cls)
+        loaded.__setstate__(ext.__getstate__())
+        self.assertEqual(loaded.comment, "ext")
+        self.assertEqual(loaded.b, instr.b)
+
+        # Flow only instructions have no bytes
+        self.assertFalse(hasattr(mn_x86.dis(bs, 32, 1, flow_only=True), "b"))
+        # Rare attributes are still accepted by blocs and labels
+        bloc.parents = set()
+        label.index = 1
+
+    def test_instr_cache(self):
+        from miasm2.arch.mips32.arch import mn_mips32
+        from miasm2.arch.mips32.disasm import dis_mips32l
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.core import parse_asm, asmbloc
+
+        blocs, symbol_pool = parse_asm.parse_txt(mn_mips32, "l", ASM_MIPS)
+        symbol_pool.set_offset(symbol_pool.getby_name("main"), 0)
+        patches = asmbloc.asm_resolve_final(mn_mips32, blocs[0], symbol_pool)
+        data = "".join(patches[offset] for offset in sorted(patches))
+        starts = sorted(label.offset for label in symbol_pool.items)
+
+        decoded = []
+        dis = mn_mips32.dis.im_func
+
+        def counting_dis(cls, bs, attrib, offset, *args, **kwargs):
+            decoded.append(offset)
+            return dis(cls, bs, attrib, offset, *args, **kwargs)
+
+        def dis_all(mdis):
+            """Disassemble from each label, as for independent functions"""
+            del decoded[:]
+            out = []
+            for start in starts:
+                mdis.job_done = set()
+                out.append(blocs2str(mdis.dis_multibloc(start)))
+            return out
+
+        mn_mips32.dis = classmethod(counting_dis)
+        try:
+            mdis = dis_mips32l(bin_stream_str(data), instr_cache_size=0)
+            self.assertIs(mdis.get_instr_cache(), None)
+            blocs_ref = dis_all(mdis)
+            self.assertTrue(len(decoded) > len(set(decoded)))
+
+            mdis = dis_mips32l(bin_stream_str(data))
+            self.assertEqual(dis_all(mdis), blocs_ref)
+            # Each instruction is decoded once, across disassemblies
+            self.assertEqual(len(decoded), len(set(decoded)))
+            self.assertEqual(dis_all(mdis), blocs_ref)
+            # Only the (failing) decoding past the end is tried again
+            self.assertEqual(set(decoded), set([len(data)]))
+
+            # Changing the stream drops the cache
+            cache = mdis.get_instr_cache()
+            mdis.bs = bin_stream_str(data)
+            self.assertIsNot(mdis.get_instr_cache(), cache)
+            # Streams which may be modified are not cached
+            mdis.bs.volatile = True
+            self.assertIs(mdis.get_instr_cache(), None)
+        finally:
+            mn_mips32.dis = classmethod(dis)
+
+    def test_dis_linear(self):
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.arch.x86.disasm import dis_x86_32
+
+        # NOP; <bad>; <bad>; INC EAX; RET; <truncated MOV>
+        data = "\x90\xd6\xd6\x40\xc3\xb8\x01"
+        mdis = dis_x86_32(bin_stream_str(data))
+        instrs = mdis.dis_linear(0)
+        self.assertEqual(instrs.next(), (0, 1, "NOP", []))
+
+        records = list(mdis.dis_linear(0))
+        self.assertEqual([(x.offset, x.name) for x in records],
+                         [(0, "NOP"), (3, "INC"), (4, "RET")])
+        self.assertEqual(str(records[1].args[0]), "EAX")
+
+        # Stop on first error
+        records = list(mdis.dis_linear(0, resync=None))
+        self.assertEqual([x.offset for x in records], [0])
+
+        # Instructions must end before @stop
+        records = list(mdis.dis_linear(3, 4))
+        self.assertEqual([x.name for x in records], ["INC"])
+
+        # Sweep over the functions
+        data, offsets = gen_funcs()
+        mdis = dis_x86_32(bin_stream_str(data))
+        names = [x.name for x in mdis.dis_linear(0, max(offsets))]
+        self.assertEqual(names[:3], ["PUSH", "MOV", "CALL"])
+
+    def test_flow_only(self):
+        from miasm2.core.bin_stream import bin_stream_str
+        from miasm2.arch.x86.disasm import dis_x86_32
+
+        data, offsets = gen_funcs()
+        mdis = dis_x86_32(bin_stream_str(data))
+        mdis.follow_call = True
+        blocs = mdis.dis_multibloc(offsets[0])
+
+        mdis_flow = dis_x86_32(bin_stream_str(data), flow_only=True)
+        mdis_flow.follow_call = True
+        blocs_flow = mdis_flow.dis_multibloc(offsets[0])
+
+        # Same CFG, only flow instructions are fully decoded
+        self.assertEqual(sorted(bloc.get_offsets() for bloc in blocs),
+                         sorted(bloc.get_offsets() for bloc in blocs_flow))
+        for bloc in blocs_flow:
+            for instr in bloc.lines:
+                self.assertEqual(instr.flow_only, not instr.breakflow())
+                self.assertEqual(hasattr(instr, "b"), instr.breakflow())
+
+        # Lazy full decoding
+        for bloc in blocs_flow:
+            mdis_flow.decode_bloc_full(bloc)
+            self.assertFalse(any(instr.flow_only for instr in bloc.lines))
+        self.assertEqual(blocs2str(blocs), blocs2str(blocs_flow))
+
+    def test_asm_resolve_final(self):
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.core import parse_asm, asmbloc
+        from miasm2.core.bin_stream import bin_stream_str
+
+        # Backward and forward branches, some of them having to be relaxed
+        # from short to long encodings as the code in between grows
+        source = ["main:"]
+        for i in xrange(24):
+            source += ["lbl_%d:" % i,
+                       "    MOV    EAX, %d" % i,
+                       "    MOV    EBX, 0x12345678",
+                       "    MOV    EDX, 0x12345678",
+                       "    JZ     lbl_%d" % ((i * 7) % 24),
+                       "    JMP    lbl_%d" % (23 - i)]
+            if i % 3 == 0:
+                source.append("    MOV    ECX, DWORD PTR [data]")
+        source += ["    RET",
+                   "data:",
+                   ".string \"data\""]
+        blocs, symbol_pool = parse_asm.parse_txt(mn_x86, 32,
+                                                 "\n".join(source))
+        symbol_pool.set_offset(symbol_pool.getby_name("main"), 0x1000)
+        dsts = dict((id(instr), instr.args[0].name)
+                    for bloc in blocs[0] for instr in bloc.lines
+                    if not isinstance(instr, asmbloc.asm_raw) and
+                    instr.dstflow())
+        patches = asmbloc.asm_resolve_final(mn_x86, blocs[0], symbol_pool)
+
+        data = ["\x00"] * (max(patches) + 0x10)
+        for offset, raw in patches.iteritems():
+            data[offset:offset + len(raw)] = list(raw)
+        bs = bin_stream_str("".join(data))
+        sizes = set()
+        for bloc in blocs[0]:
+            offset = bloc.label.offset
+            for instr in bloc.lines:
+                self.assertEqual(instr.offset, offset)
+                offset += instr.l
+                if isinstance(instr, asmbloc.asm_raw):
+                    continue
+                decoded = mn_x86.dis(bs, 32, instr.offset)
+                self.assertEqual(decoded.l, instr.l)
+                if not instr.dstflow():
+                    continue
+                sizes.add(instr.l)
+                self.assertEqual((int(decoded.args[0].arg) + instr.offset)
+                                 & 0xFFFFFFFF, dsts[id(instr)].offset)
+            self.assertEqual(bloc.size, offset - bloc.label.offset)
+        # Both short and long branches are used
+        self.assertTrue(len(sizes) > 1)
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestAsmBloc)
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
@@ -0,0 +1,93 @@
+from miasm2.core.graph import DiGraph
+from miasm2.core.dataflow import iter_bits, BitsetNumbering, \
+    reverse_postorder, DataFlowAnalysis
+
+# Bitsets
+assert list(iter_bits(0)) == []
+assert list(iter_bits(0b101001)) == [0, 3, 5]
+assert list(iter_bits(1 << 200)) == [200]
+
+numbering = BitsetNumbering()
+assert numbering.add("a") == 1
+assert numbering.add("b") == 2
+assert numbering.add("a") == 1
+assert len(numbering) == 2
+assert "b" in numbering and "c" not in numbering
+assert numbering.to_bitset(["a", "b"]) == 3
+assert numbering.to_objects(2) == ["b"]
+
+# Reverse postorder: 1 -> 2 -> {3, 4} -> 5 -> 2, 6 unreachable from 1
+g = DiGraph()
+for src, dst in [(1, 2), (2, 3), (2, 4), (3, 5), (4, 5), (5, 2), (6, 5)]:
+    g.add_edge(src, dst)
+order = reverse_postorder(g, [1])
+assert order[:2] == [1, 2]
+assert set(order[2:4]) == set([3, 4])
+assert order[4:] == [5, 6]
+order = reverse_postorder(g, [5], g.predecessors_iter)
+assert order[0] == 5
+assert order.index(2) < order.index(1)
+
+
+# Forward analysis: reaching definitions of 'x'. Node n defines x_n if n is
+# in defs
+class Reach(DataFlowAnalysis):
+    def __init__(self, graph, defs):
+        super(Reach, self).__init__(graph)
+        for node in defs:
+            self.gen[node] = 1 << node
+            self.kill[node] = sum(1 << n for n in defs)
+
+reach = Reach(g, [1, 3])
+reach.compute()
+assert reach.before[1] == 0
+assert reach.after[1] == 1 << 1
+assert reach.before[2] == (1 << 1) | (1 << 3)
+assert reach.after[4] == (1 << 1) | (1 << 3)
+assert reach.after[3] == 1 << 3
+assert reach.before[5] == (1 << 1) | (1 << 3)
+assert reach.before[6] == 0
+
+
+# Backward analysis: liveness of 'x', used by 4 and defined by 2. The
+# boundary makes x live at the end of 5
+class Live(DataFlowAnalysis):
+    backward = True
+
+live = Live(g)
+live.gen[4] = 1
+live.kill[2] = 1
+live.compute()
+assert live.before[4] == 1
+assert live.after[2] == 1
+assert live.before[2] == 0
+assert live.before[5] == 0
+live.boundary[5] = 1
+live.compute()
+assert live.before[5] == 1
+assert live.before[6] == 1
+assert live.before[3] == 1
+assert live.before[2] == 0
+
+# Incremental update: 4 does not use x anymore, then 6 uses it
+live = Live(g)
+live.gen[4] = 1
+live.kill[2] = 1
+live.compute()
+del live.gen[4]
+assert live.update([4]) == set([2, 4])
+assert live.before[4] == 0
+assert live.after[2] == 0
+live.gen[6] = 1
+assert live.update([6]) == set([6])
+assert live.before[6] == 1
+
+# In the 2 -> 3 -> 5 -> 2 loop, x is live only because 3 uses it. Once 3
+# does not, states have to be recomputed from the boundaries
+loop = Live(g)
+loop.gen[3] = 1
+loop.compute()
+assert loop.before[5] == 1
+del loop.gen[3]
+assert loop.update([3]) == set([3, 1, 2, 5, 4, 6])
+assert all(state == 0 for state in loop.before.itervalues())
@@ -192,3 +192,32 @@ assert(sccs == {frozenset({6}),
                 frozenset({7, 8}),
                 frozenset({3}),
                 frozenset({1, 2, 4, 5, 9})})
+
+# Memoized analyses, invalidated on graph modifications
+g4 = CachedDiGraph()
+for src, dst in g3.edges():
+    g4.add_edge(src, dst)
+assert(g4.compute_dominators(1) == g3.compute_dominators(1))
+assert(g4.compute_dominators(1) is g4.compute_dominators(1))
+assert(g4.compute_dominance_frontier(1) == g3.compute_dominance_frontier(1))
+loops = set([(backedge, frozenset(body)) for backedge, body in g4.compute_natural_loops(1)])
+assert(loops == {((1, 9), frozenset({1, 2, 4, 5, 9})),
+                 ((2, 9), frozenset({2, 4, 5, 9}))})
+sccs = list(g4.compute_strongly_connected_components())
+assert(sccs == list(g4.compute_strongly_connected_components()))
+assert(set(frozenset(scc) for scc in sccs) ==
+       set(frozenset(scc) for scc in g3.compute_strongly_connected_components()))
+
+version = g4.version
+g4.add_node(1)
+assert(g4.version == version)
+g4.del_edge(9, 1)
+assert(g4.version != version)
+loops = set([(backedge, frozenset(body)) for backedge, body in g4.compute_natural_loops(1)])
+assert(loops == {((2, 9), frozenset({2, 4, 5, 9}))})
+sccs = set([frozenset(scc) for scc in g4.compute_strongly_connected_components()])
+assert(sccs == {frozenset({1}),
+                frozenset({3}),
+                frozenset({6}),
+                frozenset({7, 8}),
+                frozenset({2, 4, 5, 9})})
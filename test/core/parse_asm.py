@@ -35,6 +35,37 @@ class TestParseAsm(unittest.TestCase):
         self.assertTrue(parse_txt(mn_x86, 32, ASM0))
         self.assertRaises(ValueError, parse_txt, mn_x86, 32, ASM1)
 
+    def test_parse_cache(self):
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.arch.arm.arch import mn_arm
+        from miasm2.arch.aarch64.arch import mn_aarch64
+        from miasm2.arch.sh4.arch import mn_sh4
+
+        # Single token operands, followed by operands consuming commas or
+        # spaces
+        tests = [(mn_x86, 32, "MOV EAX, 0x10"),
+                 (mn_x86, 32, "MOV EAX, DWORD PTR [EBX+0x10]"),
+                 (mn_x86, 32, "ADD DWORD PTR [EAX], ECX"),
+                 (mn_x86, 32, "JMP label"),
+                 (mn_arm, "l", "LDR R0, [R2], 0x4"),
+                 (mn_arm, "l", "LDR R0, [R2, 0x4]"),
+                 (mn_arm, "l", "MOV R2, R1 LSL 0x14"),
+                 (mn_arm, "l", "STMFD SP!, {R4-R6, LR}"),
+                 (mn_aarch64, "l", "ADD X0, X0, X3 LSL 0x1"),
+                 (mn_aarch64, "l", "LDR X1, [X2], 0x8"),
+                 (mn_sh4, None, "MOV.L @(R0, R1), R2"),
+                 (mn_sh4, None, "MOV.L R1, @-R15"),
+                 ]
+        for mnemo, mode, line in tests:
+            mnemo.parse_cache_size = 0
+            ref = str(mnemo.fromstring(line, mode))
+            del mnemo.parse_cache_size
+            for _ in xrange(2):
+                self.assertEqual(str(mnemo.fromstring(line, mode)), ref)
+        # Single token operands are cached alone
+        cache = mn_x86.get_parse_cache()
+        self.assertTrue(any(text == "EAX" for _, text in cache.keys()))
+
 if __name__ == '__main__':
     testsuite = unittest.TestLoader().loadTestsFromTestCase(TestParseAsm)
     report = unittest.TextTestRunner(verbosity=2).run(testsuite)
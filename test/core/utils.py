@@ -34,6 +34,11 @@ class TestUtils(unittest.TestCase):
         assert("element2" in bd)
         self.assertEqual(bd["element2"], "value2")
 
+        # get() counts as a use, and does not insert missing keys
+        self.assertEqual(bd.get("element2"), "value2")
+        self.assertEqual(bd.get("missing", 3), 3)
+        assert("missing" not in bd)
+
 
 if __name__ == '__main__':
     testsuite = unittest.TestLoader().loadTestsFromTestCase(TestUtils)
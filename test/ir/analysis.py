@@ -716,3 +716,96 @@ for test_nb, test in enumerate([(G1_IRA, G1_EXP_IRA),
                 assert irb.irs[i][s_instr] == exp_irb.irs[i][s_instr],\
                     "(%s:%d)  %s / %s" %(
                         lbl, i, irb.irs[i][s_instr], exp_irb.irs[i][s_instr])
+
+# Reaching definitions and liveness
+
+G_DF_IRA = IRATest()
+G_DF_IRB0 = gen_irbloc(LBL0, [[ExprAff(a, CST1)], [ExprAff(b, CST2)]])
+G_DF_IRB1 = gen_irbloc(LBL1, [[ExprAff(a, b), ExprAff(c, a)]])
+G_DF_IRB2 = gen_irbloc(LBL2, [[ExprAff(r, c)]])
+G_DF_IRA.blocs = {irb.label : irb for irb in [G_DF_IRB0, G_DF_IRB1,
+                                              G_DF_IRB2]}
+G_DF_IRA.gen_graph()
+G_DF_IRA.g.add_uniq_edge(LBL0, LBL1)
+G_DF_IRA.g.add_uniq_edge(LBL1, LBL1)
+G_DF_IRA.g.add_uniq_edge(LBL1, LBL2)
+
+reach = G_DF_IRA.compute_reach()
+assert set(reach.defs.to_objects(reach.reg_reach(LBL1, 0, a))) == set([
+    (LBL0, 0, G_DF_IRB0.irs[0][0]), (LBL1, 0, G_DF_IRB1.irs[0][0])])
+assert reach.defs.to_objects(reach.reg_reach(LBL2, 0, c)) == [
+    (LBL1, 0, G_DF_IRB1.irs[0][1])]
+assert reach.reg_reach(LBL0, 1, b) == 0
+
+liveness = G_DF_IRA.compute_liveness()
+def live_regs(label, line_nb):
+    return set(liveness.regs.to_objects(liveness.line_live(label, line_nb)))
+assert live_regs(LBL2, 0) == set([r, sp])
+assert live_regs(LBL1, 0) == set([a, b, c, sp])
+assert live_regs(LBL0, 0) == set([a, sp])
+assert live_regs(LBL0, 1) == set([a, b, sp])
+
+# Incremental dead code removal
+
+G_INC_IRA = IRATest()
+G_INC_IRB0 = gen_irbloc(LBL0, [[ExprAff(a, CST1)], [ExprAff(b, CST2)]])
+G_INC_IRB1 = gen_irbloc(LBL1, [[ExprAff(c, c + a)]])
+G_INC_IRB2 = gen_irbloc(LBL2, [[ExprAff(r, c)]])
+G_INC_IRA.blocs = {irb.label : irb for irb in [G_INC_IRB0, G_INC_IRB1,
+                                               G_INC_IRB2]}
+G_INC_IRA.gen_graph()
+G_INC_IRA.g.add_uniq_edge(LBL0, LBL1)
+G_INC_IRA.g.add_uniq_edge(LBL1, LBL1)
+G_INC_IRA.g.add_uniq_edge(LBL1, LBL2)
+
+liveness = G_INC_IRA.dead_simp()
+assert [len(exprs) for exprs in G_INC_IRB0.irs] == [1, 0]
+assert [len(exprs) for exprs in G_INC_IRB1.irs] == [1]
+
+# c is now only used by the loop: its affectations, and the ones of a, are
+# dead
+G_INC_IRB2.irs[0] = [ExprAff(r, b)]
+liveness = G_INC_IRA.dead_simp(liveness, [LBL2])
+assert [len(exprs) for exprs in G_INC_IRB0.irs] == [0, 0]
+assert [len(exprs) for exprs in G_INC_IRB1.irs] == [0]
+fresh = G_INC_IRA.compute_strong_liveness()
+assert liveness.before == fresh.before
+assert liveness.after == fresh.after
+
+# Graph analyses are memoized until the graph changes
+graph = G_INC_IRA.g
+loops = list(graph.compute_natural_loops(LBL0))
+assert [edge for edge, _ in loops] == [(LBL1, LBL1)]
+assert next(graph.compute_natural_loops(LBL0)) is loops[0]
+# gen_graph updates the graph in place: the edges added by hand are removed
+G_INC_IRA.gen_graph()
+assert G_INC_IRA.g is graph
+assert list(graph.compute_natural_loops(LBL0)) == []
+version = graph.version
+G_INC_IRA.gen_graph()
+assert graph.version == version
+
+# Affectation killed by the last line of an irbloc whose successor is not in
+# the irblocs: every register is live at the end of the irbloc, but the
+# first affectation of a is overwritten before. The reach-based
+# remove_dead_code keeps every definition reaching the last line, dead_simp
+# removes it
+
+def gen_lost_son_ira():
+    ira_test = IRATest()
+    irb = gen_irbloc(LBL0, [[ExprAff(a, CST1)], [ExprAff(b, CST1)],
+                            [ExprAff(a, CST2)]])
+    ira_test.blocs = {irb.label: irb}
+    ira_test.gen_graph()
+    ira_test.g.add_uniq_edge(LBL0, LBL1)
+    return ira_test, irb
+
+G_LOST_IRA, G_LOST_IRB = gen_lost_son_ira()
+G_LOST_IRA.dead_simp()
+assert G_LOST_IRB.irs == [[], [ExprAff(b, CST1)], [ExprAff(a, CST2)]]
+
+G_LOST_IRA, G_LOST_IRB = gen_lost_son_ira()
+G_LOST_IRA.compute_reach()
+G_LOST_IRA.remove_dead_code()
+assert G_LOST_IRB.irs == [[ExprAff(a, CST1)], [ExprAff(b, CST1)],
+                          [ExprAff(a, CST2)]]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import copy
+import cPickle as pickle
+import unittest
+
+from miasm2.arch.x86.disasm import dis_x86_32
+from miasm2.arch.x86.ira import ir_a_x86_32
+from miasm2.arch.x86.regs import EAX, EBX, ECX
+from miasm2.core.asmbloc import asm_label
+from miasm2.core.bin_stream import bin_stream_str
+from miasm2.expression.expression import ExprAff, ExprInt32, ExprMem
+from miasm2.ir.ir import irbloc
+
+
+# 0: MOV EAX, 1; 5: CMP EAX, 2; 8: JZ 0xf; 0xa: MOV ECX, 3; 0xf: REP MOVSB;
+# 0x11: RET
+CODE = "b8010000008338027405b903000000f3a4c3".decode("hex")
+
+# 0: MOV EAX, 1; 5: CALL 0x10; 0xa: REP MOVSB; 0xc: JZ 0; 0xe: RET; 0xf: NOP;
+# 0x10: REPNE SCASB; 0x12: DIV ECX; 0x14: RET
+CODE_CALL = "b801000000e806000000f3a474f2c390f2aef7f1c3".decode("hex")
+
+
+def brute_force(ir_arch, start, stop):
+    """Reference implementation of ir.getby_range"""
+    out = set()
+    for irb in ir_arch.blocs.values():
+        for line in irb.lines:
+            if line.offset < stop and start < line.offset + line.l:
+                out.add(irb)
+    return out
+
+
+class TestIrblocsIndex(unittest.TestCase):
+
+    def setUp(self):
+        mdis = dis_x86_32(bin_stream_str(CODE))
+        self.ir_arch = ir_a_x86_32(mdis.symbol_pool)
+        for bloc in mdis.dis_multibloc(0):
+            self.ir_arch.add_bloc(bloc)
+
+    def check_index(self):
+        for start in xrange(-1, len(CODE) + 2):
+            self.assertEqual(self.ir_arch.getby_offset(start),
+                             brute_force(self.ir_arch, start, start + 1))
+            for stop in xrange(start, len(CODE) + 2):
+                self.assertEqual(self.ir_arch.getby_range(start, stop),
+                                 brute_force(self.ir_arch, start, stop))
+
+    def test_getby_offset(self):
+        self.check_index()
+        # REP MOVSB is lifted in several irblocs
+        self.assertTrue(len(self.ir_arch.getby_offset(0x10)) > 1)
+        self.assertEqual(self.ir_arch.getby_offset(len(CODE)), set())
+
+    def test_update(self):
+        blocs = self.ir_arch.blocs
+        label = self.ir_arch.symbol_pool.getby_offset(0xa)
+        irb = blocs.pop(label)
+        self.assertNotIn(irb, self.ir_arch.getby_offset(0xa))
+        self.check_index()
+        blocs[label] = irb
+        self.check_index()
+        del blocs[label]
+        blocs.setdefault(label, irb)
+        self.check_index()
+
+        # Assigning a dictionnary keeps the index
+        self.ir_arch.blocs = dict(blocs)
+        self.check_index()
+        self.ir_arch.blocs = {}
+        self.assertEqual(self.ir_arch.getby_range(0, len(CODE)), set())
+
+    def test_copy_pickle(self):
+        blocs = self.ir_arch.blocs
+        labels = lambda irbs: set(irb.label.offset for irb in irbs)
+        ref = labels(blocs.getby_range(0, len(CODE)))
+        # Copies have their own index
+        blocs_copy = copy.copy(blocs)
+        del blocs_copy[self.ir_arch.symbol_pool.getby_offset(0xa)]
+        self.assertEqual(labels(blocs.getby_range(0, len(CODE))), ref)
+        self.assertNotEqual(labels(blocs_copy.getby_range(0, len(CODE))),
+                            ref)
+        loaded = pickle.loads(pickle.dumps(blocs, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(labels(loaded.getby_range(0, len(CODE))), ref)
+
+
+class TestLineRW(unittest.TestCase):
+
+    def setUp(self):
+        self.irb = irbloc(asm_label("lbl"),
+                          [[ExprAff(EAX, EBX + ECX),
+                            ExprAff(ExprMem(EAX, 32), ExprInt32(1))]])
+
+    def test_cache(self):
+        read, written = self.irb.get_line_rw(0)
+        self.assertEqual(read, set([EAX, EBX, ECX]))
+        self.assertEqual(written, set([EAX, ExprMem(EAX, 32)]))
+        self.assertIs(self.irb.get_line_rw(0)[0], read)
+
+        # ExprAff read elements are cached, but callers get their own copy
+        expr = self.irb.irs[0][0]
+        expr.get_r().add(EAX)
+        self.assertEqual(expr.get_r(), set([EBX, ECX]))
+
+    def test_invalidation(self):
+        self.irb.get_line_rw(0)
+        # In place modifications of a line are detected
+        self.irb.irs[0][0] = ExprAff(ECX, EBX)
+        self.assertEqual(self.irb.get_line_rw(0),
+                         (set([EAX, EBX]), set([ECX, ExprMem(EAX, 32)])))
+        del self.irb.irs[0][1]
+        self.assertEqual(self.irb.get_line_rw(0), (set([EBX]), set([ECX])))
+        self.irb.irs = [[ExprAff(EAX, ExprInt32(0))]]
+        self.assertEqual(self.irb.get_line_rw(0), (set(), set([EAX])))
+
+    def test_pickle(self):
+        self.irb.get_line_rw(0)
+        irb = pickle.loads(pickle.dumps(self.irb, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(irb.irs, self.irb.irs)
+        self.assertEqual(irb.get_line_rw(0), self.irb.get_line_rw(0))
+
+
+class TestAddBlocs(unittest.TestCase):
+
+    def lift(self, processes=None, chunksize=16):
+        """Lift CODE_CALL with add_blocs, return the ir instance, the blocs
+        and the irblocs of each bloc"""
+        mdis = dis_x86_32(bin_stream_str(CODE_CALL))
+        mdis.follow_call = True
+        blocs = mdis.dis_multibloc(0)
+        ir_arch = ir_a_x86_32(mdis.symbol_pool)
+        out = ir_arch.add_blocs(blocs, processes=processes,
+                                chunksize=chunksize)
+        return ir_arch, blocs, out
+
+    def test_add_blocs(self):
+        ref, ref_blocs, ref_out = self.lift(processes=1)
+        self.assertEqual(len(ref_out), len(ref_blocs))
+        for processes, chunksize in [(2, 1), (3, 2)]:
+            ir_arch, blocs, out = self.lift(processes, chunksize)
+            self.assertEqual([[str(irb) for irb in irblocs]
+                              for irblocs in ref_out],
+                             [[str(irb) for irb in irblocs]
+                              for irblocs in out])
+            self.assertEqual(sorted(str(irb) for irb in ref.blocs.values()),
+                             sorted(str(irb)
+                                    for irb in ir_arch.blocs.values()))
+            # Same labels, linked to the instance symbol_pool
+            self.assertEqual(sorted(str(ref.symbol_pool).split("\n")),
+                             sorted(str(ir_arch.symbol_pool).split("\n")))
+            for label, irb in ir_arch.blocs.iteritems():
+                self.assertIs(irb.label, label)
+                self.assertIs(ir_arch.symbol_pool.getby_name(label.name),
+                              label)
+                for expr in irb.dst.get_r(cst_read=True):
+                    if ir_arch.ExprIsLabel(expr):
+                        self.assertIs(ir_arch.symbol_pool.getby_name(
+                            expr.name.name), expr.name)
+            # irblocs lines are the blocs instructions
+            lines = set(id(line) for bloc in blocs for line in bloc.lines)
+            for irb in ir_arch.blocs.itervalues():
+                self.assertTrue(all(id(line) in lines for line in irb.lines))
+            # Lifting side effects are reported
+            self.assertEqual([getattr(line.additional_info,
+                                      "except_on_instr", None)
+                              for bloc in blocs for line in bloc.lines],
+                             [getattr(line.additional_info,
+                                      "except_on_instr", None)
+                              for bloc in ref_blocs for line in bloc.lines])
+            self.assertEqual(ir_arch.lift_cache_hits +
+                             ir_arch.lift_cache_misses,
+                             sum(len(bloc.lines) for bloc in blocs))
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestSuite(
+        unittest.TestLoader().loadTestsFromTestCase(test_case)
+        for test_case in [TestIrblocsIndex, TestLineRW, TestAddBlocs])
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import unittest
+
+from miasm2.core.asmbloc import asm_bloc, asm_symbol_pool
+from miasm2.core.bin_stream import bin_stream_str
+
+
+# Instructions with offset dependent semantic: calls, relative jumps, PC
+# relative memory accesses, generated labels (REP, conditional execution)
+CODE_X86_32 = ["e800000000", "f3a4", "7502", "b801000000", "e2fe"]
+CODE_X86_64 = ["488b0510000000", "e800000000", "f348ab", "ebfe"]
+# RRX and register shifts are rewritten in the instruction arguments
+CODE_ARM = ["04009fe5", "000000eb", "01008002", "0ef0a0e1", "6100a0e1",
+            "1102a0e1"]
+
+
+def lift(ir_arch, mnemo, code, offsets):
+    """Lift the instructions @code (list of hex encodings) placed at each
+    offset of @offsets with @ir_arch. Return the IR text, the
+    except_on_instr flag and the text after lifting of each instruction"""
+    data = "".join(instr.decode("hex") for instr in code)
+    out = []
+    for offset in offsets:
+        bs = bin_stream_str("\x00" * offset + data)
+        cur = offset
+        for _ in code:
+            instr = mnemo.dis(bs, ir_arch.attrib, cur)
+            instr.offset = cur
+            instr.dstflow2label(ir_arch.symbol_pool)
+            bloc = asm_bloc(ir_arch.symbol_pool.getby_offset_create(cur))
+            bloc.lines = [instr]
+            irblocs = ir_arch.add_bloc(bloc)
+            out.append(("\n".join(str(irb) for irb in irblocs),
+                        getattr(instr.additional_info, "except_on_instr",
+                                None),
+                        str(instr)))
+            cur += instr.l
+    return out
+
+
+class TestLiftCache(unittest.TestCase):
+
+    offsets = [0x100, 0x2000, 0x100, 0x3ffc]
+
+    def check_arch(self, ir_cls, mnemo, code):
+        irs = []
+        for cache_size in [0, 100]:
+            ir_arch = ir_cls(asm_symbol_pool())
+            ir_arch.lift_cache_size = cache_size
+            irs.append(ir_arch)
+        ref, cached = [lift(ir_arch, mnemo, code, self.offsets)
+                       for ir_arch in irs]
+        self.assertEqual(ref, cached)
+        self.assertEqual(irs[0].lift_cache_hits, 0)
+        # Each instruction is lifted at its first two offsets (the second
+        # lifting finding its offset dependent parts), then reused
+        self.assertEqual(irs[1].lift_cache_misses, 2 * len(code))
+        self.assertEqual(irs[1].lift_cache_hits, 2 * len(code))
+
+    def test_x86_32(self):
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.arch.x86.ira import ir_a_x86_32
+        self.check_arch(ir_a_x86_32, mn_x86, CODE_X86_32)
+
+    def test_x86_64(self):
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.arch.x86.ira import ir_a_x86_64
+        self.check_arch(ir_a_x86_64, mn_x86, CODE_X86_64)
+
+    def test_arm(self):
+        from miasm2.arch.arm.arch import mn_arm
+        from miasm2.arch.arm.ira import ir_a_arml
+        self.check_arch(ir_a_arml, mn_arm, CODE_ARM)
+
+    def test_thumb_blx(self):
+        from miasm2.arch.arm.arch import mn_armt
+        from miasm2.arch.arm.sem import ir_armtl
+        # BLX destination is relative to the offset aligned on 4 bytes: the
+        # template validated at 0 and 4 does not describe it at 0x42
+        irs = []
+        for cache_size in [0, 100]:
+            ir_arch = ir_armtl(asm_symbol_pool())
+            ir_arch.lift_cache_size = cache_size
+            irs.append(ir_arch)
+        ref, cached = [lift(ir_arch, mn_armt, ["f9f1b6e8"],
+                            [0, 4, 0x20, 0x42])
+                       for ir_arch in irs]
+        self.assertEqual(ref, cached)
+        self.assertIn("IRDst = loc_00000000001F91AC", cached[-1][0])
+        self.assertEqual(irs[1].lift_cache_hits, 1)
+
+    def check_fix_regs(self, ir_cls, mnemo, code):
+        irs = []
+        for cache_size in [0, 100]:
+            ir_arch = ir_cls(asm_symbol_pool())
+            ir_arch.lift_cache_size = 0
+            ir_arch.fix_regs_cache_size = cache_size
+            irs.append(ir_arch)
+        ref, cached = [lift(ir_arch, mnemo, code, self.offsets)
+                       for ir_arch in irs]
+        self.assertEqual(ref, cached)
+        self.assertIsNone(irs[0].get_fix_regs_cache(irs[0].attrib))
+        self.assertTrue(irs[1].get_fix_regs_cache(irs[1].attrib))
+
+    def test_fix_regs_x86_64(self):
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.arch.x86.ira import ir_a_x86_64
+        # 32 bits destinations are zero extended to their 64 bits register
+        code = CODE_X86_64 + ["89c8", "6689c8", "01d8"]
+        self.check_fix_regs(ir_a_x86_64, mn_x86, code)
+        ir_arch = ir_a_x86_64(asm_symbol_pool())
+        out = lift(ir_arch, mn_x86, ["89c8"], [0])
+        self.assertIn("RAX = {RCX[0:32],0,32, 0x0,32,64}", out[0][0])
+
+    def test_fix_regs_expr_line(self):
+        from miasm2.arch.x86.ira import ir_a_x86_64
+        from miasm2.arch.x86.regs import EAX, EBX, RAX, RBX
+        from miasm2.expression.expression import ExprAff, ExprCompose
+        from miasm2.expression.expression import ExprInt32
+        from miasm2.ir.ir import irbloc
+        expr = ExprAff(EAX, EBX)
+        # Expressions only have their registers replaced, irbloc lines
+        # destinations are zero extended
+        expr_ref = ExprAff(RAX, ExprCompose([(RBX[:32], 0, 32),
+                                             (RAX[32:], 32, 64)]))
+        line_ref = ExprAff(RAX, ExprCompose([(RBX[:32], 0, 32),
+                                             (ExprInt32(0), 32, 64)]))
+        for expr_first in [True, False]:
+            ir_arch = ir_a_x86_64(asm_symbol_pool())
+            label = ir_arch.symbol_pool.getby_offset_create(0)
+            for _ in xrange(2):
+                if expr_first:
+                    self.assertEqual(
+                        ir_arch.expr_fix_regs_for_mode(expr, 64), expr_ref)
+                irb = irbloc(label, [[expr]])
+                ir_arch.irbloc_fix_regs_for_mode(irb, 64)
+                self.assertEqual(irb.irs[0][0], line_ref)
+                if not expr_first:
+                    self.assertEqual(
+                        ir_arch.expr_fix_regs_for_mode(expr, 64), expr_ref)
+
+    def test_fix_regs_aarch64(self):
+        from miasm2.arch.aarch64.arch import mn_aarch64
+        from miasm2.arch.aarch64.sem import ir_aarch64l
+        code = ["2000028b", "2000020b", "e0031f2a", "c0035fd6"]
+        self.check_fix_regs(ir_aarch64l, mn_aarch64, code)
+
+    def test_segmentation(self):
+        from miasm2.arch.x86.arch import mn_x86
+        from miasm2.arch.x86.sem import ir_x86_32
+        ir_arch = ir_x86_32()
+        instr = mn_x86.dis("8b4304".decode("hex"), 32)
+        instr.offset = 0x1000
+        ir_arch.instr2ir(instr)
+        ir_arch.do_ds_segm = True
+        instr_ir, _ = ir_arch.instr2ir(instr)
+        # The segmentation mode is part of the cache key
+        self.assertEqual(ir_arch.lift_cache_hits, 0)
+        self.assertIn("segm", str(instr_ir[0]))
+
+
+if __name__ == '__main__':
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestLiftCache)
+    report = unittest.TextTestRunner(verbosity=2).run(testsuite)
+    exit(len(report.errors + report.failures))
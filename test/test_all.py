@@ -104,7 +104,9 @@ testset += SemanticTestExec("x86_32", "PE", 0x401000, ["bsr_bsf"],
 
 ## Core
 for script in ["interval.py",
+               "asmbloc.py",
                "graph.py",
+               "dataflow.py",
                "parse_asm.py",
                "utils.py",
                "sembuilder.py",
@@ -121,6 +123,8 @@ for script in ["modint.py",
 ## IR
 for script in ["ir2C.py",
                "symbexec.py",
+               "lift_cache.py",
+               "ir.py",
                ]:
     testset += RegressionTest([script], base_dir="ir")
 testset += RegressionTest(["analysis.py"], base_dir="ir",
@@ -136,6 +140,10 @@ for script in ["win_api_x86_32.py",
     testset += RegressionTest([script], base_dir="os_dep")
 
 ## Analysis
+testset += RegressionTest(["database.py"], base_dir="analysis")
+testset += RegressionTest(["xref.py"], base_dir="analysis")
+testset += RegressionTest(["ssa.py"], base_dir="analysis")
+testset += RegressionTest(["summary.py"], base_dir="analysis")
 testset += RegressionTest(["depgraph.py"], base_dir="analysis",
                           products=[fname for fnames in (
                               ["graph_test_%02d_00.dot" % test_nb,